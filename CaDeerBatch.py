@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+from CaDeerMotility import moore_decision, movement_world, perlin_world
+from CaDeerRaster import classify_raster
+from CaDeerStatistics import PathStatistics
+
+# Perlin Noise settings that can differ between the worlds of a batch
+PERLIN_SETTINGS = ['scale', 'octaves', 'persistence', 'lacunarity', 'base']
+
+
+class WorldBatch(object):
+    """Many Perlin worlds that share the features of one deer, stacked into a single (K, length, width) feature index
+        tensor. Walkers of every world are moved together in one vectorized loop, which replaces constructing, coloring,
+        and walking a CaDeer for each world. The results of each world are kept separately.
+        :class:`WorldBatch`
+
+        :param deer: Deer simulation with its features gathered, used for the features, motility values, view radius,
+        and any Perlin Noise settings a world does not give.
+        :type deer: CaDeer
+        :param worlds: Perlin Noise settings of each world, such as [{'base': 0}, {'base': 1, 'persistence': 0.4}].
+        :type worlds: list
+        :param length: Length of every world. Default is 250.
+        :type length: int, optional
+        :param width: Width of every world. Default is 250.
+        :type width: int, optional
+    """
+
+    def __init__(self, deer, worlds, length=250, width=250):
+        """
+        Constructor method
+        """
+
+        self.length = length
+        self.width = width
+        self.cells = length * width
+        self.features = deer.features
+        self.names = list(deer.names[:deer.features])
+        self.motility_values = np.asarray(deer.motility_values, dtype=float)
+
+        # settings of every world, filled in from the deer
+        self.settings = []
+        for world in worlds:
+            settings = {name: getattr(deer, name) for name in PERLIN_SETTINGS}
+            settings.update(world)
+            for name, low, high in [('persistence', 0.2, 0.6), ('lacunarity', 2.2, 3)]:
+                if settings[name] is None:
+                    settings[name] = np.random.uniform(low, high)
+            if settings['base'] is None:
+                settings['base'] = np.random.randint(0, 25)
+            self.settings.append(settings)
+
+        self.worlds = len(self.settings)
+        self.feature_world = np.zeros((self.worlds, length, width), dtype=np.uint8)
+        self.movement = np.zeros((self.worlds, self.cells, 3, 3))
+
+        for k, settings in enumerate(self.settings):
+            world = perlin_world(length, width, settings['scale'], settings['octaves'], settings['persistence'],
+                                 settings['lacunarity'], settings['base'])
+            self.feature_world[k] = classify_raster(world, thresholds=deer.color_range)
+            self.movement[k] = movement_world(self.feature_world[k], self.motility_values,
+                                              deer.view_radius).reshape(self.cells, 3, 3)
+
+        # flattened views used to look up every walker at once
+        self.flat_features = self.feature_world.reshape(-1)
+        self.flat_movement = self.movement.reshape(-1, 3, 3)
+
+        self.statistics = None
+
+    def run(self, time, walkers=1, start_x=None, start_y=None, block=1024):
+        """ Moves the walkers of every world for a set amount of iterations.
+
+        :param time: Total amount of iterations to run the simulation
+        :type time: int
+        :param walkers: Number of walkers within each world. Default is 1.
+        :type walkers: int, optional
+        :param start_x: Starting x positions of shape (worlds, walkers). Default is None, which will pick random
+        positions.
+        :type start_x: ndArray, optional
+        :param start_y: Starting y positions of shape (worlds, walkers). Default is None, which will pick random
+        positions.
+        :type start_y: ndArray, optional
+        :param block: Number of iterations to draw random values for at once. Default is 1024.
+        :type block: int, optional
+        :return: Statistics of each walker, indexed by world and then walker.
+        :rtype: list
+        """
+
+        if start_x is None:
+            start_x = np.random.randint(0, self.length, (self.worlds, walkers))
+        if start_y is None:
+            start_y = np.random.randint(0, self.width, (self.worlds, walkers))
+
+        x = np.asarray(start_x, dtype=np.int64).reshape(-1)
+        y = np.asarray(start_y, dtype=np.int64).reshape(-1)
+        offset = np.repeat(np.arange(self.worlds) * self.cells, walkers)
+
+        self.statistics = [[PathStatistics(self.features, self.motility_values, self.names) for _ in range(walkers)]
+                           for _ in range(self.worlds)]
+
+        for start in range(0, time, block):
+            steps = min(block, time - start)
+            normals = np.random.normal(size=(steps, x.size, 8))
+            features = np.zeros((steps, x.size), dtype=np.int64)
+            moves_x = np.zeros((steps, x.size), dtype=np.int64)
+            moves_y = np.zeros((steps, x.size), dtype=np.int64)
+
+            for t in range(steps):
+                cell = offset + x * self.width + y
+                features[t] = self.flat_features[cell]
+
+                moves_x[t], moves_y[t] = moore_decision(self.flat_movement[cell], normals[t])
+                x = np.remainder(x + moves_x[t], self.length)
+                y = np.remainder(y + moves_y[t], self.width)
+
+            # each walker adds the block to its own statistics
+            for walker in range(x.size):
+                k, w = divmod(walker, walkers)
+                self.statistics[k][w].extend(features[:, walker], moves_x[:, walker], moves_y[:, walker])
+
+        # the last move of each walker ends on its current position
+        ends = self.flat_features[offset + x * self.width + y]
+        for walker in range(x.size):
+            k, w = divmod(walker, walkers)
+            self.statistics[k][w].finish(int(ends[walker]))
+
+        return self.statistics
+
+    def summary(self):
+        """ Occupancy of each terrain within each world, pooling the walkers of the world.
+
+        :return: Data frame with one row per world holding its Perlin Noise settings and the occupancy of each terrain.
+        :rtype: DataFrame
+        """
+
+        rows = []
+
+        for k, settings in enumerate(self.settings):
+            visits = sum(statistics.visits for statistics in self.statistics[k])
+            row = {'World': k}
+            row.update({name.capitalize(): settings[name] for name in PERLIN_SETTINGS})
+            row.update(dict(zip(self.names, visits / max(visits.sum(), 1))))
+            rows.append(row)
+
+        return pd.DataFrame(rows)
@@ -0,0 +1,293 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+from scipy.optimize import differential_evolution
+from scipy.special import ndtr
+from CaDeerMotility import MOORE_INDICES, movement_world, view_windows
+from CaDeerMarkov import move_probabilities
+
+# likelihood set by likelihood_initializer within each worker process
+worker_likelihood = None
+
+
+def tied_move_probabilities(movement, decimals=9):
+    """ Computes the probability of each of the eight moves of the moore neighborhood as move_probabilities does, but
+    with neighbors of equal value checked in a random order, so each neighbor of a tie is equally likely. A tie of k
+    neighbors that is reached is passed over with chance (1 - Phi)^k, and otherwise one of its k neighbors is chosen.
+
+    :param movement: Movement squares as an ndArray of shape (..., 3, 3).
+    :type movement: ndArray
+    :param decimals: Number of decimals the values are rounded to before looking for ties, which removes the rounding
+    of the sums of each view. Default is 9.
+    :type decimals: int, optional
+    :return: Probability of each move in the order of MOORE_OFFSETS, as an ndArray of shape (..., 8).
+    :rtype: ndArray
+    """
+
+    movement = np.round(np.asarray(movement, dtype=float), decimals)
+    flat = movement.reshape(movement.shape[:-2] + (9,))
+
+    average = flat.mean(axis=-1)
+    neighbors = flat[..., MOORE_INDICES]
+
+    candidate = ndtr(average[..., None] - neighbors)
+    candidate[neighbors >= 100.0] = 0.0
+
+    order = np.argsort(neighbors, axis=-1, kind='stable')
+    sorted_values = np.take_along_axis(neighbors, order, axis=-1)
+    sorted_candidate = np.take_along_axis(candidate, order, axis=-1)
+
+    # first neighbor and size of the tie each sorted neighbor belongs to
+    position = np.broadcast_to(np.arange(8), sorted_values.shape)
+    starts = np.concatenate([np.ones(sorted_values.shape[:-1] + (1,), dtype=bool),
+                             sorted_values[..., 1:] != sorted_values[..., :-1]], axis=-1)
+    first = np.maximum.accumulate(np.where(starts, position, 0), axis=-1)
+    ends = np.concatenate([starts[..., 1:], np.ones(starts.shape[:-1] + (1,), dtype=bool)], axis=-1)
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(ends, position, 7), axis=-1), axis=-1), axis=-1)
+    size = last - first + 1
+
+    # chance that none of the neighbors of the lower ties were candidates
+    missed = np.cumprod(1.0 - sorted_candidate, axis=-1)
+    before = np.concatenate([np.ones(missed.shape[:-1] + (1,)), missed], axis=-1)
+    before = np.take_along_axis(before, first, axis=-1)
+
+    chosen = before * (1.0 - (1.0 - sorted_candidate) ** size) / size
+
+    probabilities = np.zeros(neighbors.shape)
+    np.put_along_axis(probabilities, order, chosen, axis=-1)
+
+    # no candidates at all sends the deer to the upper left neighbor
+    probabilities[..., 0] += missed[..., -1]
+
+    return probabilities
+
+
+class TrackLikelihood(object):
+    """Log-likelihood of observed tracks, such as GPS fixes snapped to the world, under the movement rule of the deer
+        for any set of motility values. Only the positions the tracks leave from are needed, so their views are found
+        once, and each evaluation of the likelihood computes the movement squares of those positions alone, the chance
+        of each move, and a gather of the moves that were observed.
+
+        Each value of a movement square is the average motility value of a sector of the view, which is the sum of the
+        motility values weighted by the share of the sector each feature covers, so the shares are kept for every
+        position. Views holding the same features are ties, and a tie is equally likely to be broken towards any of its
+        neighbors, see tied_move_probabilities. The deer itself breaks ties by the last bits of the float sums of
+        view_finder, which depend on the motility values, so the exact likelihood of a simulated track is a narrow
+        spike around the values it was simulated with. The exact likelihood is kept for checking the engine against
+        simulated tracks, using the 7 by 7 views of a view radius of 3.
+        :class:`TrackLikelihood`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param tracks: Observed tracks, each either an ndArray of x and y positions of shape (n, 2) or a Trajectory.
+        :type tracks: list
+        :param exact: Uses the floats of view_finder and its tie breaking instead of the tie model. Needs a view radius
+        of 3. Default is False.
+        :type exact: bool, optional
+    """
+
+    def __init__(self, deer, tracks, exact=False):
+        """
+        Constructor method
+        """
+
+        self.length, self.width = deer.feature_world.shape
+        self.features = deer.features
+        self.names = list(deer.names[:deer.features])
+        self.motility_values = np.asarray(deer.motility_values, dtype=float)
+
+        cells = []
+        moves = []
+        owners = []
+        self.dropped = 0
+
+        for track, positions in enumerate(tracks):
+            if hasattr(positions, 'positions'):
+                positions = positions.positions()
+            positions = np.asarray(positions, dtype=np.int64)
+
+            # wrapped movement between consecutive positions
+            dx = np.remainder(np.diff(positions[:, 0]) + 1, self.length) - 1
+            dy = np.remainder(np.diff(positions[:, 1]) + 1, self.width) - 1
+
+            # the deer always moves to one of its eight neighbors, fixes that stayed or jumped cannot be explained
+            single = (np.abs(dx) <= 1) & (np.abs(dy) <= 1) & ((dx != 0) | (dy != 0))
+            self.dropped += int(np.count_nonzero(~single))
+
+            cells.append(positions[:-1, 0][single] * self.width + positions[:-1, 1][single])
+            moves.append(np.searchsorted(MOORE_INDICES, (dx[single] + 1) * 3 + (dy[single] + 1)))
+            owners.append(np.full(int(np.count_nonzero(single)), track))
+
+        if self.dropped:
+            print("{} steps of the tracks were not moves to a neighbor and have been skipped.".format(self.dropped))
+
+        self.tracks = len(owners)
+        self.moves = np.concatenate(moves)
+        self.owners = np.concatenate(owners)
+
+        # only the positions the tracks leave from need their movement squares
+        self.cells, self.index = np.unique(np.concatenate(cells), return_inverse=True)
+
+        if exact and deer.view_radius != 3:
+            print("The exact likelihood needs a view radius of 3, the tie model has been used instead.")
+            exact = False
+
+        self.windows = None
+        self.weights = None
+
+        if exact:
+            # feature index of the view of each position, of shape (positions, 7, 7)
+            x, y = np.divmod(self.cells, self.width)
+            rows = np.remainder(x[:, None] + np.arange(-3, 4), self.length)
+            columns = np.remainder(y[:, None] + np.arange(-3, 4), self.width)
+            self.windows = np.asarray(deer.feature_world)[rows[:, :, None], columns[:, None, :]]
+        else:
+            # share of each sector of the view covered by each feature, of shape (positions, 9, features)
+            self.weights = np.zeros((self.cells.size, 9, self.features))
+            for feature in range(self.features):
+                indicator = np.zeros(self.features)
+                indicator[feature] = 1.0
+                squares = movement_world(deer.feature_world, indicator, deer.view_radius).reshape(-1, 9)
+                self.weights[:, :, feature] = squares[self.cells]
+
+    def probabilities(self, motility_values):
+        """ Chance of each of the eight moves at every position the tracks leave from.
+
+        :param motility_values: Motility values of each feature.
+        :type motility_values: ndArray
+        :return: Probability of each move in the order of MOORE_OFFSETS, of shape (positions, 8).
+        :rtype: ndArray
+        """
+
+        motility_values = np.asarray(motility_values, dtype=float)
+
+        if self.windows is not None:
+            return move_probabilities(view_windows(motility_values[self.windows]))
+
+        return tied_move_probabilities((self.weights @ motility_values).reshape(-1, 3, 3))
+
+    def track_log_likelihoods(self, motility_values):
+        """ Log-likelihood of each track under a set of motility values.
+
+        :param motility_values: Motility values of each feature.
+        :type motility_values: ndArray
+        :return: Log-likelihood of each track.
+        :rtype: ndArray
+        """
+
+        chosen = self.probabilities(motility_values)[self.index, self.moves]
+
+        # moves onto values of 100 or more have no chance, which would otherwise be an infinite penalty
+        return np.bincount(self.owners, weights=np.log(np.maximum(chosen, 1e-300)), minlength=self.tracks)
+
+    def log_likelihood(self, motility_values):
+        """ Log-likelihood of every track together under a set of motility values.
+
+        :param motility_values: Motility values of each feature.
+        :type motility_values: ndArray
+        :return: Log-likelihood of the tracks.
+        :rtype: float
+        """
+
+        chosen = self.probabilities(motility_values)[self.index, self.moves]
+
+        return float(np.log(np.maximum(chosen, 1e-300)).sum())
+
+    def fit(self, bounds=(0.01, 5.0), reference=0, workers=None, maxiter=100, popsize=15, seed=None):
+        """ Searches for the motility values that give the tracks the highest likelihood with differential evolution,
+        evaluating each generation across a process pool. Adding the same amount to every motility value leaves every
+        view unchanged relative to its average, so the value of a reference feature is held at the motility value of
+        the deer and the others are fit relative to it.
+
+        :param bounds: Lowest and highest motility value searched, either a single pair for every feature or a pair for
+        each feature. Default is (0.01, 5.0).
+        :type bounds: tuple or list, optional
+        :param reference: Feature index whose motility value is held fixed. Default is 0.
+        :type reference: int, optional
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :param maxiter: Maximum number of generations. Default is 100.
+        :type maxiter: int, optional
+        :param popsize: Multiplier of the population size, see scipy.optimize.differential_evolution. Default is 15.
+        :type popsize: int, optional
+        :param seed: Seed of the search. Default is None.
+        :type seed: int, optional
+        :return: Fitted motility values of each feature.
+        :rtype: ndArray
+        """
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if np.ndim(bounds) == 1:
+            bounds = [tuple(bounds)] * self.features
+        free = [feature for feature in range(self.features) if feature != reference]
+        self.reference = reference
+
+        # each generation is evaluated at once, so the search is the same for any number of workers
+        settings = {'maxiter': maxiter, 'popsize': popsize, 'seed': seed, 'updating': 'deferred', 'polish': False}
+
+        if workers > 1:
+            with Pool(workers, initializer=likelihood_initializer, initargs=(self,)) as pool:
+                result = differential_evolution(negative_log_likelihood, [bounds[f] for f in free], workers=pool.map,
+                                                **settings)
+        else:
+            likelihood_initializer(self)
+            result = differential_evolution(negative_log_likelihood, [bounds[f] for f in free], **settings)
+
+        self.fit_result = result
+        self.fitted_values = self.full_values(result.x)
+
+        return self.fitted_values
+
+    def full_values(self, free_values):
+        """ Motility values of every feature from the values of the features being fit.
+
+        :param free_values: Motility values of every feature other than the reference.
+        :type free_values: ndArray
+        :return: Motility values of each feature.
+        :rtype: ndArray
+        """
+
+        return np.insert(np.asarray(free_values, dtype=float), self.reference, self.motility_values[self.reference])
+
+    def compare(self, motility_values=None):
+        """ Compares the fitted motility values with a set of motility values, such as the values derived from the PDE.
+
+        :param motility_values: Motility values to compare with. Default is None, which will use the motility values of
+        the deer.
+        :type motility_values: ndArray, optional
+        :return: Data frame holding the terrain, given value, fitted value, and their difference.
+        :rtype: DataFrame
+        """
+
+        if motility_values is None:
+            motility_values = self.motility_values
+
+        return pd.DataFrame({'Terrain': self.names, 'Given': motility_values, 'Fitted': self.fitted_values,
+                             'Difference': self.fitted_values - motility_values})
+
+
+def likelihood_initializer(likelihood):
+    """ Initializer of a multiprocessing Pool that keeps the track likelihood within each worker, so it is only
+    pickled once per worker instead of once per evaluation.
+
+    :param likelihood: Likelihood of the observed tracks.
+    :type likelihood: TrackLikelihood
+    """
+
+    global worker_likelihood
+    worker_likelihood = likelihood
+
+
+def negative_log_likelihood(free_values):
+    """ Negative log-likelihood of the tracks of the worker process, to be minimized by the search.
+
+    :param free_values: Motility values of every feature other than the reference.
+    :type free_values: ndArray
+    :return: Negative log-likelihood of the tracks.
+    :rtype: float
+    """
+
+    return -worker_likelihood.log_likelihood(worker_likelihood.full_values(free_values))
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy.sparse.csgraph import dijkstra
+from CaDeerMotility import MOORE_OFFSETS
+
+# length of each move of the moore neighborhood, diagonal moves are longer
+MOVE_LENGTH = np.hypot(MOORE_OFFSETS[:, 0], MOORE_OFFSETS[:, 1])
+
+
+class CostSurface(object):
+    """Deterministic least-cost routes through the world, used as a baseline for the random walk of the deer. The
+        motility value of each position is the cost of crossing it, and moving between neighboring positions costs the
+        average of the two motility values times the length of the move. The world wraps around its edges as it does
+        for the deer.
+        :class:`CostSurface`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+    """
+
+    def __init__(self, deer):
+        """
+        Constructor method
+        """
+
+        self.length, self.width = deer.feature_world.shape
+        self.cells = self.length * self.width
+
+        # cost of crossing each position
+        self.cost = np.take(np.asarray(deer.motility_values, dtype=float), deer.feature_world).ravel()
+
+        # position reached by each of the eight moves
+        x, y = np.divmod(np.arange(self.cells), self.width)
+        next_x = np.remainder(x[:, None] + MOORE_OFFSETS[:, 0], self.length)
+        next_y = np.remainder(y[:, None] + MOORE_OFFSETS[:, 1], self.width)
+        self.next_cell = next_x * self.width + next_y
+
+        # cost of each move, every position has exactly eight moves so the rows are built directly
+        weights = 0.5 * (self.cost[:, None] + self.cost[self.next_cell]) * MOVE_LENGTH
+        self.graph = sparse.csr_matrix((weights.ravel(), self.next_cell.ravel().astype(np.int32),
+                                        np.arange(0, 8 * self.cells + 1, 8, dtype=np.int32)),
+                                       shape=(self.cells, self.cells))
+
+        self.distance = None
+        self.predecessors = None
+        self.sources = None
+
+    def solve(self, sources_x, sources_y):
+        """ Solves the least cost of reaching every position of the world from the closest of a set of sources, using
+        Dijkstra's algorithm.
+
+        :param sources_x: x positions of the sources.
+        :type sources_x: ndArray or int
+        :param sources_y: y positions of the sources.
+        :type sources_y: ndArray or int
+        :return: Cost distance raster of shape (length, width).
+        :rtype: ndArray
+        """
+
+        sources = np.atleast_1d(np.asarray(sources_x) * self.width + np.asarray(sources_y))
+
+        distance, predecessors, closest = dijkstra(self.graph, indices=sources, min_only=True,
+                                                   return_predecessors=True)
+
+        self.distance = distance
+        self.predecessors = predecessors
+        self.sources = closest
+
+        return distance.reshape(self.length, self.width)
+
+    def closest_source(self):
+        """ Raster of the source each position is closest to, as a position in row major order.
+
+        :return: Closest source of each position, of shape (length, width).
+        :rtype: ndArray
+        """
+
+        return self.sources.reshape(self.length, self.width)
+
+    def path(self, target_x, target_y):
+        """ Follows the least-cost route from the closest source to a target position, using the last call to solve.
+
+        :param target_x: x position of the target.
+        :type target_x: int
+        :param target_y: y position of the target.
+        :type target_y: int
+        :return: x and y positions of the route from the source to the target, of shape (n, 2).
+        :rtype: ndArray
+        """
+
+        cell = target_x * self.width + target_y
+        route = [cell]
+
+        # sources have no predecessor
+        while self.predecessors[cell] >= 0:
+            cell = self.predecessors[cell]
+            route.append(cell)
+
+        return np.stack(np.divmod(np.asarray(route[::-1]), self.width), axis=1)
+
+    def path_cost(self, positions):
+        """ Cost of following a path of neighboring positions, such as a path decoded from a Trajectory.
+
+        :param positions: x and y positions along the path, of shape (n, 2).
+        :type positions: ndArray
+        :return: Cost of each move of the path, of shape (n - 1,).
+        :rtype: ndArray
+        """
+
+        cells = positions[:, 0] * self.width + positions[:, 1]
+
+        # wrapped difference between consecutive positions
+        dx = np.remainder(np.diff(positions[:, 0]) + 1, self.length) - 1
+        dy = np.remainder(np.diff(positions[:, 1]) + 1, self.width) - 1
+
+        return 0.5 * (self.cost[cells[:-1]] + self.cost[cells[1:]]) * np.hypot(dx, dy)
+
+    def compare(self, trajectory, checkpoints=10, start=0, stop=None):
+        """ Compares a simulated path with the least-cost routes from its first position. At each checkpoint the cost
+        the deer has spent so far is compared with the least cost of reaching the same position.
+
+        :param trajectory: Trajectory of a simulated deer within the same world.
+        :type trajectory: Trajectory
+        :param checkpoints: Number of evenly spaced steps to compare. Default is 10.
+        :type checkpoints: int, optional
+        :param start: First step of the path to compare. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step to compare. Default is None, which will compare to the end of the path.
+        :type stop: int, optional
+        :return: Data frame holding the step, simulated cost, least cost and the ratio of the two at each checkpoint.
+        :rtype: DataFrame
+        """
+
+        positions = trajectory.positions(start, stop)
+        spent = np.concatenate([[0.0], np.cumsum(self.path_cost(positions))])
+
+        self.solve(positions[0, 0], positions[0, 1])
+        least = self.distance[positions[:, 0] * self.width + positions[:, 1]]
+
+        steps = np.unique(np.linspace(0, len(positions) - 1, checkpoints + 1).astype(int)[1:])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            detour = spent[steps] / least[steps]
+
+        return pd.DataFrame({'Step': start + steps, 'Simulated Cost': spent[steps], 'Least Cost': least[steps],
+                             'Detour': detour})
@@ -0,0 +1,148 @@
+import numpy as np
+import pandas as pd
+from CaDeerMotility import moore_decision
+
+
+class MotilityExperiment(object):
+    """Compares several motility tables on the same world using common random numbers. Each replicate starts every
+        table from the same position and feeds every table the same random normal values at each iteration, so the
+        deer only part ways where the tables lead them to. The differences between the tables are then measured within
+        each replicate, which removes most of the noise that independent runs would need many more iterations to
+        average out. All tables and replicates are moved together in one pass.
+        :class:`MotilityExperiment`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param motility_tables: Motility values of each feature for every table to compare.
+        :type motility_tables: list
+        :param labels: Name of each table. Default is None, which will name the tables by their index.
+        :type labels: list, optional
+    """
+
+    def __init__(self, deer, motility_tables, labels=None):
+        """
+        Constructor method
+        """
+
+        self.length, self.width = deer.feature_world.shape
+        self.feature_world = deer.feature_world.ravel()
+        self.features = deer.features
+        self.names = list(deer.names[:deer.features])
+        self.tables = [np.asarray(table, dtype=float) for table in motility_tables]
+
+        if labels is None:
+            labels = [str(k) for k in range(len(self.tables))]
+        self.labels = list(labels)
+
+        # movement squares of every position for each table
+        self.movement = np.stack([deer.view_world(motility_values=table).reshape(-1, 3, 3) for table in self.tables])
+
+    def run(self, time, replicates=10, start_x=None, start_y=None, common=True, block=1024):
+        """ Moves every table through the world for each replicate.
+
+        :param time: Total amount of iterations to run each replicate.
+        :type time: int
+        :param replicates: Number of replicates, each with its own starting position and random values. Default is 10.
+        :type replicates: int, optional
+        :param start_x: Starting x position of each replicate. Default is None, which will pick random positions.
+        :type start_x: ndArray, optional
+        :param start_y: Starting y position of each replicate. Default is None, which will pick random positions.
+        :type start_y: ndArray, optional
+        :param common: Feeds every table the same random values. False gives each table its own random values, as
+        independent runs would. Default is True.
+        :type common: bool, optional
+        :param block: Number of iterations to draw random values for at once. Default is 1024.
+        :type block: int, optional
+        :return: Visits of each table and replicate to each feature.
+        :rtype: ExperimentResult
+        """
+
+        tables = len(self.tables)
+
+        if start_x is None:
+            start_x = np.random.randint(0, self.length, replicates)
+        if start_y is None:
+            start_y = np.random.randint(0, self.width, replicates)
+
+        # one walker for every table and replicate, the tables of a replicate start at the same position
+        table = np.repeat(np.arange(tables), replicates)
+        replicate = np.tile(np.arange(replicates), tables)
+        x = np.asarray(start_x)[replicate].astype(np.int64)
+        y = np.asarray(start_y)[replicate].astype(np.int64)
+
+        visits = np.zeros(tables * replicates * self.features, dtype=np.int64)
+        walker_offset = np.arange(tables * replicates) * self.features
+
+        for start in range(0, time, block):
+            steps = min(block, time - start)
+
+            if common:
+                normals = np.random.normal(size=(steps, replicates, 8))[:, replicate]
+            else:
+                normals = np.random.normal(size=(steps, tables * replicates, 8))
+
+            for t in range(steps):
+                cell = x * self.width + y
+                visits += np.bincount(walker_offset + self.feature_world[cell], minlength=visits.size)
+
+                dx, dy = moore_decision(self.movement[table, cell], normals[t])
+                x = np.remainder(x + dx, self.length)
+                y = np.remainder(y + dy, self.width)
+
+        return ExperimentResult(visits.reshape(tables, replicates, self.features), self.labels, self.names)
+
+
+class ExperimentResult(object):
+    """Visits to each feature from a MotilityExperiment, along with the paired differences between its tables.
+        :class:`ExperimentResult`
+
+        :param visits: Visits of each table and replicate to each feature, of shape (tables, replicates, features).
+        :type visits: ndArray
+        :param labels: Name of each table.
+        :type labels: list
+        :param names: Name of each feature.
+        :type names: list
+    """
+
+    def __init__(self, visits, labels, names):
+        """
+        Constructor method
+        """
+
+        self.visits = visits
+        self.labels = labels
+        self.names = names
+        self.occupancy = visits / visits.sum(axis=-1, keepdims=True)
+
+    def paired_differences(self, reference=0, z=1.96):
+        """ Difference in the occupancy of each feature between every table and a reference table, measured within each
+        replicate and averaged over the replicates.
+
+        :param reference: Index of the reference table. Default is 0.
+        :type reference: int, optional
+        :param z: Normal quantile of the confidence intervals. Default is 1.96, a 95% interval.
+        :type z: float, optional
+        :return: Data frame holding the table, terrain, mean difference, standard error and confidence interval.
+        :rtype: DataFrame
+        """
+
+        rows = []
+        replicates = self.occupancy.shape[1]
+
+        for k, label in enumerate(self.labels):
+            if k == reference:
+                continue
+
+            difference = self.occupancy[k] - self.occupancy[reference]
+            mean = difference.mean(axis=0)
+            if replicates > 1:
+                error = difference.std(axis=0, ddof=1) / np.sqrt(replicates)
+            else:
+                error = np.full(mean.size, np.nan)
+
+            for feature, name in enumerate(self.names):
+                rows.append({'Table': label, 'Terrain': name, 'Difference': mean[feature],
+                             'Standard Error': error[feature], 'Lower': mean[feature] - z * error[feature],
+                             'Upper': mean[feature] + z * error[feature]})
+
+        return pd.DataFrame(rows)
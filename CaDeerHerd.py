@@ -0,0 +1,184 @@
+import math
+import numpy as np
+from CaDeerMotility import moore_decision
+
+# one contact between two deer, a and b are the indices of the deer with a < b
+CONTACT_TYPE = np.dtype([('time', np.uint32), ('a', np.uint32), ('b', np.uint32), ('transmitted', np.bool_)])
+
+
+class Herd(object):
+    """Many deer moving through the same world, each following the movement rule of CaDeer. Contacts between deer
+        within a radius are found with a uniform grid hash of the wrapping world, so only deer within neighboring
+        buckets are compared and each step costs O(N) on average instead of checking all pairs. Infected deer pass the
+        disease on to the susceptible deer they come in contact with.
+        :class:`Herd`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param agents: Number of deer within the herd.
+        :type agents: int
+        :param contact_radius: Distance within which two deer are in contact, in cells. Default is 1.
+        :type contact_radius: float, optional
+        :param transmission: Chance that a contact between an infected and a susceptible deer infects the susceptible
+        deer. Default is 0.1.
+        :type transmission: float, optional
+        :param infected: Number of deer that start out infected. Default is 1.
+        :type infected: int, optional
+        :param start_x: Starting x positions of the deer. Default is None, which will pick random positions.
+        :type start_x: ndArray, optional
+        :param start_y: Starting y positions of the deer. Default is None, which will pick random positions.
+        :type start_y: ndArray, optional
+    """
+
+    def __init__(self, deer, agents, contact_radius=1, transmission=0.1, infected=1, start_x=None, start_y=None):
+        """
+        Constructor method
+        """
+
+        if contact_radius < 0:
+            print("Contact radius has been set to default, please enter a radius of 0 or more.")
+            contact_radius = 1
+
+        self.agents = agents
+        self.contact_radius = contact_radius
+        self.transmission = transmission
+        self.length, self.width = deer.feature_world.shape
+
+        # movement square of every position, so each step only gathers the squares of the deer
+        self.movement = deer.view_world().reshape(self.length * self.width, 3, 3)
+
+        if start_x is None:
+            start_x = np.random.randint(0, self.length, agents)
+        if start_y is None:
+            start_y = np.random.randint(0, self.width, agents)
+        self.x = np.asarray(start_x, dtype=np.int64)
+        self.y = np.asarray(start_y, dtype=np.int64)
+
+        self.infected = np.zeros(agents, dtype=bool)
+        self.infected[np.random.choice(agents, min(infected, agents), replace=False)] = True
+
+        # buckets are at least as wide as the contact radius, so contacts are always within neighboring buckets
+        size = max(int(math.ceil(contact_radius)), 1)
+        self.buckets_x = max(self.length // size, 1)
+        self.buckets_y = max(self.width // size, 1)
+        # neighboring buckets, small worlds wrap onto the same bucket more than once
+        self.offsets = [(i, j) for i in np.unique(np.remainder([-1, 0, 1], self.buckets_x))
+                        for j in np.unique(np.remainder([-1, 0, 1], self.buckets_y))]
+
+        self.time = 0
+        self.contacts = []
+        self.infected_count = [int(self.infected.sum())]
+
+    def bucket(self, x, y):
+        """ Bucket of the grid hash holding each position.
+
+        :param x: x positions
+        :type x: ndArray
+        :param y: y positions
+        :type y: ndArray
+        :return: Bucket x and y index of each position.
+        :rtype: tuple
+        """
+
+        return x * self.buckets_x // self.length, y * self.buckets_y // self.width
+
+    def find_contacts(self):
+        """ Finds every pair of deer within the contact radius of each other, measured across the edges of the world.
+
+        :return: Indices a and b of each pair, with a < b.
+        :rtype: tuple
+        """
+
+        bucket_x, bucket_y = self.bucket(self.x, self.y)
+        key = bucket_x * self.buckets_y + bucket_y
+
+        # deer sorted by bucket, with the first deer and the number of deer of every bucket
+        order = np.argsort(key, kind='stable')
+        counts = np.bincount(key, minlength=self.buckets_x * self.buckets_y)
+        starts = np.cumsum(counts) - counts
+
+        first = []
+        second = []
+
+        for i, j in self.offsets:
+            neighbor = np.remainder(bucket_x + i, self.buckets_x) * self.buckets_y + np.remainder(bucket_y + j,
+                                                                                                    self.buckets_y)
+
+            # pair each deer with every deer of the neighboring bucket
+            size = counts[neighbor]
+            a = np.repeat(np.arange(self.agents), size)
+            within = np.arange(size.sum()) - np.repeat(np.cumsum(size) - size, size)
+            b = order[np.repeat(starts[neighbor], size) + within]
+
+            # each pair is found from both sides, only keep one
+            keep = a < b
+            first.append(a[keep])
+            second.append(b[keep])
+
+        a = np.concatenate(first)
+        b = np.concatenate(second)
+
+        # shortest distance between the pairs, wrapping around the edges of the world
+        dx = np.abs(self.x[a] - self.x[b])
+        dy = np.abs(self.y[a] - self.y[b])
+        dx = np.minimum(dx, self.length - dx)
+        dy = np.minimum(dy, self.width - dy)
+        close = dx * dx + dy * dy <= self.contact_radius ** 2
+
+        return a[close], b[close]
+
+    def step(self):
+        """ Finds the contacts of the herd at its current positions, spreads the disease through them, and moves every
+        deer one iteration.
+        """
+
+        a, b = self.find_contacts()
+
+        # only contacts between an infected and a susceptible deer can spread the disease
+        infected_a = self.infected[a]
+        exposed = infected_a != self.infected[b]
+        transmitted = exposed & (np.random.random(a.size) < self.transmission)
+        self.infected[np.where(infected_a, b, a)[transmitted]] = True
+
+        if a.size:
+            log = np.zeros(a.size, dtype=CONTACT_TYPE)
+            log['time'] = self.time
+            log['a'] = a
+            log['b'] = b
+            log['transmitted'] = transmitted
+            self.contacts.append(log)
+
+        # move every deer at once with the same rule as moore_neighborhood
+        normals = np.random.normal(size=(self.agents, 8))
+        dx, dy = moore_decision(self.movement[self.x * self.width + self.y], normals)
+        self.x = np.remainder(self.x + dx, self.length)
+        self.y = np.remainder(self.y + dy, self.width)
+
+        self.time += 1
+        self.infected_count.append(int(self.infected.sum()))
+
+    def run(self, time):
+        """ Moves the herd for a set amount of iterations.
+
+        :param time: Total amount of iterations to run the simulation
+        :type time: int
+        :return: Number of infected deer before the first and after each iteration.
+        :rtype: ndArray
+        """
+
+        for t in range(time):
+            self.step()
+
+        return np.asarray(self.infected_count)
+
+    def contact_log(self):
+        """ Every contact found so far, as a structured ndArray of time, a, b and transmitted.
+
+        :return: Contact log.
+        :rtype: ndArray
+        """
+
+        if not self.contacts:
+            return np.zeros(0, dtype=CONTACT_TYPE)
+
+        return np.concatenate(self.contacts)
@@ -4,7 +4,361 @@ import matplotlib.pyplot as plt
 import noise
 from matplotlib import cm
 import matplotlib.patches as mpatches
-import matplotlib.animation as animation
+from CaDeerStatistics import OccupancyMonitor, PathStatistics
+from CaDeerTrajectory import Trajectory
+from CaDeerPrion import PrionField
+from CaDeerTerrain import TileIndex, changed_terrain, wrapped_region
+from CaDeerRaster import FeatureValues, classify_raster, open_raster
+from CaDeerPatches import PatchIndex, PatchResidence
+from CaDeerTiles import TilePyramid
+from CaDeerVideo import FrameRenderer, segmented_mp4
+
+# offsets of the eight neighbors of the moore neighborhood, in the order they are checked by the deer
+MOORE_OFFSETS = np.array([[-1, -1], [-1, 0], [-1, 1], [0, -1], [0, 1], [1, -1], [1, 0], [1, 1]])
+
+# flat indices of the eight neighbors within a 3 by 3 square, skipping the current position in the middle
+MOORE_INDICES = np.array([0, 1, 2, 3, 5, 6, 7, 8])
+
+# blocks of the 7 by 7 extended moore neighborhood summed by view_finder for each position of the movement square,
+# given as ((first row, last row + 1), (first column, last column + 1))
+VIEW_SECTORS = {(0, 1): [((0, 2), (0, 7))],
+                (0, 0): [((0, 1), (0, 5)), ((1, 2), (0, 4)), ((2, 3), (0, 2)), ((3, 4), (0, 2)), ((4, 5), (0, 1))],
+                (1, 0): [((0, 7), (0, 2))],
+                (0, 2): [((0, 1), (2, 7)), ((1, 2), (3, 7)), ((2, 3), (5, 7)), ((3, 4), (5, 7)), ((4, 5), (6, 7))],
+                (1, 2): [((0, 7), (5, 7))],
+                (2, 2): [((6, 7), (2, 7)), ((5, 6), (3, 7)), ((4, 5), (5, 7)), ((3, 4), (5, 7)), ((2, 3), (6, 7))],
+                (2, 0): [((6, 7), (0, 5)), ((5, 6), (0, 4)), ((4, 5), (0, 2)), ((3, 4), (0, 2)), ((2, 3), (0, 1))],
+                (2, 1): [((5, 7), (0, 7))]}
+
+
+def pairwise_sum(values):
+    """ Adds a list of equally shaped arrays in the same order numpy uses when summing a contiguous array, so that
+    summing the arrays of every position of the world at once gives the exact same floats as np.sum does for a single
+    position.
+
+    :param values: Arrays to add, in row major order of the summed block.
+    :type values: list
+    :return: Sum of the arrays.
+    :rtype: ndArray
+    """
+
+    # short blocks are added one after another
+    if len(values) < 8:
+        total = values[0]
+        for value in values[1:]:
+            total = total + value
+        return total
+
+    # long blocks are split in half, at a multiple of 8
+    if len(values) > 128:
+        half = len(values) // 2
+        half -= half % 8
+        return pairwise_sum(values[:half]) + pairwise_sum(values[half:])
+
+    # eight partial sums that are combined pairwise, the rest is added one after another
+    partial = list(values[:8])
+    end = len(values) - len(values) % 8
+    for i in range(8, end, 8):
+        for j in range(8):
+            partial[j] = partial[j] + values[i + j]
+
+    total = ((partial[0] + partial[1]) + (partial[2] + partial[3])) + ((partial[4] + partial[5]) +
+                                                                       (partial[6] + partial[7]))
+    for value in values[end:]:
+        total = total + value
+
+    return total
+
+
+def triangle_sums(padded, size, corner):
+    """ Sums the triangle of every window of a padded array that holds the cells (i, j) of the window with
+    i + j <= corner, counted from the upper left corner of the window. Each triangle is found from anti-diagonal and
+    column running sums of the row prefix sums, so the cost does not depend on the size of the window.
+
+    :param padded: Padded array of values.
+    :type padded: ndArray
+    :param size: Number of rows and columns of each window.
+    :type size: int
+    :param corner: Largest i + j within the triangle, must be less than size.
+    :type corner: int
+    :return: Sum of the triangle of every window, of shape (rows - size + 1, columns - size + 1).
+    :rtype: ndArray
+    """
+
+    rows, columns = padded.shape
+    length = rows - size + 1
+    width = columns - size + 1
+
+    # prefix sums of each row, with a leading zero column
+    prefix = np.zeros((rows, columns + 1), dtype=padded.dtype)
+    prefix[:, 1:] = np.cumsum(padded, axis=1)
+
+    # running sums of the prefix sums down the columns, with a leading zero row
+    column_sums = np.zeros((rows + 1, columns + 1), dtype=padded.dtype)
+    column_sums[1:] = np.cumsum(prefix, axis=0)
+
+    # running sums of the prefix sums along each anti-diagonal, from the bottom left up to the top right
+    diagonal_sums = np.zeros((rows + 1, columns + 1), dtype=padded.dtype)
+    for row in range(rows):
+        diagonal_sums[row + 1, :-1] = prefix[row, :-1] + diagonal_sums[row, 1:]
+        diagonal_sums[row + 1, -1] = prefix[row, -1]
+
+    # row i of the triangle is prefix[x + i, y + corner + 1 - i] - prefix[x + i, y]
+    upper = diagonal_sums[corner + 1:corner + 1 + length, 1:1 + width] - \
+        diagonal_sums[0:length, corner + 2:corner + 2 + width]
+    lower = column_sums[corner + 1:corner + 1 + length, 0:width] - column_sums[0:length, 0:width]
+
+    return upper - lower
+
+
+def view_blocks(padded):
+    """ Computes the movement square view_finder passes into the moore neighborhood for every position of a padded
+    motility array. The values are the same floats view_finder creates, as the blocks of each view are added in the
+    same order.
+
+    :param padded: Motility values padded by 3 positions on every side.
+    :type padded: ndArray
+    :return: Movement squares as an ndArray of shape (rows - 6, columns - 6, 3, 3).
+    :rtype: ndArray
+    """
+
+    length = padded.shape[0] - 6
+    width = padded.shape[1] - 6
+
+    movement = np.zeros((length, width, 3, 3))
+    movement[:, :, 1, 1] = padded[3:3 + length, 3:3 + width]
+
+    for (i, j), blocks in VIEW_SECTORS.items():
+        view = None
+        for (row_start, row_end), (column_start, column_end) in blocks:
+            # every position of the block, in row major order
+            values = [padded[row:row + length, column:column + width] for row in range(row_start, row_end)
+                      for column in range(column_start, column_end)]
+            block = pairwise_sum(values)
+            view = block if view is None else view + block
+
+        movement[:, :, i, j] = view / 14
+
+    return movement
+
+
+def view_windows(windows):
+    """ Computes the movement square view_finder creates for a stack of 7 by 7 extended moore neighborhoods of
+    motility values, giving the same floats as view_blocks does for the positions at the middle of the windows. Used
+    when only a few positions of the world are needed.
+
+    :param windows: Motility values of each extended moore neighborhood, of shape (..., 7, 7).
+    :type windows: ndArray
+    :return: Movement squares as an ndArray of shape (..., 3, 3).
+    :rtype: ndArray
+    """
+
+    movement = np.zeros(windows.shape[:-2] + (3, 3))
+    movement[..., 1, 1] = windows[..., 3, 3]
+
+    for (i, j), blocks in VIEW_SECTORS.items():
+        view = None
+        for (row_start, row_end), (column_start, column_end) in blocks:
+            values = [windows[..., row, column] for row in range(row_start, row_end)
+                      for column in range(column_start, column_end)]
+            block = pairwise_sum(values)
+            view = block if view is None else view + block
+
+        movement[..., i, j] = view / 14
+
+    return movement
+
+
+def view_sectors(padded, radius):
+    """ Computes the movement square of every position of a padded motility array for a deer that sees radius
+    positions in every direction. The front, back, left and right views are the radius - 1 rows or columns at the
+    edges of the view, and each diagonal view is the triangle of the corner reaching to the movement square, leaving out
+    the movement square itself. Each view is the average of its positions. A radius of 3 gives the 14 position views of
+    view_finder, up to rounding. Each view is added up from the exact number of positions holding each motility value,
+    so the squares of a block of the world are the same floats as those of the whole world, see view_counts.
+
+    :param padded: Motility values padded by radius positions on every side.
+    :type padded: ndArray
+    :param radius: Number of positions the deer sees in every direction, must be 2 or more.
+    :type radius: int
+    :return: Movement squares as an ndArray of shape (rows - 2 * radius, columns - 2 * radius, 3, 3).
+    :rtype: ndArray
+    """
+
+    length = padded.shape[0] - 2 * radius
+    width = padded.shape[1] - 2 * radius
+
+    # number of bits that hold the count of a single value, and the number of values counted at once
+    bits = int((2 * radius + 1) ** 2).bit_length()
+    packed = 63 // bits
+
+    # sums of the views, added up in the same order of the motility values for every position
+    values, inverse = np.unique(padded, return_inverse=True)
+    inverse = inverse.reshape(padded.shape)
+    sums = np.zeros((3, 3, length, width))
+    count = np.zeros((3, 3, length, width), dtype=np.int64)
+    term = np.zeros((3, 3, length, width))
+    for first in range(0, len(values), packed):
+        group = range(first, min(first + packed, len(values)))
+        codes = np.zeros(padded.shape, dtype=np.int64)
+        for k, index in enumerate(group):
+            codes[inverse == index] = 1 << (bits * k)
+
+        # the count of each value is taken from the lowest bits, then shifted out
+        counts = view_counts(codes, radius)
+        for index in group:
+            np.bitwise_and(counts, (1 << bits) - 1, out=count)
+            np.right_shift(counts, bits, out=counts)
+            np.multiply(count, values[index], out=term)
+            sums += term
+
+    movement = np.zeros((length, width, 3, 3))
+    movement[:, :, 1, 1] = padded[radius:radius + length, radius:radius + width]
+
+    edge = (radius - 1) * (2 * radius + 1)
+    for i, j in [(0, 1), (2, 1), (1, 0), (1, 2)]:
+        movement[:, :, i, j] = sums[i, j] / edge
+
+    diagonal = radius * (2 * radius - 1) - 1
+    for i, j in [(0, 0), (0, 2), (2, 0), (2, 2)]:
+        movement[:, :, i, j] = sums[i, j] / diagonal
+
+    return movement
+
+
+def view_counts(codes, radius):
+    """ Sums each view of view_sectors over a padded array of int64 codes. The running sums of the summed area table
+    may wrap around, but the sum of a view is exact whenever it fits within an int64, as every sum is a difference of
+    running sums. Codes holding a set bit for each of several values, with enough bits between them for the largest
+    view, count every value at once.
+
+    :param codes: Padded array of int64 codes.
+    :type codes: ndArray
+    :param radius: Number of positions the deer sees in every direction, must be 2 or more.
+    :type radius: int
+    :return: Sum of each view as an ndArray of shape (3, 3, rows - 2 * radius, columns - 2 * radius), with a sum of
+    zero for the movement square itself.
+    :rtype: ndArray
+    """
+
+    size = 2 * radius + 1
+    length = codes.shape[0] - 2 * radius
+    width = codes.shape[1] - 2 * radius
+
+    # summed area table, with a leading zero row and column
+    table = np.zeros((codes.shape[0] + 1, codes.shape[1] + 1), dtype=np.int64)
+    table[1:, 1:] = np.cumsum(np.cumsum(codes, axis=0), axis=1)
+
+    def rectangle(row_start, row_end, column_start, column_end):
+        return (table[row_end:row_end + length, column_end:column_end + width] -
+                table[row_start:row_start + length, column_end:column_end + width] -
+                table[row_end:row_end + length, column_start:column_start + width] +
+                table[row_start:row_start + length, column_start:column_start + width])
+
+    sums = np.zeros((3, 3, length, width), dtype=np.int64)
+
+    # the edge views
+    sums[0, 1] = rectangle(0, radius - 1, 0, size)
+    sums[2, 1] = rectangle(radius + 2, size, 0, size)
+    sums[1, 0] = rectangle(0, size, 0, radius - 1)
+    sums[1, 2] = rectangle(0, size, radius + 2, size)
+
+    # the diagonal views, flipping the world so that each corner becomes the upper left corner
+    corner = 2 * radius - 2
+    for (i, j), (flip_rows, flip_columns) in {(0, 0): (False, False), (0, 2): (False, True),
+                                              (2, 0): (True, False), (2, 2): (True, True)}.items():
+        flipped = codes[::-1 if flip_rows else 1, ::-1 if flip_columns else 1]
+        triangle = triangle_sums(flipped, size, corner)[::-1 if flip_rows else 1, ::-1 if flip_columns else 1]
+
+        # the triangle reaches the corner of the movement square, which is not part of the view
+        movement_corner = codes[radius + i - 1:radius + i - 1 + length, radius + j - 1:radius + j - 1 + width]
+        sums[i, j] = triangle - movement_corner
+
+    return sums
+
+
+def perlin_world(length, width, scale, octaves, persistence, lacunarity, base):
+    """ Creates a world of Perlin Noise that tiles along both axes.
+
+    :param length: Length of the world.
+    :type length: int
+    :param width: Width of the world.
+    :type width: int
+    :param scale: Viewing scale of the Perlin Noise.
+    :type scale: float
+    :param octaves: Number of octaves of the Perlin Noise.
+    :type octaves: int
+    :param persistence: Persistence of the Perlin Noise.
+    :type persistence: float
+    :param lacunarity: Lacunarity of the Perlin Noise.
+    :type lacunarity: float
+    :param base: Starting point of the map.
+    :type base: int
+    :return: Perlin Noise of shape (length, width).
+    :rtype: ndArray
+    """
+
+    world = np.zeros((length, width))
+
+    for i in range(length):
+        for j in range(width):
+            world[i][j] = noise.pnoise2(i / scale, j / scale, octaves, persistence, lacunarity, length, width, base)
+
+    return world
+
+
+def movement_world(feature_world, motility_values, radius=3):
+    """ Computes the movement square of every position of a wrapping world, see view_blocks and view_sectors.
+
+    :param feature_world: Feature index of each position of the world.
+    :type feature_world: ndArray
+    :param motility_values: Motility values of each feature.
+    :type motility_values: ndArray
+    :param radius: Number of positions the deer sees in every direction. Default is 3.
+    :type radius: int, optional
+    :return: Movement squares of the world as a (length, width, 3, 3) ndArray of floats.
+    :rtype: ndArray
+    """
+
+    # motility value of each position, padded so that every view of the world is a slice
+    motility = np.take(np.asarray(motility_values, dtype=float), feature_world)
+    padded = np.pad(motility, radius, mode='wrap')
+
+    if radius == 3:
+        return view_blocks(padded)
+    return view_sectors(padded, radius)
+
+
+def moore_decision(square, normals):
+    """ Side effect free version of the moore neighborhood movement rule. A neighbor is a candidate when its value is
+    less than the average of the square plus its random normal value, and the candidate with the lowest value is
+    chosen. Ties go to the first neighbor in row major order, and when there are no candidates the deer moves to the
+    upper left neighbor, matching the moore_neighborhood function of CaDeer. Stacked squares of shape (N, 3, 3) with
+    normals of shape (N, 8) decide the moves of N deer at once.
+
+    :param square: Moore neighborhood array of floats, must be a 3x3 ndArray or a stack of them.
+    :type square: ndArray
+    :param normals: Random normal values for each of the eight neighbors in row major order, must be of shape (8,) or
+    (N, 8) when the squares are stacked.
+    :type normals: ndArray
+    :return: Movement along the x-axis and y-axis, either as ints or as int ndArrays for stacked squares.
+    :rtype: tuple
+    """
+
+    square = np.asarray(square, dtype=float)
+    flat = square.reshape(square.shape[:-2] + (9,))
+
+    # the average includes the current position
+    average = flat.mean(axis=-1)
+    neighbors = flat[..., MOORE_INDICES]
+
+    # values of 100 or more are never chosen, as that is the starting motility of moore_neighborhood
+    candidates = (neighbors < average[..., None] + normals) & (neighbors < 100.0)
+
+    # argmin returns the first of the lowest values, and the upper left neighbor when there are no candidates
+    choice = np.where(candidates, neighbors, np.inf).argmin(axis=-1)
+
+    return MOORE_OFFSETS[choice, 0], MOORE_OFFSETS[choice, 1]
 
 
 class CaDeer(object):
@@ -31,9 +385,13 @@ class CaDeer(object):
         colors, color_range, feature_list, and names arrays. Default is 5, and will be used for all other functions
         to run the cellular automata.
         :type features: int, optional
+        :param view_radius: Number of positions the deer sees in every direction when choosing its next move. Default is
+        3, the 7 by 7 extended moore neighborhood of view_finder.
+        :type view_radius: int, optional
     """
 
-    def __init__(self, scale=100.0, octaves=6, persistence=None, lacunarity=None, base=None, features=5):
+    def __init__(self, scale=100.0, octaves=6, persistence=None, lacunarity=None, base=None, features=5,
+                 view_radius=3):
         """
         Constructor method
         """
@@ -49,8 +407,33 @@ class CaDeer(object):
         self.persistence = persistence
         self.lacunarity = lacunarity
         self.base = base
+
+        if view_radius >= 2:
+            self.view_radius = view_radius
+        else:
+            print("View radius has been set to default, please enter a view radius of 2 or more")
+            self.view_radius = 3
+        # movement squares of every position for view radii other than 3, see step
+        self.view_squares = None
+        # changes of the terrain during a walk, see set_schedule
+        self.terrain_schedule = None
+        self.tile_index = None
+        # raster the world was loaded from, see load_raster
+        self.raster = None
+
         self.starting_pos_x = None
         self.starting_pos_y = None
+        # prions shed by the deer, see infect
+        self.prion_field = None
+        # patches visited by the deer, see track_patches, and the trackers of the patches before each change of the
+        # terrain
+        self.patch_index = None
+        self.patch_residence = None
+        self.patch_history = []
+        # Markov chain of the last call to solve_occupancy, refreshed when the terrain changes
+        self.markov_chain = None
+        # path recorded by pathing or walk with record=True
+        self.trajectory = None
         # used to get corrected grayscale
         color = cm.get_cmap('gray')
         self.cmap = color.reversed()
@@ -98,6 +481,15 @@ class CaDeer(object):
             default = True
             print("Color range column does not match the length of the other, default values have been set.")
 
+        # gather the prion decay rates from the optional Decay column
+        if 'Decay' in df.columns:
+            self.decay_rates = df['Decay'].values.astype(float)
+            if np.isnan(np.sum(self.decay_rates)):
+                print("Decay column does not match the length of the other, no decay has been set.")
+                self.decay_rates = np.zeros(len(self.names))
+        else:
+            self.decay_rates = np.zeros(len(self.names))
+
         if default:
             self.default()
 
@@ -160,13 +552,21 @@ class CaDeer(object):
         return colors
 
     def color_world(self):
-        """ Used to create the RGBA world as well as color range values of the world.
+        """ Used to create the RGBA world as well as color range values of the world. A world loaded by load_raster
+        already holds its features, so only the RGBA world is created, which is needed by pathing but not by walk. The
+        RGBA world of a loaded raster holds one byte per channel, from 0 to 255, instead of a float64 copy, see rgba.
         """
 
+        if self.raster is not None:
+            self.world_color = np.round(np.asarray(self.colors, dtype=float) * 255).astype(np.uint8)[self.feature_world]
+            return
+
         # create RGB from size of the heat map of the world
         self.world_color = np.zeros(self.world.shape + (4,))
         # loop through and create a CA model from the original world
         self.ca_world = np.zeros(self.world.shape)
+        # index of the feature found at each position of the world
+        self.feature_world = np.zeros(self.world.shape, dtype=np.uint8)
 
         # create RGB from heat map
         for i in range(self.length):
@@ -175,8 +575,28 @@ class CaDeer(object):
                 k = np.where(self.world[i][j] < self.color_range)
                 # use index
                 self.ca_world[i][j] = self.color_range[k[0][0]]
+                self.feature_world[i][j] = k[0][0]
                 self.world_color[i][j] = self.colors[k[0][0]]
 
+        # the movement squares, tiles and chain of the old world are no longer valid
+        self.view_squares = None
+        self.tile_index = None
+        self.markov_chain = None
+
+    def rgba(self, color):
+        """ Converts an RGBA color of floats between 0 and 1 into the values held by the RGBA world, which run from 0
+        to 255 for a loaded raster.
+
+        :param color: Red, green, blue and alpha values between 0 and 1.
+        :type color: list
+        :return: Color in the values of the RGBA world.
+        :rtype: ndArray
+        """
+
+        if self.world_color is not None and self.world_color.dtype == np.uint8:
+            return np.round(np.asarray(color, dtype=float) * 255).astype(np.uint8)
+        return np.asarray(color, dtype=float)
+
     def create_world(self, length=250, width=250):
         """ Creates the Perlin Noise given user dimensions.
 
@@ -199,14 +619,50 @@ class CaDeer(object):
         if self.base is None:
             self.base = np.random.randint(0, 25)
 
-        # create the world array
-        self.world = np.zeros((self.length, self.width))
-
         # use perlin noise to generate random world
-        for i in range(self.length):
-            for j in range(self.width):
-                self.world[i][j] = noise.pnoise2(i / self.scale, j / self.scale, self.octaves, self.persistence,
-                                                 self.lacunarity, self.length, self.width, self.base)
+        self.world = perlin_world(self.length, self.width, self.scale, self.octaves, self.persistence,
+                                  self.lacunarity, self.base)
+        self.raster = None
+
+    def load_raster(self, raster, codes=None, window=1024):
+        """ Uses a landscape raster as the world instead of Perlin Noise. The raster is read one window at a time, so a
+        memory mapped raster larger than memory can be used, and only a feature index raster of one byte per position
+        is kept. Continuous rasters are classified with the color range, and land cover rasters are mapped from their
+        codes. Features must be gathered before loading the raster.
+
+        :param raster: Raster of shape (length, width), or the file path of a NPY or TIFF raster. Raw binary rasters
+        are opened with CaDeerRaster.open_raster first.
+        :type raster: ndArray or string
+        :param codes: Name or feature index of each land cover code, such as {11: 'water', 42: 'spruce'}. Default is
+        None, which will classify the raster with the color range.
+        :type codes: dict, optional
+        :param window: Number of rows and columns read at once. Default is 1024.
+        :type window: int, optional
+        """
+
+        if isinstance(raster, str):
+            raster = open_raster(raster)
+            if raster is None:
+                return
+
+        if codes is not None:
+            codes = {code: self.names.index(feature) if isinstance(feature, str) else feature
+                     for code, feature in codes.items()}
+            self.feature_world = classify_raster(raster, codes=codes, window=window)
+        else:
+            self.feature_world = classify_raster(raster, thresholds=self.color_range, window=window)
+
+        self.raster = raster
+        self.world = raster
+        self.length, self.width = self.feature_world.shape
+
+        # color range values are looked up from the features when they are read
+        self.ca_world = FeatureValues(self.feature_world, self.color_range)
+        self.world_color = None
+
+        self.view_squares = None
+        self.tile_index = None
+        self.markov_chain = None
 
     def default(self):
         """ Provides the default values for the features, colors, color_range, motility_values, and names. Default
@@ -228,8 +684,11 @@ class CaDeer(object):
         # default of 5 names
         self.names = ['barren', 'water', 'pasture', 'spruce', 'mixed confir']
 
+        # default of no prion decay
+        self.decay_rates = [0, 0, 0, 0, 0]
+
     def gather_features(self, output_excel_name, light_mode=False, input_excel_name=None, color_range=None, colors=None,
-                        motility_values=None, terrain_names=None):
+                        motility_values=None, terrain_names=None, decay_rates=None):
         """ This function gathers all needed values used for coloring in the world as well as running the simulation.
             User must provide the name of the output name of the excel file. All other choices must match the number of
             features that was used in class creation.
@@ -253,6 +712,9 @@ class CaDeer(object):
             :param terrain_names: Holds the names of the terrain that are used within the simulation. Must match the
             number of features.
             :type terrain_names: list, optional
+            :param decay_rates: Holds the decay rate of prions within each terrain, per iteration. Must match the
+            number of features. Can also be given by a Decay column of the excel file. Default is no decay.
+            :type decay_rates: ndArray, optional
             """
 
         # save string name for later
@@ -300,6 +762,14 @@ class CaDeer(object):
                     print("Default values have been set. Please enter an equal amount of names to features.")
                     self.default()
 
+            if decay_rates is None:
+                self.decay_rates = np.zeros(self.features)
+            else:
+                self.decay_rates = decay_rates
+                if len(self.decay_rates) != self.features:
+                    print("No decay has been set. Please enter an equal amount of decay rates to features.")
+                    self.decay_rates = np.zeros(self.features)
+
         self.rgb_to_rgba()
         self.create_dictionary()
 
@@ -337,31 +807,13 @@ class CaDeer(object):
         :type square: ndArray
         """
 
-        # default for current motility
-        current_motility = 100.0
-        self.next_position_y = 0
-        self.next_position_x = 0
+        # random normal value for each of the eight neighbors, in the order they are checked
+        normals = np.random.normal(size=8)
 
-        average = np.average(square)
+        dx, dy = moore_decision(square, normals)
 
-        for i in range(len(square)):
-            for j in range(len(square[0])):
-                # compare options based off being less than average, while excluding the curr_pos
-                check_motility = square[i][j]
-
-                # check to see if the new motility is less than the average
-                # ignore the current position in the middle of the grid
-                if not (i == 1 and j == 1):
-                    # add randomness to increase movement
-                    if check_motility < average + np.random.normal():
-                        if check_motility < current_motility:
-                            current_motility = check_motility
-                            self.next_position_x = i
-                            self.next_position_y = j
-
-        # update for the fact that position is in the middle of the grid
-        self.next_position_x -= 1
-        self.next_position_y -= 1
+        self.next_position_x = int(dx)
+        self.next_position_y = int(dy)
 
     def view_finder(self, square):
         """ This function simulates the viewing of the deer as it uses an extended moore neighborhood to help find the
@@ -422,6 +874,262 @@ class CaDeer(object):
 
         self.moore_neighborhood(movement)
 
+    def view_world(self, radius=None, motility_values=None):
+        """ Computes the movement square that view_finder passes into the moore neighborhood for every position of the
+        world at once, wrapping around the edges of the world. With a radius of 3 the values are the same floats
+        view_finder creates, see view_blocks. Other radii use view_sectors.
+
+        :param radius: Number of positions the deer sees in every direction. Default is None, which will use the view
+        radius of the deer.
+        :type radius: int, optional
+        :param motility_values: Motility values of each feature. Default is None, which will use the motility values of
+        the deer.
+        :type motility_values: ndArray, optional
+        :return: Movement squares of the world as a (length, width, 3, 3) ndArray of floats.
+        :rtype: ndArray
+        """
+
+        if radius is None:
+            radius = self.view_radius
+        if motility_values is None:
+            motility_values = self.motility_values
+
+        return movement_world(self.feature_world, motility_values, radius)
+
+    def solve_occupancy(self, target=None, method='direct'):
+        """ Solves the long run occupancy of the world from the movement rule instead of simulating the deer. The chance
+        of each move is computed for every position, which gives a sparse Markov chain whose stationary distribution is
+        the fraction of time the deer spends at each position. Optionally solves the expected number of iterations
+        needed to reach a target terrain from every position. The chain is kept in self.markov_chain, which is refreshed
+        by change_motility and edit_region, so it can be solved again after the terrain changes.
+
+        Both solves are sparse LU factorizations whose memory grows faster than the world, about 2.5 GB at 1000 by 1000
+        and 4.8 GB at 1414 by 1414, so worlds past roughly 1500 by 1500 need more memory than most machines have. Power
+        iteration does not converge on worlds where the deer is trapped, see MarkovDeer.stationary_distribution.
+
+        :param target: Name or feature index of the target terrain used for the hitting times. Default is None, which
+        will skip the hitting times.
+        :type target: str or int, optional
+        :param method: Either 'direct' or 'power', see MarkovDeer.stationary_distribution. Default is 'direct'.
+        :type method: str, optional
+        :return: Occupancy raster, occupancy of each terrain, and hitting times of the world.
+        :rtype: OccupancySolution
+        """
+
+        # imported here as CaDeerMarkov builds on this module
+        from CaDeerMarkov import MarkovDeer, OccupancySolution
+
+        chain = MarkovDeer(self)
+        self.markov_chain = chain
+        occupancy = chain.stationary_distribution(method=method)
+
+        hitting_times = None
+        if target is not None:
+            if isinstance(target, str):
+                target = self.names.index(target)
+            hitting_times = chain.hitting_times(self.feature_world == target)
+
+        self.occupancy_solution = OccupancySolution(occupancy, self.feature_world, self.names[:self.features],
+                                                    hitting_times=hitting_times, target=target)
+
+        return self.occupancy_solution
+
+    def calibrate_motility(self, tracks, bounds=(0.01, 5.0), reference=0, workers=None, maxiter=100, popsize=15,
+                           seed=None):
+        """ Fits the motility values of each feature to observed tracks within the world, such as GPS fixes snapped to
+        the world, by searching for the values that give the tracks the highest likelihood under the movement rule.
+        The likelihood and the search are kept in self.calibration, see TrackLikelihood.
+
+        :param tracks: Observed tracks, each either an ndArray of x and y positions of shape (n, 2) or a Trajectory.
+        :type tracks: list
+        :param bounds: Lowest and highest motility value searched, either a single pair for every feature or a pair for
+        each feature. Default is (0.01, 5.0).
+        :type bounds: tuple or list, optional
+        :param reference: Feature index whose motility value is held at its current value. Default is 0.
+        :type reference: int, optional
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :param maxiter: Maximum number of generations of the search. Default is 100.
+        :type maxiter: int, optional
+        :param popsize: Multiplier of the population size of the search. Default is 15.
+        :type popsize: int, optional
+        :param seed: Seed of the search. Default is None.
+        :type seed: int, optional
+        :return: Fitted motility values of each feature.
+        :rtype: ndArray
+        """
+
+        # imported here as CaDeerCalibration builds on this module
+        from CaDeerCalibration import TrackLikelihood
+
+        self.calibration = TrackLikelihood(self, tracks)
+
+        return self.calibration.fit(bounds=bounds, reference=reference, workers=workers, maxiter=maxiter,
+                                    popsize=popsize, seed=seed)
+
+    def set_schedule(self, schedule, tile_size=64):
+        """ Sets the changes of the terrain applied during pathing and walk. The world is split into tiles, so that each
+        change only computes the precomputed data of the tiles it reaches again.
+
+        :param schedule: Changes of the terrain and the iterations they happen at. None removes the schedule.
+        :type schedule: TerrainSchedule
+        :param tile_size: Number of positions along each side of a tile. Default is 64.
+        :type tile_size: int, optional
+        """
+
+        self.terrain_schedule = schedule
+        self.tile_index = TileIndex(self.feature_world, self.features, tile_size)
+
+    def terrain_events(self, t, statistics=None):
+        """ Applies the changes of the terrain scheduled for an iteration.
+
+        :param t: Iteration of the walk.
+        :type t: int
+        :param statistics: Statistics of the walk in progress, whose motility values are changed along with the
+        terrain. Default is None.
+        :type statistics: PathStatistics, optional
+        :return: Set of the tiles whose precomputed data was computed again.
+        :rtype: set
+        """
+
+        tiles = set()
+
+        for kind, values in self.terrain_schedule.due(t):
+            if kind == 'motility':
+                tiles |= self.change_motility(values)
+                if statistics is not None:
+                    statistics.set_motility(self.motility_values)
+            else:
+                tiles |= self.edit_region(*values)
+
+        return tiles
+
+    def change_motility(self, motility_values):
+        """ Replaces the motility values of the features. Only the tiles holding a feature whose value changed, along
+        with the tiles within view of them, have their movement squares computed again, along with the chance of each
+        move within the Markov chain of solve_occupancy. The statistics of a walk only follow the change when it is
+        made through the terrain schedule, see terrain_events.
+
+        :param motility_values: New motility values of each feature.
+        :type motility_values: ndArray
+        :return: Set of the tiles whose movement squares were computed again.
+        :rtype: set
+        """
+
+        motility_values = np.asarray(motility_values, dtype=float)
+        if motility_values.size != self.features:
+            print("Motility values have not been changed. Please enter motility values that match the number of "
+                  "features.")
+            return set()
+
+        if self.tile_index is None:
+            self.tile_index = TileIndex(self.feature_world, self.features)
+
+        changed = np.flatnonzero(motility_values != np.asarray(self.motility_values, dtype=float))
+        tiles = self.tile_index.feature_tiles(changed, halo=self.view_radius)
+
+        self.motility_values = motility_values
+        self.create_dictionary()
+        self.refresh_tiles(tiles)
+
+        if self.markov_chain is not None:
+            self.markov_chain.refresh(self, tiles)
+
+        return tiles
+
+    def edit_region(self, x_start, x_end, y_start, y_end, feature):
+        """ Turns a region of the world into a single feature, wrapping around the edges of the world. Only the tiles
+        within view of the region have their movement squares computed again, along with the chance of each move
+        within the Markov chain of solve_occupancy. The prions within the region decay at the rate of the new terrain,
+        and the patches are labeled again, see refresh_patches.
+
+        :param x_start: First x position of the region.
+        :type x_start: int
+        :param x_end: x position after the last x position of the region.
+        :type x_end: int
+        :param y_start: First y position of the region.
+        :type y_start: int
+        :param y_end: y position after the last y position of the region.
+        :type y_end: int
+        :param feature: Name or feature index of the new terrain of the region.
+        :type feature: str or int
+        :return: Set of the tiles whose movement squares were computed again.
+        :rtype: set
+        """
+
+        if isinstance(feature, str):
+            if feature not in self.names[:self.features]:
+                print("Region has not been changed, please enter the name or index of a terrain.")
+                return set()
+            feature = self.names.index(feature)
+
+        if self.tile_index is None:
+            self.tile_index = TileIndex(self.feature_world, self.features)
+
+        region = wrapped_region((self.length, self.width), x_start, x_end, y_start, y_end)
+
+        self.feature_world[region] = feature
+        # a loaded raster looks its color range values up from the features
+        if self.raster is None:
+            self.ca_world[region] = self.color_range[feature]
+        if self.world_color is not None:
+            self.world_color[region] = self.rgba(self.colors[feature])
+
+        for tile_x, tile_y in self.tile_index.region_tiles(x_start, x_end, y_start, y_end):
+            self.tile_index.count(tile_x, tile_y)
+
+        tiles = self.tile_index.region_tiles(x_start, x_end, y_start, y_end, halo=self.view_radius)
+        self.refresh_tiles(tiles)
+
+        if self.prion_field is not None:
+            self.prion_field.set_rates(region, np.asarray(self.decay_rates, dtype=float)[feature])
+        if self.patch_residence is not None:
+            self.refresh_patches()
+        if self.markov_chain is not None:
+            self.markov_chain.refresh(self, tiles)
+
+        return tiles
+
+    def tile_squares(self, x_start, x_end, y_start, y_end):
+        """ Computes the movement squares of a block of the world, the same values view_world gives for the block.
+
+        :param x_start: First x position of the block.
+        :type x_start: int
+        :param x_end: x position after the last x position of the block.
+        :type x_end: int
+        :param y_start: First y position of the block.
+        :type y_start: int
+        :param y_end: y position after the last y position of the block.
+        :type y_end: int
+        :return: Movement squares of the block as a (x_end - x_start, y_end - y_start, 3, 3) ndArray of floats.
+        :rtype: ndArray
+        """
+
+        radius = self.view_radius
+
+        # the block along with every position within view of it
+        rows = np.remainder(np.arange(x_start - radius, x_end + radius), self.length)
+        columns = np.remainder(np.arange(y_start - radius, y_end + radius), self.width)
+        padded = np.take(np.asarray(self.motility_values, dtype=float), self.feature_world[np.ix_(rows, columns)])
+
+        if radius == 3:
+            return view_blocks(padded)
+        return view_sectors(padded, radius)
+
+    def refresh_tiles(self, tiles):
+        """ Computes the movement squares of a set of tiles again, when they have been computed for the whole world.
+
+        :param tiles: Set of the x and y index of each tile.
+        :type tiles: set
+        """
+
+        if self.view_squares is None:
+            return
+
+        for tile_x, tile_y in tiles:
+            x_start, x_end, y_start, y_end = self.tile_index.bounds(tile_x, tile_y)
+            self.view_squares[x_start:x_end, y_start:y_end] = self.tile_squares(x_start, x_end, y_start, y_end)
+
     def live_updater(self, buffer, t, colors, motility, prev_pos_x, prev_pos_y):
         """ Provides the ability to update the matplotlib output given the current position of the deer. Calls the
         alpha change function to update the current value of the RGBA pixel position.
@@ -453,7 +1161,7 @@ class CaDeer(object):
         buffer[prev_pos_x][prev_pos_y] = self.world_color[prev_pos_x][prev_pos_y]
 
         # use pink for current position [255, 0, 255]
-        buffer[self.current_pos_x][self.current_pos_y] = [255 / 255, 0 / 255, 255 / 255, 1]
+        buffer[self.current_pos_x][self.current_pos_y] = self.rgba([255 / 255, 0 / 255, 255 / 255, 1])
 
         # add in location and iteration/time passed
         string = "t {} \n (x,y): ({},{})\n s {} o {} p {} l {} b {} f {}".format(t,
@@ -486,7 +1194,8 @@ class CaDeer(object):
         # use to determine the time between each iteration
         plt.pause(0.3)
 
-    def pathing(self, time, live_update=False, encoding=None, mpfour_output=None):
+    def pathing(self, time, live_update=False, encoding=None, mpfour_output=None, tolerance=None, confidence=0.95,
+                batches=32, batch_size=100):
         """ Given a set amount of iterations this function simulates the deer within the generated world. The use of
         live_update allows the user to see the deer move after each iteration. User can output a mp4 video given a
         name/address of the save file. Use encoding for faster performance assuming the user's computer allows for
@@ -500,6 +1209,17 @@ class CaDeer(object):
         :type encoding: string, optional
         :param mpfour_output: Determines name and address of mp4 output
         :type mpfour_output: string, optional
+        :param tolerance: Stops the simulation once the occupancy of every terrain is known to within the tolerance,
+        with time as the most iterations to run, see walk. Default is None, which will run every iteration.
+        :type tolerance: float, optional
+        :param confidence: Confidence level of the occupancy intervals. Default is 0.95.
+        :type confidence: float, optional
+        :param batches: Number of batches of the occupancy intervals, see OccupancyMonitor. Default is 32.
+        :type batches: int, optional
+        :param batch_size: Number of iterations of each batch before any merging. Default is 100.
+        :type batch_size: int, optional
+        :return: Statistics of the path taken by the deer, such as the visits and transitions between terrains.
+        :rtype: PathStatistics
         """
 
         # get starting positions
@@ -509,11 +1229,15 @@ class CaDeer(object):
         if mpfour_output is not None:
             live_update = False
 
-        # make a copy of the world
-        buffer = np.copy(self.world_color)
+        # make a copy of the world, only drawn into by the live updates
+        buffer = np.copy(self.world_color) if live_update else None
+
+        # holds the moves of the path taken by the deer
+        self.trajectory = Trajectory(self.current_pos_x, self.current_pos_y, self.length, self.width)
 
-        # holds the x,y coordinates of the path taken by the deer
-        path_taken = []
+        # summary statistics of the path that are updated during the simulation
+        statistics = PathStatistics(self.features, self.motility_values, self.names)
+        monitor = self.start_monitor(statistics, tolerance, confidence, batches, batch_size)
 
         # clear up strings by adding path and deer
         motility = self.string_names()
@@ -535,10 +1259,11 @@ class CaDeer(object):
             plt.ion()
             plt.figure()
 
+        # frames are streamed into ffmpeg a chunk of positions at a time instead of being kept as figures
+        renderer = None
+        frames = []
         if mpfour_output is not None:
-            self.ims = []
-            writer = animation.FFMpegWriter(fps=30, codec=encoding)
-            fig = plt.figure()
+            renderer = FrameRenderer(self, mpfour_output, encoding=encoding)
 
         # loop through the iterations known as time
         for t in range(time):
@@ -547,59 +1272,324 @@ class CaDeer(object):
                 self.live_updater(buffer=buffer, t=t, colors=colors, motility=motility,
                                   prev_pos_x=prev_pos_x, prev_pos_y=prev_pos_y)
 
-            if mpfour_output is not None:
-                self.mp4(buffer=buffer, t=t, colors=colors, motility=motility,
-                         prev_pos_x=prev_pos_x, prev_pos_y=prev_pos_y)
-
-            # add previous position of the deer to a list
-            path_taken.append([prev_pos_x, prev_pos_y])
+            if renderer is not None:
+                frames.append((self.current_pos_x, self.current_pos_y))
+                if len(frames) == 1024:
+                    renderer.consume(t - len(frames) + 1, np.remainder(frames, [self.length, self.width]), None)
+                    frames = []
 
             # update the RGBA world with current position of the world
             self.world_color[prev_pos_x][prev_pos_y] = self.alpha_change(self.world_color[prev_pos_x][prev_pos_y])
 
-            # find the square that the deer is considering based off of the current position
-            square_choice = self.edge_check(x=self.current_pos_x, y=self.current_pos_y)
-
-            # use Moore neighborhood to select the next position
-            self.view_finder(square_choice)
-
             # previous position
             prev_pos_x = self.current_pos_x
             prev_pos_y = self.current_pos_y
 
-            # update current position to future position
-            self.current_pos_x += self.next_position_x
-            self.current_pos_y += self.next_position_y
+            if self.terrain_schedule is not None:
+                self.terrain_events(t, statistics)
+
+                # the frames up to this iteration are drawn on the old terrain
+                if renderer is not None and self.terrain_schedule.due(t):
+                    renderer.consume(t - len(frames) + 1, np.remainder(frames, [self.length, self.width]), None)
+                    frames = []
+                    renderer.terrain(*changed_terrain(self, self.terrain_schedule.due(t)))
+
+            # move the deer to the next position while updating the statistics and the trajectory
+            self.step(statistics, self.trajectory)
 
-            self.current_pos_x = np.remainder(self.current_pos_x, self.length)
-            self.current_pos_y = np.remainder(self.current_pos_y, self.width)
             print("\rPathing: {:.2f} ".format(t / time * 100), end="")
 
+            if monitor is not None and monitor.update(statistics):
+                break
+
         print("\rPathing: 100%")
+        self.report_monitor(monitor, statistics)
 
         if live_update:
             # used to end the video format
             plt.ioff()
             plt.close()
 
-        if mpfour_output is not None:
-            ani = animation.ArtistAnimation(fig, self.ims, interval=500, blit=True)
-            ani.save(mpfour_output + '.mp4', writer=writer)
+        if renderer is not None:
+            if frames:
+                renderer.consume(statistics.steps - len(frames), np.remainder(frames, [self.length, self.width]), None)
+            renderer.close()
 
         self.output_world(self.world_color)
         self.path_map()
 
-        terrain_path = []
-        motilities_taken = []
+        self.trajectory_excel(self.trajectory, self.output_excel_name, 0, statistics.steps)
+
+        statistics.finish(int(self.feature_world[self.current_pos_x, self.current_pos_y]))
+        self.path_statistics = statistics
+
+        return statistics
+
+    def trajectory_excel(self, trajectory, excel_output_name, start=0, stop=None):
+        """ Outputs the positions of a range of steps of a trajectory into an excel sheet showing the terrain name and
+        the motility assigned to the terrain. Only the steps within the range are decoded.
+
+        :param trajectory: Trajectory of the deer within this world.
+        :type trajectory: Trajectory
+        :param excel_output_name: Name of the Excel file the user wishes to output data from the simulation.
+        :type excel_output_name: str
+        :param start: First step to output. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step to output. Default is None, which will output to the end of the path.
+        :type stop: int, optional
+        """
+
+        positions = trajectory.positions(start, stop)
+        features = self.feature_world[positions[:, 0], positions[:, 1]]
+
+        terrain_path = [self.names[feature] for feature in features]
+        motilities_taken = np.asarray(self.motility_values)[features].tolist()
+
+        self.excel_write(path_taken=terrain_path, excel_output_name=excel_output_name,
+                         motilities_taken=motilities_taken, axis_position=positions.tolist())
+
+    def render_mp4(self, mpfour_output, encoding=None, segments=None, fps=30, upscale=4):
+        """ Renders the recorded trajectory of the deer into an mp4, splitting the trajectory into segments that are
+        rendered and encoded by their own processes before being joined together, see segmented_mp4. Uses the
+        trajectory of the last call to pathing or walk with record=True.
+
+        :param mpfour_output: Determines name and address of mp4 output
+        :type mpfour_output: string
+        :param encoding: Determines if the user wants to encode the mp4 with a specific set of encoding instructions.
+        :type encoding: string, optional
+        :param segments: Number of segments. Default is None, which will use the number of CPUs.
+        :type segments: int, optional
+        :param fps: Frames per second of the mp4 output. Default is 30.
+        :type fps: int, optional
+        :param upscale: Number of pixels used for each position of the world along each axis. Default is 4.
+        :type upscale: int, optional
+        :return: Name of the mp4 output.
+        :rtype: str
+        """
+
+        renderer = FrameRenderer(self, mpfour_output, encoding=encoding, fps=fps, upscale=upscale)
+
+        return segmented_mp4(renderer, self.trajectory, segments=segments)
+
+    def export_tiles(self, directory, tile_size=256, layers=None, workers=None):
+        """ Writes the world, the visits of the deer, and its trail as a deep zoom pyramid of PNG tiles, which keeps the
+        detail of the path within very large worlds. Uses the trajectory of the last call to pathing or walk with
+        record=True when there is one. The pyramid is kept in self.tile_pyramid, and later walks are added to it with
+        self.tile_pyramid.update, which only renders the tiles the deer touched.
+
+        :param directory: Directory the pyramid is written to.
+        :type directory: string
+        :param tile_size: Number of pixels along each side of a tile. Default is 256.
+        :type tile_size: int, optional
+        :param layers: Layers to write, any of 'world', 'heatmap', and 'path'. Default is None, which will write all
+        three.
+        :type layers: list, optional
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :return: Pyramid of the world.
+        :rtype: TilePyramid
+        """
+
+        self.tile_pyramid = TilePyramid(self, directory, tile_size=tile_size, layers=layers)
+        self.tile_pyramid.export(self.trajectory, workers=workers)
+
+        return self.tile_pyramid
+
+    def infect(self, shedding=1.0):
+        """ Makes the deer shed prions at its position during each iteration of pathing or walk. The prions decay at
+        the decay rate of the terrain they were shed on and are kept in self.prion_field, which carries on across walks
+        until the deer is infected again.
+
+        :param shedding: Amount of prions shed at each iteration. Default is 1.0.
+        :type shedding: float, optional
+        :return: Field holding the prions shed by the deer.
+        :rtype: PrionField
+        """
+
+        self.prion_field = PrionField(self.feature_world, self.decay_rates, shedding)
+
+        return self.prion_field
+
+    def track_patches(self, connectivity=8):
+        """ Labels the patches of the world and follows the deer from patch to patch during each iteration of pathing
+        or walk. The entries and residence times are kept in self.patch_residence, which carries on across walks until
+        the patches are tracked again, and is replaced when the terrain changes, see refresh_patches.
+
+        :param connectivity: Either 8 or 4, see PatchIndex. Default is 8.
+        :type connectivity: int, optional
+        :return: Tracker of the patches visited by the deer.
+        :rtype: PatchResidence
+        """
+
+        self.patch_index = PatchIndex(self.feature_world, self.names[:self.features], connectivity)
+        self.patch_residence = PatchResidence(self.patch_index)
+        self.patch_history = []
+
+        return self.patch_residence
+
+    def refresh_patches(self):
+        """ Labels the patches again after a region of the world has changed, as patches may have grown, split or
+        merged. The tracker of the old patches is kept in self.patch_history, and the new tracker carries on from its
+        iteration, so the deer enters the patch it is within again.
+
+        :return: Tracker of the patches visited by the deer.
+        :rtype: PatchResidence
+        """
+
+        previous = self.patch_residence
+        self.patch_index = PatchIndex(self.feature_world, self.names[:self.features], previous.index.connectivity)
+        self.patch_residence = PatchResidence(self.patch_index)
+        self.patch_residence.time = previous.time
+        self.patch_history.append(previous)
+
+        return self.patch_residence
+
+    def step(self, statistics=None, trajectory=None):
+        """ Moves the deer a single iteration from its current position using the view finder and moore neighborhood.
+
+        :param statistics: Path statistics that are updated with the current position and the move taken.
+        :type statistics: PathStatistics, optional
+        :param trajectory: Trajectory the move taken is added to.
+        :type trajectory: Trajectory, optional
+        """
+
+        if self.view_radius == 3:
+            # find the square that the deer is considering based off of the current position
+            square_choice = self.edge_check(x=self.current_pos_x, y=self.current_pos_y)
+
+            # use Moore neighborhood to select the next position
+            self.view_finder(square_choice)
+        else:
+            # other view radii look up the movement squares of the whole world, computed once
+            if self.view_squares is None:
+                self.view_squares = self.view_world()
+            self.moore_neighborhood(self.view_squares[self.current_pos_x, self.current_pos_y])
+
+        if statistics is not None:
+            feature = int(self.feature_world[self.current_pos_x, self.current_pos_y])
+            statistics.update(feature, self.next_position_x, self.next_position_y)
+
+        if trajectory is not None:
+            trajectory.append(self.next_position_x, self.next_position_y)
+
+        if self.prion_field is not None:
+            self.prion_field.update(self.current_pos_x, self.current_pos_y)
+
+        if self.patch_residence is not None:
+            self.patch_residence.update(self.current_pos_x, self.current_pos_y)
+
+        # update current position to future position
+        self.current_pos_x += self.next_position_x
+        self.current_pos_y += self.next_position_y
+
+        self.current_pos_x = np.remainder(self.current_pos_x, self.length)
+        self.current_pos_y = np.remainder(self.current_pos_y, self.width)
+
+    def walk(self, time, statistics=None, record=False, tolerance=None, confidence=0.95, batches=32, batch_size=100):
+        """ Simulates the deer for a set amount of iterations while only keeping the path statistics. Nothing is
+        drawn, the path is not stored, and no Excel file is written, which allows for long runs. Given a tolerance the
+        walk stops as soon as the occupancy of every terrain is known to within the tolerance, see OccupancyMonitor.
+
+        :param time: Total amount of iterations to run the simulation, or the most iterations to run when a tolerance
+        is given.
+        :type time: int
+        :param statistics: Path statistics to continue updating. Default is None, which will create new statistics.
+        :type statistics: PathStatistics, optional
+        :param record: Stores the compact trajectory of the walk in self.trajectory, which takes half a byte per
+        iteration. Default is False.
+        :type record: bool, optional
+        :param tolerance: Largest half width of the confidence interval of the occupancy of every terrain at which the
+        walk stops. The monitor is kept in self.occupancy_monitor. Default is None, which will run every iteration.
+        :type tolerance: float, optional
+        :param confidence: Confidence level of the intervals. Default is 0.95.
+        :type confidence: float, optional
+        :param batches: Number of batches of the intervals, see OccupancyMonitor. Default is 32.
+        :type batches: int, optional
+        :param batch_size: Number of iterations of each batch before any merging. Default is 100.
+        :type batch_size: int, optional
+        :return: Statistics of the path taken by the deer.
+        :rtype: PathStatistics
+        """
+
+        # get starting positions
+        self.ca_setup()
+
+        if statistics is None:
+            statistics = PathStatistics(self.features, self.motility_values, self.names)
+
+        monitor = self.start_monitor(statistics, tolerance, confidence, batches, batch_size)
+
+        trajectory = None
+        if record:
+            trajectory = Trajectory(self.current_pos_x, self.current_pos_y, self.length, self.width)
+            self.trajectory = trajectory
 
-        for i in range(len(path_taken)):
-            x = path_taken[i][0]
-            y = path_taken[i][1]
-            terrain_path.append(self.names_dictionary[self.ca_world[x][y]])
-            motilities_taken.append(self.motility_dictionary[self.ca_world[x][y]])
+        for t in range(time):
+            if self.terrain_schedule is not None:
+                self.terrain_events(t, statistics)
+
+            self.step(statistics, trajectory)
+
+            if monitor is not None and monitor.update(statistics):
+                break
+
+        self.report_monitor(monitor, statistics)
+
+        statistics.finish(int(self.feature_world[self.current_pos_x, self.current_pos_y]))
+        self.path_statistics = statistics
+
+        return statistics
+
+    def start_monitor(self, statistics, tolerance, confidence, batches=32, batch_size=100):
+        """ Creates the occupancy monitor of an adaptive run, kept in self.occupancy_monitor.
+
+        :param statistics: Statistics of the path taken by the deer.
+        :type statistics: PathStatistics
+        :param tolerance: Largest half width of the confidence interval of every terrain, None for a fixed run.
+        :type tolerance: float
+        :param confidence: Confidence level of the intervals.
+        :type confidence: float
+        :param batches: Number of batches kept after merging. Default is 32.
+        :type batches: int, optional
+        :param batch_size: Number of iterations of each batch before any merging. Default is 100.
+        :type batch_size: int, optional
+        :return: Occupancy monitor, or None for a fixed run.
+        :rtype: OccupancyMonitor
+        """
+
+        if tolerance is None:
+            return None
+
+        self.occupancy_monitor = OccupancyMonitor(self.features, tolerance, confidence, batches, batch_size,
+                                                  names=self.names)
+        self.occupancy_monitor.start(statistics)
+
+        return self.occupancy_monitor
+
+    def report_monitor(self, monitor, statistics):
+        """ Prints the iterations used by an adaptive run, the precision it reached, and whether the deer mixed.
+
+        :param monitor: Occupancy monitor of the run, None for a fixed run.
+        :type monitor: OccupancyMonitor
+        :param statistics: Statistics of the path taken by the deer.
+        :type statistics: PathStatistics
+        """
+
+        if monitor is None:
+            return
 
-        self.excel_write(path_taken=terrain_path, excel_output_name=self.output_excel_name,
-                         motilities_taken=motilities_taken, axis_position=path_taken)
+        if monitor.converged:
+            print("Occupancy converged after {} iterations, largest half width {:.4f}".format(
+                statistics.steps, monitor.half_width.max()))
+        else:
+            print("Occupancy did not converge within {} iterations, largest half width {:.4f}".format(
+                statistics.steps, monitor.half_width.max()))
+
+        if monitor.means and not monitor.mixed:
+            seldom = [monitor.names[i] for i in np.flatnonzero((monitor.occupancy >= monitor.tolerance) &
+                                                               (monitor.varied < monitor.varied_batches))]
+            print("The deer has not mixed, {} varied within fewer than {} batches, so the intervals only cover the part "
+                  "of the world it reached".format(", ".join(name.strip() for name in seldom), monitor.varied_batches))
 
     def string_names(self):
         """ Appends the deer to the name array and returns a list of strings of the motility values.
@@ -652,21 +1642,28 @@ class CaDeer(object):
         """ Changes the current pixel by increasing or decreasing the alpha value depending if light mode has been
         activated. Returns the changed pixel value
 
-        :param pixel: Current pixel that needs to be adjusted as a ndArray with 4 float elements
+        :param pixel: Current pixel that needs to be adjusted as a ndArray with 4 elements, see rgba
         :type pixel: ndArray
-        :return rgba: Updated pixel value as a ndArray with 4 float elements
+        :return rgba: Updated pixel value as a ndArray with 4 elements
         :rtype rgba: ndArray
 
         """
 
+        # alpha values in the values of the RGBA world, from 0 to 255 for a loaded raster
+        opaque = self.rgba([0, 0, 0, 1])[3]
+        bright = self.rgba([0, 0, 0, 0.95])[3]
+
         # check light mode
         if self.light_mode:
             rgba = [pixel[0], pixel[1], pixel[2], 0.95 * pixel[3]]
         else:
-            if pixel[3] <= 0.95:
+            if pixel[3] <= bright:
                 rgba = [pixel[0], pixel[1], pixel[2], 1.05 * pixel[3]]
+                # whole alpha values are rounded up, cutting them off would hold the alpha back on every visit
+                if self.world_color.dtype == np.uint8:
+                    rgba[3] = np.round(rgba[3])
             else:
-                rgba = [pixel[0], pixel[1], pixel[2], 1]
+                rgba = [pixel[0], pixel[1], pixel[2], opaque]
 
         return rgba
 
@@ -676,17 +1673,16 @@ class CaDeer(object):
 
         self.color_append(False)
 
-        for i in range(self.length):
-            for j in range(self.width):
-
-                change_apperent = self.world_color[i][j]
+        # alpha values in the values of the RGBA world, from 0 to 255 for a loaded raster
+        opaque = self.rgba([0, 0, 0, 1])[3]
+        faint = self.rgba([0, 0, 0, 0.1])[3]
 
-                if self.light_mode:
-                    if change_apperent[3] == 1:
-                        self.world_color[i][j] = [0, 0, 0, 1]
-                else:
-                    if change_apperent[3] <= 0.1:
-                        self.world_color[i][j] = [0, 0, 0, 1]
+        alpha = self.world_color[:, :, 3]
+        if self.light_mode:
+            path = alpha == opaque
+        else:
+            path = alpha <= faint
+        self.world_color[path] = self.rgba([0, 0, 0, 1])
 
         plt.figure()
 
@@ -754,9 +1750,9 @@ class CaDeer(object):
 
         """
         # get the left half
-        left_half = self.ca_world[x - 3:x + 4, y - 3:self.length]
+        left_half = self.ca_world[x - 3:x + 4, y - 3:self.width]
         # get the right half
-        right_half = self.ca_world[x - 3:x + 4, 0:np.remainder(y + 4, self.length)]
+        right_half = self.ca_world[x - 3:x + 4, 0:np.remainder(y + 4, self.width)]
         # return the total
         return np.hstack((left_half, right_half))
 
@@ -776,7 +1772,7 @@ class CaDeer(object):
         # get the right half
         right_half = self.ca_world[x - 3:x + 4, 0:y + 4]
         # get the left half
-        left_half = self.ca_world[x - 3:x + 4, np.remainder(y - 3, self.length):self.length]
+        left_half = self.ca_world[x - 3:x + 4, np.remainder(y - 3, self.width):self.width]
         # return the total
         return np.hstack((left_half, right_half))
 
@@ -796,7 +1792,7 @@ class CaDeer(object):
         # get lower half
         lower_half = self.ca_world[0:x + 4, y - 3:y + 4]
         # get the upper half
-        upper_half = self.ca_world[np.remainder(x - 3, self.width):self.width, y - 3:y + 4]
+        upper_half = self.ca_world[np.remainder(x - 3, self.length):self.length, y - 3:y + 4]
         # return the total
         return np.vstack((upper_half, lower_half))
 
@@ -814,9 +1810,9 @@ class CaDeer(object):
         """
 
         # gather upper half
-        upper_half = self.ca_world[x - 3:self.width, y - 3:y + 4]
+        upper_half = self.ca_world[x - 3:self.length, y - 3:y + 4]
         # gather lower half
-        lower_half = self.ca_world[0:np.remainder(x + 4, self.width), y - 3:y + 4]
+        lower_half = self.ca_world[0:np.remainder(x + 4, self.length), y - 3:y + 4]
         # return the upper and lower
         return np.vstack((upper_half, lower_half))
 
@@ -834,16 +1830,16 @@ class CaDeer(object):
         """
 
         # get lower right quarter
-        lower_right_quarter = self.ca_world[np.remainder(x - 3, self.width):self.width,
-                              0:np.remainder(y + 4, self.length)]
+        lower_right_quarter = self.ca_world[np.remainder(x - 3, self.length):self.length,
+                              0:np.remainder(y + 4, self.width)]
         # get upper right quarter
-        upper_right_quarter = self.ca_world[0:x + 4, 0:np.remainder(y + 4, self.length)]
-        # right side
-        right_half = np.vstack((upper_right_quarter, lower_right_quarter))
+        upper_right_quarter = self.ca_world[0:x + 4, 0:np.remainder(y + 4, self.width)]
+        # right side, the wrapped rows from the bottom of the world come first
+        right_half = np.vstack((lower_right_quarter, upper_right_quarter))
         # lower left quarter
-        lower_left_quarter = self.ca_world[0:x + 4, y - 3:self.length]
+        lower_left_quarter = self.ca_world[0:x + 4, y - 3:self.width]
         # upper left quarter
-        upper_left_quarter = self.ca_world[np.remainder(x - 3, self.width):self.width, y - 3:self.length]
+        upper_left_quarter = self.ca_world[np.remainder(x - 3, self.length):self.length, y - 3:self.width]
         # left side
         left_half = np.vstack((upper_left_quarter, lower_left_quarter))
         # combine the sides together
@@ -863,16 +1859,16 @@ class CaDeer(object):
         """
 
         # get the upper right quarter
-        upper_right_quarter = self.ca_world[x - 3:self.width, 0:y + 4]
+        upper_right_quarter = self.ca_world[x - 3:self.length, 0:y + 4]
         # get the bottom right quarter
-        lower_right_quarter = self.ca_world[0:np.remainder(x + 4, self.width), 0:y + 4]
+        lower_right_quarter = self.ca_world[0:np.remainder(x + 4, self.length), 0:y + 4]
         # right half
         right_half = np.vstack((upper_right_quarter, lower_right_quarter))
         # bottom left quarter
-        lower_left_quarter = self.ca_world[0:np.remainder(x + 4, self.width),
-                             np.remainder(y - 3, self.length): self.length]
+        lower_left_quarter = self.ca_world[0:np.remainder(x + 4, self.length),
+                             np.remainder(y - 3, self.width): self.width]
         # get the upper left quarter
-        upper_left_quarter = self.ca_world[x - 3:self.width, np.remainder(y - 3, self.length):self.length]
+        upper_left_quarter = self.ca_world[x - 3:self.length, np.remainder(y - 3, self.width):self.width]
         # create the left half
         left_half = np.vstack((upper_left_quarter, lower_left_quarter))
         # completed 7 by 7 square
@@ -892,15 +1888,15 @@ class CaDeer(object):
         """
 
         # get the upper left quarter
-        upper_left_quarter = self.ca_world[x - 3:self.width, y - 3:self.length]
+        upper_left_quarter = self.ca_world[x - 3:self.length, y - 3:self.width]
         # bottom left quarter
-        lower_left_quarter = self.ca_world[0:np.remainder(x + 4, self.width), y - 3:self.length]
+        lower_left_quarter = self.ca_world[0:np.remainder(x + 4, self.length), y - 3:self.width]
         # create the left half
         left_half = np.vstack((upper_left_quarter, lower_left_quarter))
         # get the upper right quarter
-        upper_right_quarter = self.ca_world[x - 3:self.width, 0:np.remainder(y + 4, self.length)]
+        upper_right_quarter = self.ca_world[x - 3:self.length, 0:np.remainder(y + 4, self.width)]
         # get the bottom right quarter
-        lower_right_quarter = self.ca_world[0:np.remainder(x + 4, self.width), 0:np.remainder(y + 4, self.length)]
+        lower_right_quarter = self.ca_world[0:np.remainder(x + 4, self.length), 0:np.remainder(y + 4, self.width)]
         # right half
         right_half = np.vstack((upper_right_quarter, lower_right_quarter))
         # completed 7 by 7 square
@@ -922,14 +1918,14 @@ class CaDeer(object):
         # get lower right quarter
         lower_right_quarter = self.ca_world[0:x + 4, 0:y + 4]
         # get upper right quarter
-        upper_right_quarter = self.ca_world[np.remainder(x - 3, self.width):self.width, 0:y + 4]
+        upper_right_quarter = self.ca_world[np.remainder(x - 3, self.length):self.length, 0:y + 4]
         # right side
         right_half = np.vstack((upper_right_quarter, lower_right_quarter))
         # lower left quarter
-        lower_left_quarter = self.ca_world[0:x + 4, np.remainder(y - 3, self.length): self.length]
+        lower_left_quarter = self.ca_world[0:x + 4, np.remainder(y - 3, self.width): self.width]
         # upper left quarter
-        upper_left_quarter = self.ca_world[np.remainder(x - 3, self.width):self.width,
-                             np.remainder(y - 3, self.length):self.length]
+        upper_left_quarter = self.ca_world[np.remainder(x - 3, self.length):self.length,
+                             np.remainder(y - 3, self.width):self.width]
         # left side
         left_half = np.vstack((upper_left_quarter, lower_left_quarter))
         # combine the sides together
@@ -951,45 +1947,3 @@ class CaDeer(object):
                     file1.write("shape[1] != 7 \n")
 
         file1.close()
-
-    def mp4(self, buffer, t, colors, motility, prev_pos_x, prev_pos_y):
-
-        if self.current_pos_x == self.width * -1 - 1:
-            self.current_pos_x = np.remainder(self.current_pos_x, self.width)
-
-        if self.current_pos_y == self.length * -1 - 1:
-            self.current_pos_y = np.remainder(self.current_pos_y, self.length)
-
-        # buffer
-        buffer[prev_pos_x][prev_pos_y] = self.world_color[prev_pos_x][prev_pos_y]
-
-        # use pink for current position [255, 0, 255]
-        buffer[self.current_pos_x][self.current_pos_y] = [255 / 255, 0 / 255, 255 / 255, 1]
-
-        # add in location and iteration/time passed
-        string = "t {} \n (x,y): ({},{})\n s {} o {} p {} l {} b {} f {}".format(t,
-                                                                                 np.remainder(self.current_pos_x,
-                                                                                              self.width),
-                                                                                 np.remainder(self.current_pos_y,
-                                                                                              self.length), self.scale,
-                                                                                 self.octaves,
-                                                                                 np.round(self.persistence, 3),
-                                                                                 np.round(self.lacunarity, 3),
-                                                                                 self.base, self.features
-                                                                                 )
-
-        # plot the updated time/iteration and current coordinates of the deer
-        plt.title(string)
-
-        # create the legend box with names of each color as well the as the motility values
-        patches = [mpatches.Patch(color=colors[i], label='{:^5} {:>10}'.format(self.names[i], motility[i])) for i in
-                   range(len(self.names))]
-
-        # plot the legend box
-        plt.legend(handles=patches, bbox_to_anchor=(1.05, 0.0, 0.3, 1), loc=2, borderaxespad=0.1)  # , mode='expand')
-
-        # plot the buffer world image
-        im = plt.imshow(buffer)
-
-        # add to image array
-        self.ims.append([im])
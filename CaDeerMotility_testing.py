@@ -1,12 +1,47 @@
+import os
+import tempfile
 import timeit
+import tracemalloc
 import numpy as np
-from CaDeerMotility import CaDeer
+from multiprocessing import Pool
+from CaDeerMotility import CaDeer, moore_decision, view_sectors
+from CaDeerStatistics import PathStatistics
+from CaDeerTrajectory import CODE_DX, CODE_DY
+from CaDeerShared import SharedWorld, attach, shared_initializer, shared_walk
+from CaDeerPipeline import Pipeline
+from CaDeerVideo import FrameRenderer
+from CaDeerHerd import Herd
+from CaDeerTerrain import TerrainSchedule
+from CaDeerCost import CostSurface
+from CaDeerRaster import open_raster
+from CaDeerExperiment import MotilityExperiment
+from CaDeerBatch import WorldBatch
+from CaDeerMarkov import MarkovDeer, move_probabilities
+from CaDeerCalibration import TrackLikelihood
 
 
 def main():
+    moore_equivalence()
     default_case()
     advance_case()
     hacking()
+    statistics_case()
+    solver_case()
+    shared_case()
+    pipeline_case()
+    segmented_case()
+    prion_case()
+    herd_case()
+    radius_case()
+    terrain_case()
+    cost_case()
+    raster_case()
+    experiment_case()
+    batch_case()
+    patch_case()
+    tiles_case()
+    calibration_case()
+    adaptive_case()
 
 
 def default_case():
@@ -143,5 +178,664 @@ def hacking():
     print("Done")
 
 
+def statistics_case(time=20000, chunks=50):
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=200, width=200)
+    deer.color_world()
+    deer.starting_pos_x = 100
+    deer.starting_pos_y = 100
+
+    statistics = deer.walk(time, record=True)
+
+    # the recorded path, along with the feature under the deer before each step and after the last one
+    positions = deer.trajectory.positions()
+    features = deer.feature_world[positions[:, 0], positions[:, 1]].astype(np.int64)
+    codes = deer.trajectory.codes(0, time)
+    dx = CODE_DX[codes]
+    dy = CODE_DY[codes]
+    motility = np.asarray(deer.motility_values, dtype=float)[features[:-1]]
+
+    # the statistics of the walk against the same statistics found from the whole path at once
+    transitions = np.bincount(features[:-1] * deer.features + features[1:],
+                              minlength=deer.features ** 2).reshape(deer.features, deer.features)
+    assert np.array_equal(statistics.visits, np.bincount(features[:-1], minlength=deer.features))
+    assert np.array_equal(statistics.transitions, transitions)
+    assert statistics.transitions.sum() == time
+    assert (statistics.displacement_x, statistics.displacement_y) == (dx.sum(), dy.sum())
+    assert np.isclose(statistics.motility_mean, motility.mean())
+    assert np.isclose(statistics.motility_variance, motility.var(ddof=1))
+    print("Walk statistics match the recorded path of {} iterations".format(time))
+
+    # the same path added a chunk at a time with extend and a step at a time with update
+    extended = PathStatistics(deer.features, deer.motility_values, deer.names)
+    bounds = np.sort(np.random.choice(np.arange(1, time), chunks - 1, replace=False))
+    for start, stop in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [time]])):
+        extended.extend(features[start:stop], dx[start:stop], dy[start:stop])
+    extended.finish(features[-1])
+
+    updated = PathStatistics(deer.features, deer.motility_values, deer.names)
+    for step in range(time):
+        updated.update(features[step], dx[step], dy[step])
+    updated.finish(features[-1])
+
+    for other in [extended, updated]:
+        assert np.array_equal(other.visits, statistics.visits)
+        assert np.array_equal(other.transitions, statistics.transitions)
+        assert (other.displacement_x, other.displacement_y) == (statistics.displacement_x, statistics.displacement_y)
+        assert np.isclose(other.motility_mean, statistics.motility_mean)
+        assert np.isclose(other.motility_variance, statistics.motility_variance)
+    print("Statistics added with extend in {} chunks and with update match the walk".format(chunks))
+
+    print(statistics.summary())
+    print("Done with Statistics Case")
+
+
+def rule_step(deer, squares, x, y):
+    # moves many independent deer at once with the movement rule of walk
+    dx, dy = moore_decision(squares[x * deer.width + y], np.random.normal(size=(x.size, 8)))
+    return np.remainder(x + dx, deer.length), np.remainder(y + dy, deer.width)
+
+
+def solver_case(walkers=20000, time=500, hitting_walkers=5000, hitting_time=200):
+    # same world as the hacking case, using the 15 features of the Excel file
+    deer = CaDeer(scale=100.0, octaves=8, persistence=0.585, lacunarity=2.68, base=0, features=15)
+    deer.gather_features("test_output", input_excel_name="test_input.xlsx")
+    deer.create_world(length=150, width=150)
+    deer.color_world()
+
+    # solve the long run occupancy and the time needed to reach water
+    start = timeit.default_timer()
+    solution = deer.solve_occupancy(target='Open Water')
+    print("Solved in {:.2f} seconds".format(timeit.default_timer() - start))
+    squares = deer.view_world().reshape(-1, 3, 3)
+
+    # a single walk stays trapped for far longer than it can be run, so instead independent deer start from the
+    # solved occupancy, which they keep at every iteration when it is the stationary distribution of the movement rule
+    occupancy = solution.occupancy.ravel()
+    x, y = np.divmod(np.random.choice(occupancy.size, walkers, p=occupancy / occupancy.sum()), deer.width)
+    for _ in range(time):
+        x, y = rule_step(deer, squares, x, y)
+    simulated = np.bincount(deer.feature_world[x, y], minlength=deer.features) / walkers
+
+    # four standard errors of the fraction of deer within each terrain, plus two deer for the terrains the solve gives
+    # almost no time
+    solved = solution.terrain_occupancy
+    tolerance = 4 * np.sqrt(solved * (1 - solved) / walkers) + 2 / walkers
+    for name, value, fraction, limit in zip(solution.names, solved, simulated, tolerance):
+        if value > 0 or fraction > 0:
+            print("{:<20} solved {:.4f} simulated {:.4f} tolerance {:.4f}".format(name, value, fraction, limit))
+    assert np.all(np.abs(simulated - solved) <= tolerance)
+    print("{} deer started from the solved occupancy keep it after {} iterations".format(walkers, time))
+
+    # the solved hitting times meet h = 1 + P h away from water, where P is the chain the occupancy was solved with
+    chain = MarkovDeer(deer)
+    hitting_times = solution.hitting_times.ravel()
+    target = (deer.feature_world == solution.target).ravel()
+    residual = np.abs(hitting_times - 1 - chain.transition @ hitting_times)[~target].max()
+    print("Largest residual of the hitting times: {:.3g}".format(residual))
+    assert residual <= 1e-6 * hitting_times.max()
+
+    # the mean time of a few thousand deer is ruled by the rare ones trapped far from water, so deer started near water
+    # are instead compared with the chance of still being away from it after each iteration, found by moving the
+    # starting positions through the chain with water removed
+    cells = np.random.choice(np.flatnonzero((hitting_times > 0) & (hitting_times <= hitting_time)), hitting_walkers)
+    state = np.bincount(cells, minlength=chain.cells) / hitting_walkers
+    x, y = np.divmod(cells, deer.width)
+    away = np.ones(hitting_walkers, dtype=bool)
+    solved = np.zeros(hitting_time)
+    simulated = np.zeros(hitting_time)
+    for step in range(hitting_time):
+        state = chain.transition.T @ state
+        state[target] = 0
+        solved[step] = state.sum()
+        x, y = rule_step(deer, squares, x, y)
+        away &= ~target[x * deer.width + y]
+        simulated[step] = away.mean()
+
+    tolerance = 4 * np.sqrt(solved * (1 - solved) / hitting_walkers) + 2 / hitting_walkers
+    print("Away from water after {} iterations: solved {:.4f}, simulated {:.4f}, largest difference {:.4f} against a "
+          "tolerance of {:.4f}".format(hitting_time, solved[-1], simulated[-1], np.abs(simulated - solved).max(),
+                                       tolerance.max()))
+    assert np.all(np.abs(simulated - solved) <= tolerance)
+    print("Hitting time of water from the starting deer: {:.1f}".format(hitting_times[cells].mean()))
+
+    print("Done with Solver Case")
+
+
+def shared_overhead(handle, time):
+    # memory allocated by a worker while attaching to the shared world and walking through it
+    tracemalloc.start()
+    walker = attach(handle)
+    walker.walk(time)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def shared_case():
+    # a view radius other than 3 shares its movement squares along with the world
+    for size, view_radius in [(100, 3), (400, 3), (400, 5)]:
+        deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4, view_radius=view_radius)
+        deer.gather_features("test_output")
+        deer.create_world(length=size, width=size)
+        deer.color_world()
+
+        world_bytes = deer.world.nbytes + deer.ca_world.nbytes + deer.world_color.nbytes + deer.feature_world.nbytes
+
+        # publish the world once, then attach a walker within each worker
+        shared = SharedWorld(deer)
+        with Pool(2) as pool:
+            overhead = pool.starmap(shared_overhead, [(shared.handle(), 1000)] * 2)
+
+        print("World {}^2 with a view radius of {}: {:.1f} MB of world arrays, {:.1f} kB allocated per worker".format(
+            size, view_radius, world_bytes / 1e6, max(overhead) / 1e3))
+
+        # several deer on the same landscape
+        with Pool(2, initializer=shared_initializer, initargs=(shared.handle(),)) as pool:
+            results = pool.starmap(shared_walk, [(5000, None, None, seed) for seed in range(4)])
+
+        print(np.array([statistics.occupancy for statistics in results]))
+        shared.close()
+
+    print("Done with Shared Case")
+
+
+def pipeline_case(time=5000):
+    # same world as the hacking case, using the 15 features of the Excel file
+    deer = CaDeer(scale=100.0, octaves=8, persistence=0.585, lacunarity=2.68, base=0, features=15)
+    deer.gather_features("test_output", input_excel_name="test_input.xlsx")
+    deer.create_world(length=150, width=150)
+    deer.color_world()
+    deer.starting_pos_x = 71
+    deer.starting_pos_y = 24
+
+    # walk first, then render and export the recorded path
+    start = timeit.default_timer()
+    deer.walk(time, record=True)
+    simulated = timeit.default_timer() - start
+    renderer = FrameRenderer(deer, "test_output_serial")
+    for t, positions in deer.trajectory.windows(0, time, 1024):
+        renderer.consume(t, positions, None)
+    renderer.close()
+    deer.trajectory_excel(deer.trajectory, "test_output_serial", 0, time)
+    serial = timeit.default_timer() - start
+    print("Serial: {:.2f} seconds, of which {:.2f} seconds simulating".format(serial, simulated))
+
+    # walk while rendering and exporting
+    for processes in [False, True]:
+        start = timeit.default_timer()
+        Pipeline(deer, processes=processes).run(time, mpfour_output="test_output_pipeline",
+                                                excel_output="test_output_pipeline")
+        print("Pipeline with processes={}: {:.2f} seconds".format(processes, timeit.default_timer() - start))
+
+    print("Done with Pipeline Case")
+
+
+def segmented_case(time=20000):
+    # same world as the pipeline case with a longer path, on a single CPU the segments are slower than one writer
+    deer = CaDeer(scale=100.0, octaves=8, persistence=0.585, lacunarity=2.68, base=0, features=15)
+    deer.gather_features("test_output", input_excel_name="test_input.xlsx")
+    deer.create_world(length=150, width=150)
+    deer.color_world()
+    deer.starting_pos_x = 71
+    deer.starting_pos_y = 24
+    deer.walk(time, record=True)
+
+    start = timeit.default_timer()
+    renderer = FrameRenderer(deer, "test_output_single")
+    for t, positions in deer.trajectory.windows(0, time):
+        renderer.consume(t, positions, None)
+    renderer.close()
+    print("Single writer: {:.2f} seconds".format(timeit.default_timer() - start))
+
+    for segments in [2, 4, 8]:
+        start = timeit.default_timer()
+        deer.render_mp4("test_output_segmented", segments=segments)
+        print("{} segments: {:.2f} seconds".format(segments, timeit.default_timer() - start))
+
+    print("Done with Segmented Case")
+
+
+def prion_case(time=5000):
+    # default features with prions lasting longest within the forests
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output", color_range=np.array([-0.05, 0, 0.2, 0.36, 1]),
+                         colors=np.array([[240, 230, 140], [65, 105, 225], [34, 139, 34], [139, 137, 137],
+                                          [255, 250, 250]]),
+                         motility_values=np.array([0.94, 1.02, 0.46, 2.33, 3.12]),
+                         terrain_names=['barren', 'water', 'pasture', 'spruce', 'mixed confir'],
+                         decay_rates=np.array([0.01, 0.05, 0.002, 0.001, 0.0005]))
+    deer.create_world(length=100, width=100)
+    deer.color_world()
+
+    field = deer.infect()
+    deer.walk(time, record=True)
+
+    # decaying the whole world at every step gives the same field
+    eager = np.zeros((deer.length, deer.width))
+    rates = deer.decay_rates[deer.feature_world]
+    for x, y in deer.trajectory.positions(0, time):
+        eager *= np.exp(-rates)
+        eager[x, y] += field.shedding
+    eager *= np.exp(-rates)
+    print("Largest difference from decaying every step: {}".format(np.abs(field.snapshot() - eager).max()))
+    print("Prions left after {} iterations: {:.2f}".format(time, field.total()))
+
+    print("Done with Prion Case")
+
+
+def herd_case(time=20):
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=500, width=500)
+    deer.color_world()
+
+    # the grid hash finds the same contacts as checking every pair
+    herd = Herd(deer, 2000, contact_radius=2)
+    a, b = herd.find_contacts()
+    dx = np.abs(herd.x[:, None] - herd.x[None, :])
+    dy = np.abs(herd.y[:, None] - herd.y[None, :])
+    dx = np.minimum(dx, deer.length - dx)
+    dy = np.minimum(dy, deer.width - dy)
+    pairs = np.nonzero(np.triu(dx * dx + dy * dy <= 4, 1))
+    print("Contacts match all pairs: {}".format(set(zip(a, b)) == set(zip(*pairs))))
+
+    for agents in [10 ** 3, 10 ** 4, 10 ** 5]:
+        herd = Herd(deer, agents, contact_radius=1, transmission=0.5, infected=10)
+        start = timeit.default_timer()
+        infected = herd.run(time)
+        per_step = (timeit.default_timer() - start) / time
+        print("{} deer: {:.4f} seconds per iteration, {} contacts, {} infected".format(
+            agents, per_step, herd.contact_log().size, infected[-1]))
+
+    print("Done with Herd Case")
+
+
+def radius_case(time=5000):
+    for radius in [3, 5, 15, 40]:
+        deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4, view_radius=radius)
+        deer.gather_features("test_output")
+        deer.create_world(length=200, width=200)
+        deer.color_world()
+
+        if radius == 3:
+            # the summed area tables agree with view_finder up to rounding
+            motility = np.take(np.asarray(deer.motility_values, dtype=float), deer.feature_world)
+            difference = np.abs(view_sectors(np.pad(motility, 3, mode='wrap'), 3) - deer.view_world()).max()
+            print("Largest difference from view_finder: {}".format(difference))
+
+        start = timeit.default_timer()
+        deer.walk(time)
+        print("View radius {}: {:.2f} seconds".format(radius, timeit.default_timer() - start))
+
+    print("Done with Radius Case")
+
+
+def terrain_case(time=2000):
+    for radius in [3, 5]:
+        deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4, view_radius=radius)
+        deer.gather_features("test_output")
+        deer.create_world(length=1000, width=1000)
+        deer.color_world()
+        deer.view_squares = deer.view_world()
+        deer.markov_chain = MarkovDeer(deer)
+
+        # snow raises the motility of the rare mixed confir, then a pond floods part of the world
+        snow_free = np.array(deer.motility_values, dtype=float)
+        snow = np.copy(snow_free)
+        snow[4] = 4.5
+        schedule = TerrainSchedule()
+        schedule.change_motility(time // 2, snow)
+        schedule.edit_region(time // 4, 480, 520, 480, 520, 'water')
+        deer.set_schedule(schedule)
+
+        start = timeit.default_timer()
+        deer.view_world()
+        print("View radius {}, full recomputation: {:.4f} seconds".format(radius, timeit.default_timer() - start))
+
+        for t in [time // 4, time // 2]:
+            start = timeit.default_timer()
+            tiles = deer.terrain_events(t)
+            print("Iteration {} event: {:.4f} seconds for {} of {} tiles".format(
+                t, timeit.default_timer() - start, len(tiles), deer.tile_index.tiles_x * deer.tile_index.tiles_y))
+
+        # the refreshed tiles are the same floats as a full recomputation, so ties between moves break the same way
+        assert np.array_equal(deer.view_squares, deer.view_world())
+        assert np.array_equal(deer.markov_chain.probabilities, MarkovDeer(deer).probabilities)
+        print("Refreshed movement squares and move probabilities match a full recomputation")
+
+        # walks apply the events as they reach them, starting from the original terrain
+        deer.color_world()
+        deer.change_motility(snow_free)
+        deer.set_schedule(schedule)
+        deer.walk(time)
+
+    print("Done with Terrain Case")
+
+
+def cost_case(time=3000, size=1000):
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=size, width=size)
+    deer.color_world()
+
+    start = timeit.default_timer()
+    surface = CostSurface(deer)
+    print("Building the {0}x{0} graph: {1:.2f} seconds".format(size, timeit.default_timer() - start))
+
+    # distance from the closest of three sources, and the route to the far corner
+    start = timeit.default_timer()
+    distance = surface.solve([0, size // 2, size - 1], [0, size // 3, size // 2])
+    route = surface.path(size // 4, size - 1)
+    print("Solving three sources: {:.2f} seconds, route of {} positions costing {:.2f}".format(
+        timeit.default_timer() - start, len(route), distance[size // 4, size - 1]))
+
+    # how far the random walk strays from the least-cost routes
+    deer.walk(time, record=True)
+    print(surface.compare(deer.trajectory))
+
+    print("Done with Cost Case")
+
+
+def raster_case(time=2000):
+    # a Perlin world saved as raw binary loads back into the same features
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=120, width=80)
+    deer.color_world()
+
+    # the rasters are written to a temporary directory, which is removed along with them at the end of the case
+    with tempfile.TemporaryDirectory() as directory:
+        deer.world.tofile(os.path.join(directory, "test_raster.raw"))
+
+        loaded = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+        loaded.gather_features("test_output")
+        loaded.load_raster(open_raster(os.path.join(directory, "test_raster.raw"), shape=(120, 80), dtype=np.float64))
+        print("Raw raster matches color_world: {}".format(np.array_equal(deer.feature_world, loaded.feature_world)))
+
+        # a land cover raster of codes, memory mapped and mapped straight to features
+        codes = np.random.choice(np.array([11, 21, 31, 42, 43], dtype=np.uint8), (6000, 4000))
+        np.save(os.path.join(directory, "test_land_cover.npy"), codes)
+        del codes
+
+        land_cover = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+        land_cover.gather_features("test_output")
+        tracemalloc.start()
+        start = timeit.default_timer()
+        land_cover.load_raster(os.path.join(directory, "test_land_cover.npy"),
+                               codes={11: 'water', 21: 'barren', 31: 'pasture', 42: 'spruce', 43: 'mixed confir'})
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print("Loaded 6000x4000 land cover in {:.2f} seconds, peak memory {:.1f} MB".format(
+            timeit.default_timer() - start, peak / 1e6))
+
+        land_cover.walk(time)
+        print(land_cover.path_statistics.summary())
+
+        # the memory mapped raster is released before its file is removed
+        del loaded, land_cover
+
+    print("Done with Raster Case")
+
+
+def experiment_case(time=3000, replicates=60):
+    # same world as the hacking case, using the 15 features of the Excel file
+    deer = CaDeer(scale=100.0, octaves=8, persistence=0.585, lacunarity=2.68, base=0, features=15)
+    deer.gather_features("test_output", input_excel_name="test_input.xlsx")
+    deer.create_world(length=150, width=150)
+    deer.color_world()
+    excel = np.asarray(deer.motility_values, dtype=float)
+
+    # a local change, open water 5% harder to cross, and a global change, every terrain 10% harder
+    water = np.copy(excel)
+    water[7] *= 1.05
+    for label, table in [("Open Water +5%", water), ("All +10%", excel * 1.1)]:
+        experiment = MotilityExperiment(deer, [excel, table], ["Excel", label])
+
+        variance = []
+        for common in [True, False]:
+            np.random.seed(1)
+            start = timeit.default_timer()
+            result = experiment.run(time, replicates, common=common)
+            difference = result.occupancy[1] - result.occupancy[0]
+            variance.append(difference.var(axis=0, ddof=1).sum())
+            print("{}, common={}: {:.2f} seconds".format(label, common, timeit.default_timer() - start))
+            if common:
+                paired = result.paired_differences()
+
+        # the iterations needed for the same confidence interval shrink with the variance
+        print("Variance reduction of {}: {:.1f}x".format(label, variance[1] / variance[0]))
+        print(paired.round(4))
+
+    print("Done with Experiment Case")
+
+
+def batch_case(time=3000, worlds=8):
+    settings = [{'base': k, 'persistence': 0.4 + 0.02 * k} for k in range(worlds)]
+
+    # one CaDeer for every world
+    start = timeit.default_timer()
+    for world in settings:
+        deer = CaDeer(persistence=world['persistence'], lacunarity=2.5, base=world['base'])
+        deer.gather_features("test_output")
+        deer.create_world(length=150, width=150)
+        deer.color_world()
+        deer.walk(time)
+    sequential = timeit.default_timer() - start
+    print("Sequential: {:.2f} seconds, {:.0f} steps per second".format(sequential, worlds * time / sequential))
+
+    # every world within one tensor
+    template = CaDeer(persistence=0.5, lacunarity=2.5, base=0)
+    template.gather_features("test_output")
+    for walkers in [1, 16]:
+        start = timeit.default_timer()
+        batch = WorldBatch(template, settings, length=150, width=150)
+        batch.run(time, walkers)
+        batched = timeit.default_timer() - start
+        print("Batched with {} walkers per world: {:.2f} seconds, {:.0f} steps per second".format(
+            walkers, batched, worlds * walkers * time / batched))
+
+    print(batch.summary())
+
+    print("Done with Batch Case")
+
+
+def patch_case(time=5000):
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=150, width=120)
+    deer.color_world()
+
+    residence = deer.track_patches()
+    deer.walk(time)
+
+    # neighbors sharing a feature share a patch across the edges of the world, and every patch holds a single feature
+    patches = deer.patch_index
+    for shift in [(1, 0), (0, 1), (1, 1), (1, -1)]:
+        same = deer.feature_world == np.roll(deer.feature_world, shift, axis=(0, 1))
+        assert np.array_equal(same, patches.labels == np.roll(patches.labels, shift, axis=(0, 1)))
+    assert np.array_equal(patches.feature[patches.labels], deer.feature_world)
+    assert patches.area.sum() == deer.length * deer.width and residence.steps.sum() == time
+
+    print("{} patches, {} crossing the edges of the world".format(patches.patches, np.count_nonzero(patches.wraps)))
+    print(patches.table().sort_values('Area', ascending=False).head())
+    print(residence.summary().sort_values('Steps', ascending=False).head())
+    print(residence.residence_times().groupby('Terrain')['Residence'].describe())
+
+    print("Done with Patch Case")
+
+
+def tiles_case(time=20000):
+    # a Perlin world scaled up 16 times into a 4000x4000 raster
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=250, width=250)
+    deer.color_world()
+
+    large = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    large.gather_features("test_output")
+    large.load_raster(np.repeat(np.repeat(deer.world, 16, axis=0), 16, axis=1))
+    large.starting_pos_x = 2000
+    large.starting_pos_y = 2000
+    large.walk(time, record=True)
+    print("RGBA world_color of the raster would take {:.0f} MB with one byte per channel, {:.0f} MB as float64".format(
+        large.length * large.width * 4 / 1e6, large.length * large.width * 4 * 8 / 1e6))
+
+    # the tiles are written to a temporary directory, which is removed along with them at the end of the case
+    with tempfile.TemporaryDirectory() as directory:
+        start = timeit.default_timer()
+        pyramid = large.export_tiles(os.path.join(directory, "test_tiles"))
+        print("Exported {} levels in {:.2f} seconds".format(pyramid.top_level + 1, timeit.default_timer() - start))
+
+        # continuing the walk only renders the tiles the deer touched
+        large.starting_pos_x = int(large.current_pos_x)
+        large.starting_pos_y = int(large.current_pos_y)
+        large.walk(time // 4, record=True)
+        start = timeit.default_timer()
+        written = pyramid.update(large.trajectory)
+        total = sum(np.prod(pyramid.level_tiles(level)) for level in range(pyramid.top_level + 1)) * len(pyramid.layers)
+        print("Updated {} of {} tiles in {:.2f} seconds".format(written, total, timeit.default_timer() - start))
+
+    print("Done with Tiles Case")
+
+
+def calibration_case(tracks=200, time=200):
+    # short tracks from random starting positions, simulated with the default motility values
+    deer = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    deer.gather_features("test_output")
+    deer.create_world(length=200, width=200)
+    deer.color_world()
+
+    observed = []
+    for _ in range(tracks):
+        deer.starting_pos_x, deer.starting_pos_y = np.random.randint(0, 200, 2)
+        deer.walk(time, record=True)
+        observed.append(deer.trajectory)
+
+    # the exact likelihood uses the same move probabilities as the Markov chain of the whole world
+    exact = TrackLikelihood(deer, observed, exact=True)
+    solved = move_probabilities(deer.view_world()).reshape(-1, 8)[exact.cells]
+    print("Largest difference from the Markov chain: {}".format(np.abs(exact.probabilities(deer.motility_values) -
+                                                                    solved).max()))
+
+    likelihood = TrackLikelihood(deer, observed)
+    gathered = timeit.timeit(lambda: likelihood.log_likelihood(deer.motility_values), number=20) / 20
+    whole = timeit.timeit(lambda: move_probabilities(deer.view_world()), number=5) / 5
+    print("Likelihood of {} moves: {:.1f} ms, whole world move probabilities: {:.1f} ms".format(
+        likelihood.moves.size, gathered * 1e3, whole * 1e3))
+
+    start = timeit.default_timer()
+    deer.calibrate_motility(observed, seed=0)
+    print("Calibrated in {:.2f} seconds with {} evaluations".format(timeit.default_timer() - start,
+                                                                    deer.calibration.fit_result.nfev))
+    print(deer.calibration.compare())
+
+    print("Done with Calibration Case")
+
+
+def adaptive_case(time=100000, runs=10, tolerance=0.01, batches=32, batch_size=100):
+    default = CaDeer(persistence=0.5, lacunarity=2.5, base=4)
+    default.gather_features("test_output")
+    default.create_world()
+    default.color_world()
+
+    # same world as the hacking case, using the 15 features of the Excel file
+    fifteen = CaDeer(scale=100.0, octaves=8, persistence=0.585, lacunarity=2.68, base=0, features=15)
+    fifteen.gather_features("test_output", input_excel_name="test_input.xlsx")
+    fifteen.create_world(length=150, width=150)
+    fifteen.color_world()
+
+    for name, deer in [("Default", default), ("15 features", fifteen)]:
+        steps = []
+        sizes = []
+        adaptive = 0.0
+        fixed = 0.0
+        covered = 0
+        mixed = 0
+
+        for run in range(runs):
+            deer.starting_pos_x, deer.starting_pos_y = np.random.randint(1, deer.length - 1, 2)
+
+            # the adaptive run uses the same random values as the start of the fixed run
+            np.random.seed(run)
+            start = timeit.default_timer()
+            deer.walk(time, tolerance=tolerance, batches=batches, batch_size=batch_size)
+            adaptive += timeit.default_timer() - start
+            steps.append(deer.path_statistics.steps)
+            monitor = deer.occupancy_monitor
+            sizes.append(monitor.batch_size)
+            mixed += monitor.mixed
+
+            np.random.seed(run)
+            start = timeit.default_timer()
+            deer.walk(time)
+            fixed += timeit.default_timer() - start
+
+            # the occupancy of the full run lies within the intervals of the adaptive run
+            difference = np.abs(deer.path_statistics.occupancy - monitor.occupancy)
+            covered += bool(np.all(difference <= monitor.half_width + 1e-12))
+
+        print("{}: {:.0f} of {} iterations on average, {:.1f} of {:.1f} seconds, {:.0f}% of the compute saved".format(
+            name, np.mean(steps), time, adaptive, fixed, 100 * (1 - adaptive / fixed)))
+        print("Full run within the adaptive intervals for {} of {} runs".format(covered, runs))
+        # runs where the deer stays within the terrain it started in do not converge
+        print("Deer mixed for {} of {} runs".format(mixed, runs))
+        # the batches grow past the doubling of a long walk while the deer mixes slowly
+        print("Batch sizes reached: {}".format(sizes))
+        print(monitor.summary())
+
+    print("Done with Adaptive Case")
+
+
+def legacy_moore_neighborhood(square, normals):
+    # loop based moore neighborhood taken from CaDeer, with the random normal values passed in
+    current_motility = 100.0
+    next_position_x = 0
+    next_position_y = 0
+    average = np.average(square)
+    k = 0
+
+    for i in range(len(square)):
+        for j in range(len(square[0])):
+            check_motility = square[i][j]
+            if not (i == 1 and j == 1):
+                if check_motility < average + normals[k]:
+                    if check_motility < current_motility:
+                        current_motility = check_motility
+                        next_position_x = i
+                        next_position_y = j
+                k += 1
+
+    return next_position_x - 1, next_position_y - 1
+
+
+def moore_equivalence(trials=20000):
+    # random squares, including squares made of only a few motility values to check the tie breaking
+    motility_values = np.array([0.94, 1.02, 0.46, 2.33, 3.12])
+    squares = np.concatenate([np.random.uniform(0, 4, (trials // 2, 3, 3)),
+                              np.random.choice(motility_values, (trials - trials // 2, 3, 3))])
+    normals = np.random.normal(size=(trials, 8))
+
+    # single squares against the loop
+    for square, row in zip(squares, normals):
+        assert moore_decision(square, row) == legacy_moore_neighborhood(square, row)
+
+    # stacked squares against the single squares
+    dx, dy = moore_decision(squares, normals)
+    legacy = np.array([legacy_moore_neighborhood(square, row) for square, row in zip(squares, normals)])
+    assert np.array_equal(dx, legacy[:, 0]) and np.array_equal(dy, legacy[:, 1])
+
+    # the class draws the same random values as the loop did
+    deer = CaDeer()
+    state = np.random.get_state()
+    deer.moore_neighborhood(squares[0])
+    np.random.set_state(state)
+    assert (deer.next_position_x, deer.next_position_y) == legacy_moore_neighborhood(squares[0],
+                                                                                      np.random.normal(size=8))
+
+    print("Done with Moore Equivalence")
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sparse
+from scipy import ndimage
+from scipy.sparse.csgraph import connected_components
+
+
+class PatchIndex(object):
+    """Patches of the world, the connected regions of positions sharing a feature, such as a single spruce stand or
+        pasture. Patches are labeled once per world and are merged across the edges of the world, as the world wraps
+        around for the deer.
+        :class:`PatchIndex`
+
+        :param feature_world: Feature index of each position of the world.
+        :type feature_world: ndArray
+        :param names: Names of each feature.
+        :type names: list
+        :param connectivity: Either 8, where diagonal neighbors are connected as the deer can move diagonally, or 4.
+        Default is 8.
+        :type connectivity: int, optional
+    """
+
+    def __init__(self, feature_world, names, connectivity=8):
+        """
+        Constructor method
+        """
+
+        if connectivity not in (4, 8):
+            print("Connectivity has been set to 8, please enter either 4 or 8.")
+            connectivity = 8
+
+        feature_world = np.asarray(feature_world)
+        self.names = list(names)
+        self.connectivity = connectivity
+        self.length, self.width = feature_world.shape
+
+        # label the patches of each feature within the world, without wrapping
+        structure = ndimage.generate_binary_structure(2, 2 if connectivity == 8 else 1)
+        labels = np.zeros(feature_world.shape, dtype=np.int64)
+        count = 0
+        for feature in range(len(self.names)):
+            feature_labels, found = ndimage.label(feature_world == feature, structure=structure)
+            labels[feature_labels > 0] = feature_labels[feature_labels > 0] + count
+            count += found
+
+        # pairs of labels touching across the edges of the world
+        shifts = [-1, 0, 1] if connectivity == 8 else [0]
+        first = []
+        second = []
+        for edge_a, edge_b, feature_a, feature_b in [(labels[0], labels[-1], feature_world[0], feature_world[-1]),
+                                                     (labels[:, 0], labels[:, -1], feature_world[:, 0],
+                                                      feature_world[:, -1])]:
+            for shift in shifts:
+                shifted = np.roll(edge_b, shift)
+                same = feature_a == np.roll(feature_b, shift)
+                first.append(edge_a[same])
+                second.append(shifted[same])
+
+        # merge the labels touching across the edges, labels start at 1
+        first = np.concatenate(first)
+        second = np.concatenate(second)
+        graph = sparse.coo_matrix((np.ones(first.size), (first - 1, second - 1)), shape=(count, count))
+        self.patches, merged = connected_components(graph, directed=False)
+
+        self.labels = merged[labels - 1].astype(np.int32)
+        self.feature = np.zeros(self.patches, dtype=np.int64)
+        self.feature[self.labels.ravel()] = feature_world.ravel()
+
+        self.area = np.bincount(self.labels.ravel(), minlength=self.patches)
+
+        # edges between a position and its four direct neighbors that lie on the border of its patch
+        border = np.zeros(feature_world.shape, dtype=np.int64)
+        for shift, axis in [(1, 0), (-1, 0), (1, 1), (-1, 1)]:
+            border += self.labels != np.roll(self.labels, shift, axis=axis)
+        self.perimeter = np.bincount(self.labels.ravel(), weights=border.ravel(), minlength=self.patches)
+        self.perimeter = self.perimeter.astype(np.int64)
+
+        # bounding boxes ignoring the wrap, patches that cross an edge are marked
+        rows, columns = np.indices(feature_world.shape)
+        flat = self.labels.ravel()
+        self.row_start = np.full(self.patches, self.length)
+        self.row_end = np.zeros(self.patches, dtype=np.int64)
+        self.column_start = np.full(self.patches, self.width)
+        self.column_end = np.zeros(self.patches, dtype=np.int64)
+        np.minimum.at(self.row_start, flat, rows.ravel())
+        np.maximum.at(self.row_end, flat, rows.ravel() + 1)
+        np.minimum.at(self.column_start, flat, columns.ravel())
+        np.maximum.at(self.column_end, flat, columns.ravel() + 1)
+
+        self.wraps = np.zeros(self.patches, dtype=bool)
+        self.wraps[merged[first - 1]] = True
+
+    def table(self):
+        """ Returns the area, perimeter and bounding box of every patch.
+
+        :return: Data frame with one row per patch.
+        :rtype: DataFrame
+        """
+
+        return pd.DataFrame({'Patch': np.arange(self.patches), 'Terrain': [self.names[f] for f in self.feature],
+                             'Area': self.area, 'Perimeter': self.perimeter, 'Row Start': self.row_start,
+                             'Row End': self.row_end, 'Column Start': self.column_start,
+                             'Column End': self.column_end, 'Wraps': self.wraps})
+
+
+class PatchResidence(object):
+    """Follows the deer from patch to patch, counting the entries into each patch and the number of iterations spent
+        within it on each visit. Each step is a single label lookup.
+        :class:`PatchResidence`
+
+        :param index: Patches of the world.
+        :type index: PatchIndex
+    """
+
+    def __init__(self, index):
+        """
+        Constructor method
+        """
+
+        self.index = index
+        self.entries = np.zeros(index.patches, dtype=np.int64)
+        self.steps = np.zeros(index.patches, dtype=np.int64)
+
+        # patch, first iteration and length of every finished visit
+        self.visits = []
+
+        self.patch = None
+        self.entered = 0
+        self.time = 0
+
+    def update(self, x, y):
+        """ Adds the position of the deer at the current iteration and moves on to the next iteration.
+
+        :param x: x position of the deer.
+        :type x: int
+        :param y: y position of the deer.
+        :type y: int
+        """
+
+        patch = self.index.labels[x, y]
+
+        if patch != self.patch:
+            if self.patch is not None:
+                self.visits.append((self.patch, self.entered, self.time - self.entered))
+            self.patch = patch
+            self.entered = self.time
+            self.entries[patch] += 1
+
+        self.steps[patch] += 1
+        self.time += 1
+
+    def residence_times(self):
+        """ Every visit to a patch, including the visit the deer is currently in.
+
+        :return: Data frame holding the patch, terrain, entry iteration and number of iterations of each visit.
+        :rtype: DataFrame
+        """
+
+        visits = list(self.visits)
+        if self.patch is not None:
+            visits.append((self.patch, self.entered, self.time - self.entered))
+
+        visits = np.array(visits, dtype=np.int64).reshape(-1, 3)
+        terrain = [self.index.names[f] for f in self.index.feature[visits[:, 0]]]
+
+        return pd.DataFrame({'Patch': visits[:, 0], 'Terrain': terrain, 'Entered': visits[:, 1],
+                             'Residence': visits[:, 2]})
+
+    def summary(self):
+        """ Entries and residence of every patch the deer has visited.
+
+        :return: Data frame holding the patch, terrain, area, entries, iterations and mean residence of each visit.
+        :rtype: DataFrame
+        """
+
+        visited = np.flatnonzero(self.entries)
+        terrain = [self.index.names[f] for f in self.index.feature[visited]]
+
+        return pd.DataFrame({'Patch': visited, 'Terrain': terrain, 'Area': self.index.area[visited],
+                             'Entries': self.entries[visited], 'Steps': self.steps[visited],
+                             'Mean Residence': self.steps[visited] / self.entries[visited]})
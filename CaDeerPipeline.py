@@ -0,0 +1,421 @@
+import multiprocessing
+import pickle
+import queue
+import threading
+import traceback
+import numpy as np
+from openpyxl import Workbook
+from CaDeerStatistics import PathStatistics
+from CaDeerTerrain import changed_terrain, wrapped_region
+from CaDeerTrajectory import Trajectory
+from CaDeerVideo import FrameRenderer
+
+# number of rows an excel sheet holds below its header
+EXCEL_ROWS = 1048575
+
+# seconds the walk waits on a full queue before checking that the consumers are still running
+CHECK_INTERVAL = 0.5
+
+
+class StatisticsConsumer(object):
+    """Updates the path statistics from the chunks of the path produced by a Pipeline. The consumer keeps its own copy
+        of the features, as the walk may have changed the terrain of the deer before the consumer reaches a chunk.
+        :class:`StatisticsConsumer`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+    """
+
+    def __init__(self, deer):
+        """
+        Constructor method
+        """
+
+        self.feature_world = np.array(deer.feature_world)
+        self.length, self.width = deer.feature_world.shape
+        self.statistics = PathStatistics(deer.features, deer.motility_values, deer.names)
+
+        # position the deer ends on after the last chunk
+        self.end = None
+
+    def consume(self, t, positions, moves):
+        """ Adds a chunk of the path to the statistics.
+
+        :param t: Step of the first position of the chunk.
+        :type t: int
+        :param positions: x and y positions of the deer before each step, of shape (n, 2).
+        :type positions: ndArray
+        :param moves: Moves taken at each step, of shape (n, 2).
+        :type moves: ndArray
+        """
+
+        features = self.feature_world[positions[:, 0], positions[:, 1]]
+        self.statistics.extend(features, moves[:, 0], moves[:, 1])
+
+        self.end = ((positions[-1, 0] + moves[-1, 0]) % self.length, (positions[-1, 1] + moves[-1, 1]) % self.width)
+
+    def terrain(self, motility_values, regions):
+        """ Changes the terrain used for the steps after the terrain of the walk has changed.
+
+        :param motility_values: Motility values of each feature.
+        :type motility_values: ndArray
+        :param regions: Bounds and new features of each edited region, see changed_terrain.
+        :type regions: list
+        """
+
+        self.statistics.set_motility(motility_values)
+
+        for bounds, features in regions:
+            self.feature_world[wrapped_region(self.feature_world.shape, *bounds)] = features
+
+    def close(self):
+        """ Returns the finished statistics.
+
+        :return: Statistics of the path taken by the deer.
+        :rtype: PathStatistics
+        """
+
+        if self.end is not None:
+            self.statistics.finish(int(self.feature_world[self.end]))
+
+        return self.statistics
+
+
+class ExcelStreamer(object):
+    """Streams the rows of the path into an Excel file as the chunks of the path are produced by a Pipeline, using the
+        same columns as CaDeer.excel_write without holding the whole path in memory.
+        :class:`ExcelStreamer`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param excel_output_name: Name of the Excel file the user wishes to output data from the simulation.
+        :type excel_output_name: str
+    """
+
+    def __init__(self, deer, excel_output_name):
+        """
+        Constructor method
+        """
+
+        self.excel_output_name = excel_output_name
+        self.feature_world = np.array(deer.feature_world)
+        self.names = list(deer.names[:deer.features])
+        self.motility_values = list(deer.motility_values)
+
+        self.workbook = None
+        self.sheet = None
+        self.rows = 0
+
+    def open(self):
+        """ Starts the write only workbook, within the thread or process that streams the rows.
+        """
+
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append([None, 'Terrain', 'Motility', 'Axis Position'])
+
+    def consume(self, t, positions, moves):
+        """ Writes a row for each position of a chunk of the path.
+
+        :param t: Step of the first position of the chunk.
+        :type t: int
+        :param positions: x and y positions of the deer before each step, of shape (n, 2).
+        :type positions: ndArray
+        :param moves: Moves taken at each step, of shape (n, 2).
+        :type moves: ndArray
+        """
+
+        if self.workbook is None:
+            self.open()
+
+        if self.rows + len(positions) > EXCEL_ROWS:
+            if self.rows < EXCEL_ROWS:
+                print("\nExcel output has been cut off at {} rows, the most a sheet can hold.".format(EXCEL_ROWS))
+            positions = positions[:max(EXCEL_ROWS - self.rows, 0)]
+
+        features = self.feature_world[positions[:, 0], positions[:, 1]].tolist()
+
+        for i, (feature, (x, y)) in enumerate(zip(features, positions.tolist())):
+            self.sheet.append([t + i, self.names[feature], self.motility_values[feature], '[{}, {}]'.format(x, y)])
+
+        self.rows += len(positions)
+
+    def terrain(self, motility_values, regions):
+        """ Changes the terrain written for the steps after the terrain of the walk has changed.
+
+        :param motility_values: Motility values of each feature.
+        :type motility_values: ndArray
+        :param regions: Bounds and new features of each edited region, see changed_terrain.
+        :type regions: list
+        """
+
+        self.motility_values = list(motility_values)
+
+        for bounds, features in regions:
+            self.feature_world[wrapped_region(self.feature_world.shape, *bounds)] = features
+
+    def close(self):
+        """ Saves the Excel file.
+
+        :return: Name of the Excel file.
+        :rtype: str
+        """
+
+        if self.workbook is None:
+            self.open()
+
+        self.workbook.save(self.excel_output_name + '.xlsx')
+
+        return self.excel_output_name + '.xlsx'
+
+
+def consume_queue(chunks, consumer, results, index):
+    """ Worker loop of a consumer, which handles chunks until the producer sends None. Changes of the terrain arrive
+    between the chunks as ('terrain', motility values, regions), see changed_terrain. An exception raised by the
+    consumer is placed in the results instead of its result, so the producer can stop rather than wait on a queue that
+    is no longer read.
+
+    :param chunks: Bounded queue of chunks of the path.
+    :type chunks: Queue
+    :param consumer: Consumer of the chunks.
+    :type consumer: object
+    :param results: Queue the result of the consumer is placed in once it is finished.
+    :type results: Queue
+    :param index: Index of the consumer, returned along with its result.
+    :type index: int
+    """
+
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if chunk[0] == 'terrain':
+                consumer.terrain(*chunk[1:])
+            else:
+                consumer.consume(*chunk)
+
+        results.put((index, consumer.close()))
+    except Exception as error:
+        # exceptions that cannot be pickled would be lost on the way out of a process
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(traceback.format_exc())
+        results.put((index, error))
+
+
+class Pipeline(object):
+    """Runs the walk of the deer as the producer of a producer/consumer pipeline. The walk produces chunks of positions
+        into a bounded queue for each consumer, which render the mp4 frames, stream the Excel rows and update the path
+        statistics while the walk continues. A full queue blocks the walk until the consumer catches up, so the memory
+        used stays bounded, and the time taken approaches the slowest stage instead of the sum of the stages.
+        :class:`Pipeline`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param chunk_size: Number of steps within each chunk. Default is 1024.
+        :type chunk_size: int, optional
+        :param queue_size: Number of chunks each queue holds before the walk waits. Default is 8.
+        :type queue_size: int, optional
+        :param processes: Runs the renderer and the Excel streamer within their own processes instead of threads,
+        which keeps them from competing with the walk for the interpreter. Default is False.
+        :type processes: bool, optional
+    """
+
+    def __init__(self, deer, chunk_size=1024, queue_size=8, processes=False):
+        """
+        Constructor method
+        """
+
+        self.deer = deer
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.processes = processes
+
+        # queues, workers and results of the run in progress
+        self.queues = []
+        self.workers = []
+        self.results = None
+        self.finished = {}
+
+    def check_consumers(self):
+        """ Collects the results the consumers have placed so far, and stops the run when a consumer has failed or has
+        ended without placing a result.
+        """
+
+        self.collect()
+
+        for index, worker in enumerate(self.workers):
+            if not worker.is_alive() and index not in self.finished:
+                # the result may have been placed just before the worker ended
+                self.collect(CHECK_INTERVAL)
+                if index not in self.finished:
+                    self.stop(index, RuntimeError("Consumer {} has ended without a result.".format(index)))
+
+    def collect(self, timeout=None):
+        """ Files the results placed by the consumers under the consumer that placed each of them, and stops the run
+        when one of them is an exception.
+
+        :param timeout: Seconds to wait for the first result. Default is None, which will only take the results that
+        have already been placed.
+        :type timeout: float, optional
+        :return: True when a result was taken.
+        :rtype: bool
+        """
+
+        taken = False
+
+        while True:
+            try:
+                if timeout is None or taken:
+                    placed, result = self.results.get_nowait()
+                else:
+                    placed, result = self.results.get(timeout=timeout)
+            except queue.Empty:
+                return taken
+            taken = True
+
+            if isinstance(result, BaseException):
+                self.stop(placed, result)
+            self.finished[placed] = result
+
+    def send(self, item):
+        """ Places an item on the queue of every consumer still running, waiting whenever a consumer has fallen behind
+        and checking that the consumers are still running while it waits.
+
+        :param item: Chunk of the path, or None to finish the consumers.
+        :type item: tuple
+        """
+
+        for index, chunks in enumerate(self.queues):
+            while index not in self.finished:
+                try:
+                    chunks.put(item, timeout=CHECK_INTERVAL)
+                    break
+                except queue.Full:
+                    self.check_consumers()
+
+    def stop(self, index, error):
+        """ Finishes the consumers that are still running after a consumer has failed, and raises the error of the
+        failed consumer.
+
+        :param index: Index of the failed consumer.
+        :type index: int
+        :param error: Exception raised by the failed consumer.
+        :type error: Exception
+        """
+
+        print("\nConsumer {} has failed, the other consumers have been stopped.".format(index))
+
+        self.finished[index] = error
+        if self.processes:
+            # chunks left on the queue of the failed consumer are never read
+            self.queues[index].cancel_join_thread()
+
+        for other, (chunks, worker) in enumerate(zip(self.queues, self.workers)):
+            if other in self.finished:
+                continue
+            while worker.is_alive():
+                try:
+                    chunks.put(None, timeout=CHECK_INTERVAL)
+                    break
+                except queue.Full:
+                    pass
+
+        for worker in self.workers:
+            worker.join()
+
+        raise error
+
+    def run(self, time, mpfour_output=None, encoding=None, excel_output=None, fps=30, upscale=4):
+        """ Simulates the deer for a set amount of iterations while the consumers handle the path.
+
+        :param time: Total amount of iterations to run the simulation
+        :type time: int
+        :param mpfour_output: Determines name and address of mp4 output. Default is None, which will skip the video.
+        :type mpfour_output: string, optional
+        :param encoding: Determines if the user wants to encode the mp4 with a specific set of encoding instructions.
+        :type encoding: string, optional
+        :param excel_output: Name of the Excel output. Default is None, which will skip the Excel file.
+        :type excel_output: string, optional
+        :param fps: Frames per second of the mp4 output. Default is 30.
+        :type fps: int, optional
+        :param upscale: Number of pixels used for each position of the world along each axis. Default is 4.
+        :type upscale: int, optional
+        :return: Statistics of the path taken by the deer.
+        :rtype: PathStatistics
+        """
+
+        deer = self.deer
+
+        # get starting positions
+        deer.ca_setup()
+        trajectory = Trajectory(deer.current_pos_x, deer.current_pos_y, deer.length, deer.width)
+
+        consumers = [StatisticsConsumer(deer)]
+        if mpfour_output is not None:
+            consumers.append(FrameRenderer(deer, mpfour_output, encoding=encoding, fps=fps, upscale=upscale))
+        if excel_output is not None:
+            consumers.append(ExcelStreamer(deer, excel_output))
+
+        self.results = multiprocessing.Queue() if self.processes else queue.Queue()
+        self.queues = []
+        self.workers = []
+        self.finished = {}
+
+        for index, consumer in enumerate(consumers):
+            # the statistics are cheap to update, so they always stay within a thread
+            if self.processes and index > 0:
+                chunks = multiprocessing.Queue(self.queue_size)
+                worker = multiprocessing.Process(target=consume_queue, args=(chunks, consumer, self.results, index))
+            else:
+                chunks = queue.Queue(self.queue_size)
+                worker = threading.Thread(target=consume_queue, args=(chunks, consumer, self.results, index))
+
+            worker.start()
+            self.queues.append(chunks)
+            self.workers.append(worker)
+
+        for start in range(0, time, self.chunk_size):
+            steps = min(self.chunk_size, time - start)
+            positions = np.zeros((steps, 2), dtype=np.int64)
+            moves = np.zeros((steps, 2), dtype=np.int64)
+
+            # first step of the chunk that has not been sent
+            first = 0
+
+            for i in range(steps):
+                if deer.terrain_schedule is not None and deer.terrain_schedule.due(start + i):
+                    # the steps before the change are sent first, so the consumers handle them on the old terrain
+                    if i > first:
+                        self.send((start + first, positions[first:i], moves[first:i]))
+                    first = i
+
+                    deer.terrain_events(start + i)
+                    self.send(('terrain',) + changed_terrain(deer, deer.terrain_schedule.due(start + i)))
+
+                positions[i] = deer.current_pos_x, deer.current_pos_y
+                deer.step(trajectory=trajectory)
+                moves[i] = deer.next_position_x, deer.next_position_y
+
+            self.send((start + first, positions[first:], moves[first:]))
+            self.check_consumers()
+
+            print("\rPathing: {:.2f} ".format((start + steps) / time * 100), end="")
+
+        print("\rPathing: 100%")
+
+        self.send(None)
+
+        while len(self.finished) < len(consumers):
+            if not self.collect(CHECK_INTERVAL):
+                self.check_consumers()
+
+        for worker in self.workers:
+            worker.join()
+
+        deer.trajectory = trajectory
+        deer.path_statistics = self.finished[0]
+
+        return self.finished[0]
@@ -0,0 +1,90 @@
+import math
+import numpy as np
+
+
+class PrionField(object):
+    """Prions shed by an infected deer along its path, which decay exponentially at the rate of the terrain they were
+        shed on. Decay is only applied to a position when the deer returns to it, using the step the position was last
+        touched, so each step costs the same no matter the size of the world. The decayed field of the whole world is
+        only computed when a snapshot is taken.
+        :class:`PrionField`
+
+        :param feature_world: Feature index of each position of the world.
+        :type feature_world: ndArray
+        :param decay_rates: Decay rate of the prions within each feature, per iteration.
+        :type decay_rates: ndArray
+        :param shedding: Amount of prions shed by the deer at each iteration. Default is 1.0.
+        :type shedding: float, optional
+    """
+
+    def __init__(self, feature_world, decay_rates, shedding=1.0):
+        """
+        Constructor method
+        """
+
+        self.shedding = shedding
+
+        # decay rate of each position of the world
+        self.rates = np.asarray(decay_rates, dtype=float)[np.asarray(feature_world)]
+
+        # amount of prions at each position at the step it was last touched
+        self.value = np.zeros(self.rates.shape)
+        self.touched = np.zeros(self.rates.shape, dtype=np.int64)
+
+        self.time = 0
+
+    def update(self, x, y):
+        """ Decays the prions at the position of the deer up to the current step, adds the prions shed during this
+        step, and moves on to the next step.
+
+        :param x: x position of the deer.
+        :type x: int
+        :param y: y position of the deer.
+        :type y: int
+        """
+
+        elapsed = self.time - self.touched[x, y]
+        self.value[x, y] = self.value[x, y] * math.exp(-self.rates[x, y] * elapsed) + self.shedding
+        self.touched[x, y] = self.time
+
+        self.time += 1
+
+    def set_rates(self, region, rates):
+        """ Changes the decay rate of a region after its terrain has changed. The prions within the region are decayed
+        at the old rate up to the current step, and decay at the new rate from then on.
+
+        :param region: Index of the positions of the region.
+        :type region: tuple
+        :param rates: New decay rate of the positions, per iteration.
+        :type rates: float or ndArray
+        """
+
+        self.value[region] = self.value[region] * np.exp(-self.rates[region] * (self.time - self.touched[region]))
+        self.touched[region] = self.time
+        self.rates[region] = rates
+
+    def snapshot(self, time=None):
+        """ Computes the amount of prions at every position of the world.
+
+        :param time: Step to decay the field to, must not be before the last update. Default is None, which will use
+        the current step.
+        :type time: int, optional
+        :return: Prion raster of shape (length, width).
+        :rtype: ndArray
+        """
+
+        if time is None:
+            time = self.time
+
+        return self.value * np.exp(-self.rates * (time - self.touched))
+
+    def total(self, time=None):
+        """ Total amount of prions left within the world.
+
+        :param time: Step to decay the field to. Default is None, which will use the current step.
+        :type time: int, optional
+        :return: Sum of the prion raster.
+        :rtype: float
+        """
+
+        return float(self.snapshot(time).sum())
@@ -0,0 +1,121 @@
+import os
+import numpy as np
+
+# reading TIFF files is optional, NPY and raw binary rasters only need numpy
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+class FeatureValues(object):
+    """Read only stand in for the ca_world of a loaded raster. The color range value of a position is looked up from
+        the feature index raster when it is read, so a full float64 copy of a large raster is never made.
+        :class:`FeatureValues`
+
+        :param feature_world: Feature index of each position of the world.
+        :type feature_world: ndArray
+        :param color_range: Color range value of each feature.
+        :type color_range: ndArray
+    """
+
+    def __init__(self, feature_world, color_range):
+        """
+        Constructor method
+        """
+
+        self.feature_world = feature_world
+        self.color_range = np.asarray(color_range, dtype=float)
+        self.shape = feature_world.shape
+        self.dtype = self.color_range.dtype
+        self.nbytes = 0
+
+    def __getitem__(self, key):
+        return self.color_range[self.feature_world[key]]
+
+
+def open_raster(file_name, shape=None, dtype=None, offset=0):
+    """ Memory maps a raster file, so that only the windows that are read are loaded. NPY files hold their own shape
+    and type, raw binary files need both to be given, and TIFF files need the optional tifffile package. Compressed
+    TIFF files are decoded into a temporary memory mapped file.
+
+    :param file_name: File path of the raster, ending with .npy, .tif, .tiff, or anything else for raw binary.
+    :type file_name: string
+    :param shape: Number of rows and columns of a raw binary raster.
+    :type shape: tuple, optional
+    :param dtype: Type of the values of a raw binary raster, such as np.uint8 or np.float32.
+    :type dtype: type, optional
+    :param offset: Number of header bytes to skip within a raw binary raster. Default is 0.
+    :type offset: int, optional
+    :return: Memory mapped raster of shape (length, width), or None when the file could not be opened.
+    :rtype: ndArray
+    """
+
+    extension = os.path.splitext(file_name)[1].lower()
+
+    if extension == '.npy':
+        return np.load(file_name, mmap_mode='r')
+
+    if extension in ('.tif', '.tiff'):
+        if tifffile is None:
+            print("TIFF rasters need the tifffile package, please install it or convert the raster to NPY.")
+            return None
+        try:
+            return tifffile.memmap(file_name, mode='r')
+        except ValueError:
+            return tifffile.imread(file_name, out='memmap')
+
+    if shape is None or dtype is None:
+        print("Raw binary rasters need a shape and dtype, please enter both.")
+        return None
+
+    return np.memmap(file_name, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+
+
+def classify_raster(raster, thresholds=None, codes=None, window=1024):
+    """ Turns a raster into feature indices one window at a time. Continuous rasters are classified with thresholds
+    the same way color_world classifies the Perlin noise, the first threshold greater than a value gives its feature.
+    Land cover rasters are mapped from their categorical codes straight to feature indices. Values that fit no feature
+    are given feature 0.
+
+    :param raster: Raster of shape (length, width), may be memory mapped.
+    :type raster: ndArray
+    :param thresholds: Increasing color range values of each feature, used when codes is None.
+    :type thresholds: ndArray, optional
+    :param codes: Feature index of each land cover code.
+    :type codes: dict, optional
+    :param window: Number of rows and columns read at once. Default is 1024.
+    :type window: int, optional
+    :return: Feature index raster of shape (length, width).
+    :rtype: ndArray
+    """
+
+    length, width = raster.shape
+    feature_world = np.zeros((length, width), dtype=np.uint8)
+    unmatched = 0
+
+    if codes is not None:
+        known = np.array(sorted(codes))
+        features = np.array([codes[code] for code in known], dtype=np.uint8)
+    else:
+        thresholds = np.asarray(thresholds, dtype=float)
+
+    for row in range(0, length, window):
+        for column in range(0, width, window):
+            block = np.asarray(raster[row:row + window, column:column + window])
+
+            if codes is not None:
+                index = np.minimum(np.searchsorted(known, block), known.size - 1)
+                matched = known[index] == block
+                classified = features[index]
+            else:
+                classified = np.searchsorted(thresholds, block, side='right')
+                matched = classified < thresholds.size
+
+            unmatched += block.size - int(np.count_nonzero(matched))
+            feature_world[row:row + window, column:column + window] = np.where(matched, classified, 0)
+
+    if unmatched:
+        print("{} positions of the raster did not match a feature and have been set to feature 0.".format(unmatched))
+
+    return feature_world
@@ -0,0 +1,164 @@
+import numpy as np
+from multiprocessing import shared_memory
+from CaDeerMotility import CaDeer
+from CaDeerRaster import FeatureValues
+
+# arrays of a colored world that are published into shared memory
+SHARED_ARRAYS = ['world', 'ca_world', 'world_color', 'feature_world']
+
+# walker attached by shared_initializer within each worker process
+worker_walker = None
+
+
+class SharedWorld(object):
+    """Publishes the world of a CaDeer into shared memory once, so that walkers within other processes can attach to
+        it without regenerating the world or receiving a pickled copy of it. Only the small feature settings are
+        pickled, which keeps the memory used by each walker independent of the size of the world. Views of a radius
+        other than 3 are computed for the whole world ahead of the walk, so their movement squares are computed once
+        and published along with the world, instead of by every walker.
+        :class:`SharedWorld`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+    """
+
+    def __init__(self, deer):
+        """
+        Constructor method
+        """
+
+        self.blocks = []
+        self.arrays = {}
+
+        for name in SHARED_ARRAYS:
+            array = getattr(deer, name)
+            # a loaded raster only needs its features, the raster itself stays within its memory mapped file
+            if deer.raster is not None and name != 'feature_world':
+                continue
+            self.publish(name, array)
+
+        if deer.view_radius != 3:
+            self.publish('view_squares', deer.view_squares if deer.view_squares is not None else deer.view_world())
+
+        # settings that are small enough to pickle for each walker
+        self.settings = {'scale': deer.scale, 'octaves': deer.octaves, 'persistence': deer.persistence,
+                         'lacunarity': deer.lacunarity, 'base': deer.base, 'features': deer.features,
+                         'view_radius': deer.view_radius,
+                         'colors': deer.colors, 'color_range': deer.color_range,
+                         'motility_values': deer.motility_values, 'names': deer.names[:deer.features],
+                         'decay_rates': deer.decay_rates, 'light_mode': deer.light_mode,
+                         'output_excel_name': deer.output_excel_name}
+
+    def publish(self, name, array):
+        """ Copies an array into a new block of shared memory.
+
+        :param name: Name of the attribute of the walkers that holds the array.
+        :type name: str
+        :param array: Array to share.
+        :type array: ndArray
+        """
+
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+        shared[:] = array
+        self.blocks.append(block)
+        self.arrays[name] = (block.name, array.shape, array.dtype.str)
+
+    def handle(self):
+        """ Returns the description of the shared world that is passed to the worker processes.
+
+        :return: Names, shapes and types of the shared arrays along with the feature settings.
+        :rtype: dict
+        """
+
+        return {'arrays': self.arrays, 'settings': self.settings}
+
+    def close(self):
+        """ Releases and removes the shared memory, which must be done once all walkers are finished.
+        """
+
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+
+        self.blocks = []
+
+
+def attach(handle):
+    """ Creates a walker that reads the world from shared memory. The world arrays of the walker are read only, so the
+    walker is used with CaDeer.walk, which does not draw the path into world_color.
+
+    :param handle: Description of the shared world created by SharedWorld.handle.
+    :type handle: dict
+    :return: Deer simulation whose world arrays are views of the shared memory.
+    :rtype: CaDeer
+    """
+
+    settings = handle['settings']
+
+    walker = CaDeer(scale=settings['scale'], octaves=settings['octaves'], persistence=settings['persistence'],
+                    lacunarity=settings['lacunarity'], base=settings['base'], features=settings['features'],
+                    view_radius=settings['view_radius'])
+    walker.features = settings['features']
+    walker.colors = settings['colors']
+    walker.color_range = settings['color_range']
+    walker.motility_values = settings['motility_values']
+    walker.names = list(settings['names'])
+    walker.decay_rates = settings['decay_rates']
+    walker.light_mode = settings['light_mode']
+    walker.output_excel_name = settings['output_excel_name']
+    walker.create_dictionary()
+
+    # the blocks are kept with the walker, as the arrays are only valid while they are open
+    walker.shared_blocks = []
+
+    for name, (block_name, shape, dtype) in handle['arrays'].items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        setattr(walker, name, array)
+        walker.shared_blocks.append(block)
+
+    walker.length, walker.width = walker.feature_world.shape
+
+    # the world was loaded from a raster, so only its features were shared
+    if 'ca_world' not in handle['arrays']:
+        walker.ca_world = FeatureValues(walker.feature_world, walker.color_range)
+        walker.raster = walker.feature_world
+
+    return walker
+
+
+def shared_initializer(handle):
+    """ Initializer of a multiprocessing Pool that attaches a walker to the shared world once per worker.
+
+    :param handle: Description of the shared world created by SharedWorld.handle.
+    :type handle: dict
+    """
+
+    global worker_walker
+    worker_walker = attach(handle)
+
+
+def shared_walk(time, starting_pos_x=None, starting_pos_y=None, seed=None):
+    """ Walks the walker of the worker process through the shared world, to be used with Pool.map or Pool.starmap.
+
+    :param time: Total amount of iterations to run the simulation
+    :type time: int
+    :param starting_pos_x: Starting x position of the deer. Default is None, which will pick a random position.
+    :type starting_pos_x: int, optional
+    :param starting_pos_y: Starting y position of the deer. Default is None, which will pick a random position.
+    :type starting_pos_y: int, optional
+    :param seed: Seed of the random values of the walk. Default is None, which will seed from the operating system.
+    :type seed: int, optional
+    :return: Statistics of the path taken by the deer.
+    :rtype: PathStatistics
+    """
+
+    worker_walker.starting_pos_x = starting_pos_x
+    worker_walker.starting_pos_y = starting_pos_y
+
+    # each task seeds its own random values, as forked workers start from the same random state
+    np.random.seed(seed)
+
+    return worker_walker.walk(time)
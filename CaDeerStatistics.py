@@ -0,0 +1,368 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+
+class PathStatistics(object):
+    """Summary statistics of a simulated deer path that are updated online while the deer moves through the world.
+        Memory use depends only on the number of features, so no path has to be kept or re-read from Excel.
+        :class:`PathStatistics`
+
+        :param features: Number of features used within the world.
+        :type features: int
+        :param motility_values: Motility values of each feature, in the same order as the color range.
+        :type motility_values: ndArray
+        :param names: Names of each feature, used when summarizing the statistics. Default is None, which will name
+        the features by their index.
+        :type names: list, optional
+    """
+
+    def __init__(self, features, motility_values, names=None):
+        """
+        Constructor method
+        """
+
+        self.features = features
+        self.motility_values = np.asarray(motility_values, dtype=float)
+
+        if names is None:
+            names = [str(i) for i in range(features)]
+        # copy the names as the CaDeer class appends the deer to its own list
+        self.names = list(names[:features])
+
+        # number of steps spent within each feature
+        self.visits = np.zeros(features, dtype=np.int64)
+        # number of moves from the row feature into the column feature, the last move is counted by finish
+        self.transitions = np.zeros((features, features), dtype=np.int64)
+
+        # running mean and sum of squared differences of the motility encountered (Welford)
+        self.motility_mean = 0.0
+        self.motility_m2 = 0.0
+
+        # unwrapped displacement from the starting position
+        self.displacement_x = 0
+        self.displacement_y = 0
+
+        self.steps = 0
+        self.previous_feature = None
+
+    def update(self, feature, dx, dy):
+        """ Adds a single step of the deer to the statistics.
+
+        :param feature: Feature index of the cell the deer is standing on before the move.
+        :type feature: int
+        :param dx: Movement of the deer along the x-axis, one of -1, 0, 1.
+        :type dx: int
+        :param dy: Movement of the deer along the y-axis, one of -1, 0, 1.
+        :type dy: int
+        """
+
+        self.steps += 1
+        self.visits[feature] += 1
+
+        if self.previous_feature is not None:
+            self.transitions[self.previous_feature, feature] += 1
+        self.previous_feature = feature
+
+        # update the running mean and variance of the motility
+        motility = self.motility_values[feature]
+        delta = motility - self.motility_mean
+        self.motility_mean += delta / self.steps
+        self.motility_m2 += delta * (motility - self.motility_mean)
+
+        # moves are never larger than one cell, so the displacement can be unwrapped by summing them
+        self.displacement_x += dx
+        self.displacement_y += dy
+
+    def extend(self, features, dx, dy):
+        """ Adds many steps of the deer to the statistics at once, which matches calling update for each step up to the
+        rounding of the motility mean and variance.
+
+        :param features: Feature index of the cell the deer is standing on before each move.
+        :type features: ndArray
+        :param dx: Movements of the deer along the x-axis.
+        :type dx: ndArray
+        :param dy: Movements of the deer along the y-axis.
+        :type dy: ndArray
+        """
+
+        features = np.asarray(features, dtype=np.int64)
+        if features.size == 0:
+            return
+
+        self.visits += np.bincount(features, minlength=self.features)
+
+        # moves between consecutive steps, including the step before this chunk
+        if self.previous_feature is None:
+            previous, current = features[:-1], features[1:]
+        else:
+            previous, current = np.concatenate([[self.previous_feature], features[:-1]]), features
+        self.transitions += np.bincount(previous * self.features + current,
+                                        minlength=self.features ** 2).reshape(self.features, self.features)
+        self.previous_feature = int(features[-1])
+
+        # merge the mean and variance of the chunk into the running values (Chan et al.)
+        motility = self.motility_values[features]
+        mean = motility.mean()
+        total = self.steps + features.size
+        delta = mean - self.motility_mean
+        self.motility_m2 += np.sum((motility - mean) ** 2) + delta ** 2 * self.steps * features.size / total
+        self.motility_mean += delta * features.size / total
+        self.steps = total
+
+        self.displacement_x += int(np.sum(dx))
+        self.displacement_y += int(np.sum(dy))
+
+    def set_motility(self, motility_values):
+        """ Replaces the motility values of the features after the terrain has changed. The running motility mean and
+        variance keep the values encountered before the change and use the new values from the next step on.
+
+        :param motility_values: New motility values of each feature.
+        :type motility_values: ndArray
+        """
+
+        self.motility_values = np.asarray(motility_values, dtype=float)
+
+    def finish(self, feature):
+        """ Counts the last move of the path, into the position the deer ends on, which is not known until the walk
+        ends. Steps added afterwards start a new path, so the move from this position to the next start is not counted.
+
+        :param feature: Feature index of the cell the deer ends on.
+        :type feature: int
+        """
+
+        if self.previous_feature is not None:
+            self.transitions[self.previous_feature, feature] += 1
+        self.previous_feature = None
+
+    @property
+    def occupancy(self):
+        """ Fraction of the steps spent within each feature.
+
+        :return: Occupancy fraction of each feature.
+        :rtype: ndArray
+        """
+
+        if self.steps == 0:
+            return np.zeros(self.features)
+        return self.visits / self.steps
+
+    @property
+    def motility_variance(self):
+        """ Sample variance of the motility encountered by the deer.
+
+        :return: Variance of the motility values, 0 when less than two steps have been taken.
+        :rtype: float
+        """
+
+        if self.steps < 2:
+            return 0.0
+        return self.motility_m2 / (self.steps - 1)
+
+    @property
+    def net_displacement(self):
+        """ Straight line distance between the starting position and the current position of the deer, ignoring the
+        wrap around of the world.
+
+        :return: Net displacement in cells.
+        :rtype: float
+        """
+
+        return np.hypot(self.displacement_x, self.displacement_y)
+
+    def summary(self):
+        """ Returns the per feature statistics as a data frame.
+
+        :return: Data frame holding the terrain name, motility, visits, occupancy and moves out of each feature.
+        :rtype: DataFrame
+        """
+
+        return pd.DataFrame({'Terrain': self.names, 'Motility': self.motility_values, 'Visits': self.visits,
+                             'Occupancy': self.occupancy, 'Moves Out': self.transitions.sum(axis=1)})
+
+
+class OccupancyMonitor(object):
+    """Confidence intervals of the occupancy of each feature that are updated online with batch means, used to stop a
+        walk once its occupancy has settled. The steps are split into batches and the occupancy of each batch is kept.
+        Once there are twice as many batches as asked for, neighboring batches are merged and the batch size doubles,
+        so the batches grow with the walk. The batches are also merged while the lag-1 autocorrelation of the batch
+        occupancies is larger than chance alone would give, so a deer that mixes slowly gets longer batches until they
+        are close to independent. The interval of each feature is the mean of the batch occupancies plus or minus the t
+        quantile times their standard error. No interval is given before there are as many batches as asked for, so the
+        shortest run is batches times batch_size steps.
+
+        The intervals only cover the part of the world the deer has reached. A deer trapped within a single terrain
+        gives intervals of zero width, so the walk also has to show that the deer moves between the terrains it spends
+        time in. A batch varies for a terrain when the deer spent some but not all of it there, which means the deer
+        crossed the edge of the terrain within the batch. The deer has mixed once every terrain with an occupancy of at
+        least the tolerance varied within at least varied_batches of the batches. Rarer terrains do not hold up the
+        walk, as their whole occupancy is within the tolerance, and the walk has converged once the deer has mixed and
+        every interval is within the tolerance.
+        :class:`OccupancyMonitor`
+
+        :param features: Number of features used within the world.
+        :type features: int
+        :param tolerance: Largest half width of the interval of every feature at which the occupancy has converged.
+        Default is 0.01.
+        :type tolerance: float, optional
+        :param confidence: Confidence level of the intervals. Default is 0.95.
+        :type confidence: float, optional
+        :param batches: Number of batches kept after merging, at least 2. Default is 32.
+        :type batches: int, optional
+        :param batch_size: Number of steps of each batch before any merging. Default is 100.
+        :type batch_size: int, optional
+        :param names: Names of each feature. Default is None, which will name the features by their index.
+        :type names: list, optional
+        :param varied_batches: Fewest batches in which every terrain with an occupancy of at least the tolerance has to
+        vary for the deer to have mixed. Default is 4.
+        :type varied_batches: int, optional
+    """
+
+    def __init__(self, features, tolerance=0.01, confidence=0.95, batches=32, batch_size=100, names=None,
+                 varied_batches=4):
+        """
+        Constructor method
+        """
+
+        if batches < 2:
+            print("Batches has been set to default, please enter a number of batches greater than 1.")
+            batches = 32
+        if batch_size < 1:
+            print("Batch size has been set to default, please enter a batch size greater than 0.")
+            batch_size = 100
+        if varied_batches < 1:
+            print("Varied batches has been set to default, please enter a number of varied batches greater than 0.")
+            varied_batches = 4
+
+        self.features = features
+        self.tolerance = tolerance
+        self.confidence = confidence
+        self.batches = batches
+        self.batch_size = batch_size
+        self.varied_batches = varied_batches
+
+        if names is None:
+            names = [str(i) for i in range(features)]
+        self.names = list(names[:features])
+
+        # occupancy of each finished batch
+        self.means = []
+
+        # visits and steps at the start of the current batch
+        self.start_visits = np.zeros(features, dtype=np.int64)
+        self.start_steps = 0
+
+        self.half_width = np.full(features, np.inf)
+        # largest lag-1 autocorrelation of the batch occupancies of any feature
+        self.autocorrelation = np.nan
+        self.converged = False
+
+        # number of batches in which the occupancy of each feature is neither 0 nor 1
+        self.varied = np.zeros(features, dtype=np.int64)
+        self.mixed = False
+
+    def start(self, statistics):
+        """ Starts the first batch at the current step of the statistics, used when a walk continues earlier
+        statistics.
+
+        :param statistics: Statistics of the walk being monitored.
+        :type statistics: PathStatistics
+        """
+
+        self.start_visits = statistics.visits.copy()
+        self.start_steps = statistics.steps
+
+    def update(self, statistics):
+        """ Checks the statistics of the walk after a step, closing the current batch once it is full.
+
+        :param statistics: Statistics of the walk being monitored.
+        :type statistics: PathStatistics
+        :return: True once the interval of every feature is within the tolerance.
+        :rtype: bool
+        """
+
+        if statistics.steps - self.start_steps < self.batch_size:
+            return self.converged
+
+        self.means.append((statistics.visits - self.start_visits) / self.batch_size)
+        self.start_visits = statistics.visits.copy()
+        self.start_steps = statistics.steps
+
+        if len(self.means) == 2 * self.batches:
+            self.merge()
+
+        means = np.array(self.means)
+
+        # a terrain that seldom varies was entered or left too few times to tell whether the deer mixes
+        self.varied = ((means > 0) & (means < 1)).sum(axis=0)
+        self.mixed = bool(np.all(self.varied[means.mean(axis=0) >= self.tolerance] >= self.varied_batches))
+
+        # too few batches give intervals that cannot be trusted
+        if len(self.means) < self.batches:
+            return self.converged
+
+        # batches that are still correlated are too short for the interval, they are merged once there is an even number
+        self.autocorrelation = lag_autocorrelation(means)
+        if self.autocorrelation > stats.norm.ppf(self.confidence) / np.sqrt(len(means)):
+            self.converged = False
+            if len(self.means) % 2 == 0:
+                self.merge()
+            return self.converged
+
+        quantile = stats.t.ppf(0.5 + self.confidence / 2, len(means) - 1)
+        self.half_width = quantile * means.std(axis=0, ddof=1) / np.sqrt(len(means))
+        self.converged = bool(np.all(self.half_width < self.tolerance) and self.mixed)
+
+        return self.converged
+
+    def merge(self):
+        """ Merges neighboring batches, which doubles the batch size.
+        """
+
+        self.means = [(self.means[i] + self.means[i + 1]) / 2 for i in range(0, len(self.means), 2)]
+        self.batch_size *= 2
+
+    @property
+    def occupancy(self):
+        """ Occupancy of each feature over the finished batches.
+
+        :return: Occupancy fraction of each feature.
+        :rtype: ndArray
+        """
+
+        if not self.means:
+            return np.zeros(self.features)
+        return np.mean(self.means, axis=0)
+
+    def summary(self):
+        """ Returns the occupancy and confidence interval of each feature as a data frame.
+
+        :return: Data frame holding the terrain name, occupancy, half width, the bounds of the interval, and the
+        number of batches in which the occupancy varied.
+        :rtype: DataFrame
+        """
+
+        occupancy = self.occupancy
+
+        return pd.DataFrame({'Terrain': self.names, 'Occupancy': occupancy, 'Half Width': self.half_width,
+                             'Lower': occupancy - self.half_width, 'Upper': occupancy + self.half_width,
+                             'Varied Batches': self.varied})
+
+
+def lag_autocorrelation(means):
+    """ Largest lag-1 autocorrelation of a series of batch means over the features. Features whose batch means do not
+    change are left out.
+
+    :param means: Batch means of shape (batches, features).
+    :type means: ndArray
+    :return: Largest autocorrelation, or nan when no feature changes.
+    :rtype: float
+    """
+
+    changing = np.ptp(means, axis=0) > 0
+    if not np.any(changing):
+        return np.nan
+
+    centered = means[:, changing] - means[:, changing].mean(axis=0)
+
+    return float(np.max((centered[:-1] * centered[1:]).sum(axis=0) / (centered ** 2).sum(axis=0)))
@@ -0,0 +1,202 @@
+import numpy as np
+
+
+def wrapped_region(shape, x_start, x_end, y_start, y_end):
+    """ Index of a region of the world that wraps around the edges of the world.
+
+    :param shape: Length and width of the world.
+    :type shape: tuple
+    :param x_start: First x position of the region.
+    :type x_start: int
+    :param x_end: x position after the last x position of the region.
+    :type x_end: int
+    :param y_start: First y position of the region.
+    :type y_start: int
+    :param y_end: y position after the last y position of the region.
+    :type y_end: int
+    :return: Open mesh of the rows and columns of the region, see np.ix_.
+    :rtype: tuple
+    """
+
+    rows = np.remainder(np.arange(x_start, x_end), shape[0])
+    columns = np.remainder(np.arange(y_start, y_end), shape[1])
+
+    return np.ix_(rows, columns)
+
+
+def changed_terrain(deer, events):
+    """ Motility values and the features of each edited region of a deer after a set of scheduled events has been
+    applied to it, for renderers and other consumers of a walk that keep their own copy of the terrain. Regions that
+    were not changed, such as edits to an unknown terrain, hold their current features.
+
+    :param deer: Deer simulation the events were applied to.
+    :type deer: CaDeer
+    :param events: Kind and values of each event, see TerrainSchedule.due.
+    :type events: list
+    :return: Motility values of each feature, and the bounds and features of each edited region.
+    :rtype: tuple
+    """
+
+    regions = []
+    for kind, values in events:
+        if kind == 'region':
+            bounds = tuple(values[:4])
+            regions.append((bounds, np.array(deer.feature_world[wrapped_region(deer.feature_world.shape, *bounds)])))
+
+    return np.array(deer.motility_values, dtype=float), regions
+
+
+class TerrainSchedule(object):
+    """Changes of the terrain that happen at given iterations of a walk, such as snow cover raising the motility of a
+        terrain or water levels flooding a region of the world. Used with CaDeer.set_schedule.
+        :class:`TerrainSchedule`
+    """
+
+    def __init__(self):
+        """
+        Constructor method
+        """
+
+        # events of each iteration, in the order they were added
+        self.events = {}
+
+    def change_motility(self, step, motility_values):
+        """ Replaces the motility values of every feature at an iteration.
+
+        :param step: Iteration of the walk at which the change happens.
+        :type step: int
+        :param motility_values: New motility values of each feature.
+        :type motility_values: ndArray
+        """
+
+        self.events.setdefault(step, []).append(('motility', np.asarray(motility_values, dtype=float)))
+
+    def edit_region(self, step, x_start, x_end, y_start, y_end, feature):
+        """ Turns a region of the world into a single feature at an iteration. The region wraps around the edges of the
+        world.
+
+        :param step: Iteration of the walk at which the change happens.
+        :type step: int
+        :param x_start: First x position of the region.
+        :type x_start: int
+        :param x_end: x position after the last x position of the region.
+        :type x_end: int
+        :param y_start: First y position of the region.
+        :type y_start: int
+        :param y_end: y position after the last y position of the region.
+        :type y_end: int
+        :param feature: Name or feature index of the new terrain of the region.
+        :type feature: str or int
+        """
+
+        self.events.setdefault(step, []).append(('region', (x_start, x_end, y_start, y_end, feature)))
+
+    def due(self, step):
+        """ Returns the events of an iteration.
+
+        :param step: Iteration of the walk.
+        :type step: int
+        :return: List of the kind and values of each event.
+        :rtype: list
+        """
+
+        return self.events.get(step, [])
+
+
+class TileIndex(object):
+    """Splits the world into square tiles and keeps the number of positions of each feature within every tile, which
+        tells which tiles a change of the terrain reaches without looking at every position of the world.
+        :class:`TileIndex`
+
+        :param feature_world: Feature index of each position of the world.
+        :type feature_world: ndArray
+        :param features: Number of features used within the world.
+        :type features: int
+        :param tile_size: Number of positions along each side of a tile. Default is 64.
+        :type tile_size: int, optional
+    """
+
+    def __init__(self, feature_world, features, tile_size=64):
+        """
+        Constructor method
+        """
+
+        self.feature_world = feature_world
+        self.features = features
+        self.tile_size = tile_size
+        self.length, self.width = feature_world.shape
+        self.tiles_x = -(-self.length // tile_size)
+        self.tiles_y = -(-self.width // tile_size)
+
+        # number of positions of each feature within each tile
+        self.presence = np.zeros((self.tiles_x, self.tiles_y, features), dtype=np.int64)
+        for tile_x in range(self.tiles_x):
+            for tile_y in range(self.tiles_y):
+                self.count(tile_x, tile_y)
+
+    def bounds(self, tile_x, tile_y):
+        """ Positions covered by a tile.
+
+        :param tile_x: x index of the tile.
+        :type tile_x: int
+        :param tile_y: y index of the tile.
+        :type tile_y: int
+        :return: First x position, x position after the last, first y position, and y position after the last.
+        :rtype: tuple
+        """
+
+        return (tile_x * self.tile_size, min((tile_x + 1) * self.tile_size, self.length),
+                tile_y * self.tile_size, min((tile_y + 1) * self.tile_size, self.width))
+
+    def count(self, tile_x, tile_y):
+        """ Counts the features of a tile again after the terrain within it has changed.
+
+        :param tile_x: x index of the tile.
+        :type tile_x: int
+        :param tile_y: y index of the tile.
+        :type tile_y: int
+        """
+
+        x_start, x_end, y_start, y_end = self.bounds(tile_x, tile_y)
+        self.presence[tile_x, tile_y] = np.bincount(self.feature_world[x_start:x_end, y_start:y_end].ravel(),
+                                                    minlength=self.features)
+
+    def region_tiles(self, x_start, x_end, y_start, y_end, halo=0):
+        """ Tiles reached by a region of the world grown by a halo on every side, wrapping around the edges.
+
+        :param x_start: First x position of the region.
+        :type x_start: int
+        :param x_end: x position after the last x position of the region.
+        :type x_end: int
+        :param y_start: First y position of the region.
+        :type y_start: int
+        :param y_end: y position after the last y position of the region.
+        :type y_end: int
+        :param halo: Number of positions to grow the region by. Default is 0.
+        :type halo: int, optional
+        :return: Set of the x and y index of each tile.
+        :rtype: set
+        """
+
+        rows = np.unique(np.remainder(np.arange(x_start - halo, x_end + halo), self.length) // self.tile_size)
+        columns = np.unique(np.remainder(np.arange(y_start - halo, y_end + halo), self.width) // self.tile_size)
+
+        return {(int(tile_x), int(tile_y)) for tile_x in rows for tile_y in columns}
+
+    def feature_tiles(self, features, halo=0):
+        """ Tiles holding any of a set of features, along with the tiles within a halo of them.
+
+        :param features: Feature indices to look for.
+        :type features: ndArray
+        :param halo: Number of positions to grow each tile by. Default is 0.
+        :type halo: int, optional
+        :return: Set of the x and y index of each tile.
+        :rtype: set
+        """
+
+        tiles = set()
+
+        for tile_x, tile_y in zip(*np.nonzero(self.presence[:, :, features].sum(axis=-1))):
+            tiles |= self.region_tiles(*self.bounds(tile_x, tile_y), halo=halo)
+
+        return tiles
@@ -0,0 +1,327 @@
+import os
+from multiprocessing import Pool
+import numpy as np
+from matplotlib import cm
+from PIL import Image
+from CaDeerVideo import alpha_table
+
+# layers of the pyramid, the classified world, the number of visits of each position, and the trail of the deer drawn
+# as pathing draws it
+LAYERS = ['world', 'heatmap', 'path']
+
+# layers drawn from the visits of the deer, which change as the deer moves
+VISIT_LAYERS = ['heatmap', 'path']
+
+# deep zoom descriptor of each layer
+DZI_TEMPLATE = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" TileSize="{}" Overlap="0" Format="png">\n'
+                '    <Size Width="{}" Height="{}"/>\n'
+                '</Image>\n')
+
+
+def paint_tile(task):
+    """ Colors one tile of the full resolution level from the feature indices and visits within it, and writes it as a
+    PNG file. Only the tile and the small color tables are passed to the worker processes.
+
+    :param task: File name of the tile, layer, feature indices, visits, and the color tables of the layer.
+    :type task: tuple
+    :return: File name of the tile.
+    :rtype: str
+    """
+
+    file_name, layer, features, visits, palette, table = task
+
+    if layer == 'world':
+        rgb = palette[features]
+    elif layer == 'heatmap':
+        rgb = table[np.minimum(visits, table.shape[0] - 1)]
+    else:
+        # the trail fades the colors of the world over a white background, as imshow shows the RGBA world
+        alpha = table[np.minimum(visits, table.size - 1)][..., None]
+        rgb = np.round((palette[features] / 255 * alpha + (1 - alpha)) * 255).astype(np.uint8)
+
+    Image.fromarray(rgb).save(file_name, compress_level=1)
+
+    return file_name
+
+
+def shrink_tile(task):
+    """ Builds one tile of a lower level by averaging every 2 by 2 block of pixels of the four tiles below it.
+
+    :param task: File name of the tile and the file names of the tiles below it, as [[top left, top right], [bottom
+    left, bottom right]] with None for tiles outside of the image.
+    :type task: tuple
+    :return: File name of the tile.
+    :rtype: str
+    """
+
+    file_name, children = task
+
+    rows = [np.concatenate([np.asarray(Image.open(child), dtype=np.float64) for child in row if child is not None],
+                           axis=1) for row in children if row[0] is not None]
+    image = np.concatenate(rows, axis=0)
+
+    # odd edges repeat their last pixel, so the level is ceil(length / 2) by ceil(width / 2)
+    image = np.pad(image, ((0, image.shape[0] % 2), (0, image.shape[1] % 2), (0, 0)), mode='edge')
+    image = image.reshape(image.shape[0] // 2, 2, image.shape[1] // 2, 2, 3).mean(axis=(1, 3))
+
+    Image.fromarray(np.round(image).astype(np.uint8)).save(file_name, compress_level=1)
+
+    return file_name
+
+
+class TilePyramid(object):
+    """Deep zoom image pyramid of the world and the path of the deer, written as PNG tiles for each zoom level. The
+        full resolution tiles are colored straight from the feature index raster with a color lookup, so no RGBA copy
+        of the world is made, and each lower level is averaged from the tiles of the level above it. Tiles are
+        rendered in parallel, and after the deer moves again only the tiles it touched are rendered again.
+        :class:`TilePyramid`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param directory: Directory the pyramid is written to, holding a .dzi descriptor and a folder of tiles for each
+        layer.
+        :type directory: string
+        :param tile_size: Number of pixels along each side of a tile. Default is 256.
+        :type tile_size: int, optional
+        :param layers: Layers to write, any of 'world', 'heatmap', and 'path'. Default is None, which will write all
+        three.
+        :type layers: list, optional
+        :param heat_scale: Number of visits shown with the brightest heatmap color. Default is None, which will use the
+        most visited position of the first export, and is kept for later updates so unchanged tiles still match.
+        :type heat_scale: int, optional
+    """
+
+    def __init__(self, deer, directory, tile_size=256, layers=None, heat_scale=None):
+        """
+        Constructor method
+        """
+
+        if layers is None:
+            layers = LAYERS
+
+        for layer in layers:
+            if layer not in LAYERS:
+                print("Layer {} has been skipped, please enter any of {}.".format(layer, LAYERS))
+        self.layers = [layer for layer in layers if layer in LAYERS]
+
+        self.directory = directory
+        self.tile_size = tile_size
+        self.heat_scale = heat_scale
+        self.feature_world = deer.feature_world
+        self.length, self.width = self.feature_world.shape
+        self.visits = np.zeros((self.length, self.width), dtype=np.int64)
+
+        colors = np.asarray(deer.colors, dtype=float)
+        self.palette = np.round(colors[:, :3] * 255).astype(np.uint8)
+        self.alpha = alpha_table(deer.light_mode, colors[0][3])
+        self.heat = None
+
+        # level 0 is a single pixel and the last level is the full resolution world
+        self.top_level = int(np.ceil(np.log2(max(self.length, self.width, 1))))
+
+    def level_shape(self, level):
+        """ Number of pixels of the image at a zoom level.
+
+        :param level: Zoom level.
+        :type level: int
+        :return: Length and width of the image.
+        :rtype: tuple
+        """
+
+        factor = 2 ** (self.top_level - level)
+
+        return -(-self.length // factor), -(-self.width // factor)
+
+    def level_tiles(self, level):
+        """ Number of tiles of a zoom level.
+
+        :param level: Zoom level.
+        :type level: int
+        :return: Number of tiles along x and along y.
+        :rtype: tuple
+        """
+
+        length, width = self.level_shape(level)
+
+        return -(-length // self.tile_size), -(-width // self.tile_size)
+
+    def tile_file(self, layer, level, tile_x, tile_y):
+        """ File name of a tile, following the deep zoom layout of column_row.png within a folder for each level.
+
+        :param layer: Layer of the tile.
+        :type layer: str
+        :param level: Zoom level of the tile.
+        :type level: int
+        :param tile_x: x index of the tile.
+        :type tile_x: int
+        :param tile_y: y index of the tile.
+        :type tile_y: int
+        :return: File name of the tile.
+        :rtype: str
+        """
+
+        return os.path.join(self.directory, layer + '_files', str(level), '{}_{}.png'.format(tile_y, tile_x))
+
+    def heat_table(self):
+        """ Heatmap color of each number of visits, on a log scale up to the heat scale. Unvisited positions are black.
+
+        :return: RGB colors between 0-255 for 0 to heat scale visits.
+        :rtype: ndArray
+        """
+
+        scale = np.log1p(np.arange(self.heat_scale + 1)) / np.log1p(self.heat_scale)
+        table = np.round(cm.inferno(scale)[:, :3] * 255).astype(np.uint8)
+        table[0] = 0
+
+        return table
+
+    def add_visits(self, trajectory, start=0, stop=None):
+        """ Adds the visits of a range of steps of a trajectory and returns the full resolution tiles they touched.
+
+        :param trajectory: Trajectory of the deer within the world.
+        :type trajectory: Trajectory
+        :param start: First step of the range. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step of the range. Default is None, which will add to the end of the path.
+        :type stop: int, optional
+        :return: Set of the x and y index of each tile.
+        :rtype: set
+        """
+
+        touched = set()
+
+        for first, positions in trajectory.windows(start, stop):
+            np.add.at(self.visits, (positions[:, 0], positions[:, 1]), 1)
+            x, y = np.divmod(np.unique(positions[:, 0] * self.width + positions[:, 1]), self.width)
+            touched |= set(zip((x // self.tile_size).tolist(), (y // self.tile_size).tolist()))
+
+        return touched
+
+    def paint_tasks(self, layer, tiles):
+        """ Tasks of paint_tile for tiles of the full resolution level, made one at a time so only the tiles being
+        rendered are held in memory.
+
+        :param layer: Layer of the tiles.
+        :type layer: str
+        :param tiles: x and y index of each tile.
+        :type tiles: list
+        :return: Task of each tile.
+        :rtype: generator
+        """
+
+        table = self.heat if layer == 'heatmap' else self.alpha
+
+        for tile_x, tile_y in tiles:
+            x_start, y_start = tile_x * self.tile_size, tile_y * self.tile_size
+            region = (slice(x_start, x_start + self.tile_size), slice(y_start, y_start + self.tile_size))
+            visits = self.visits[region] if layer in VISIT_LAYERS else None
+            yield (self.tile_file(layer, self.top_level, tile_x, tile_y), layer, np.asarray(self.feature_world[region]),
+                   visits, self.palette, table)
+
+    def shrink_tasks(self, layer, level, tiles):
+        """ Tasks of shrink_tile for tiles of a lower level.
+
+        :param layer: Layer of the tiles.
+        :type layer: str
+        :param level: Zoom level of the tiles.
+        :type level: int
+        :param tiles: x and y index of each tile.
+        :type tiles: list
+        :return: Task of each tile.
+        :rtype: generator
+        """
+
+        tiles_x, tiles_y = self.level_tiles(level + 1)
+
+        for tile_x, tile_y in tiles:
+            children = [[self.tile_file(layer, level + 1, x, y) if x < tiles_x and y < tiles_y else None
+                         for y in (2 * tile_y, 2 * tile_y + 1)] for x in (2 * tile_x, 2 * tile_x + 1)]
+            yield self.tile_file(layer, level, tile_x, tile_y), children
+
+    def render(self, tiles, layers, workers=None):
+        """ Renders a set of full resolution tiles and every tile above them within the lower levels.
+
+        :param tiles: x and y index of each full resolution tile.
+        :type tiles: set
+        :param layers: Layers to render.
+        :type layers: list
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :return: Number of tiles written.
+        :rtype: int
+        """
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        written = 0
+
+        with Pool(workers) as pool:
+            for layer in layers:
+                level_tiles = set(tiles)
+
+                for level in range(self.top_level, -1, -1):
+                    os.makedirs(os.path.join(self.directory, layer + '_files', str(level)), exist_ok=True)
+
+                    if level == self.top_level:
+                        done = pool.imap_unordered(paint_tile, self.paint_tasks(layer, sorted(level_tiles)), 4)
+                    else:
+                        # a tile of a lower level covers 2 by 2 tiles of the level above it
+                        level_tiles = {(tile_x // 2, tile_y // 2) for tile_x, tile_y in level_tiles}
+                        done = pool.imap_unordered(shrink_tile, self.shrink_tasks(layer, level, sorted(level_tiles)),
+                                                   4)
+
+                    # each level waits for the level above it to be written
+                    written += sum(1 for _ in done)
+
+        return written
+
+    def export(self, trajectory=None, workers=None):
+        """ Writes every tile of every level of each layer, along with the deep zoom descriptor of each layer.
+
+        :param trajectory: Trajectory of the deer within the world. Default is None, which will draw the world
+        without any visits.
+        :type trajectory: Trajectory, optional
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :return: Number of tiles written.
+        :rtype: int
+        """
+
+        if trajectory is not None:
+            self.add_visits(trajectory)
+
+        if self.heat_scale is None:
+            self.heat_scale = max(int(self.visits.max()), 1)
+        self.heat = self.heat_table()
+
+        for layer in self.layers:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, layer + '.dzi'), 'w') as file:
+                file.write(DZI_TEMPLATE.format(self.tile_size, self.width, self.length))
+
+        tiles_x, tiles_y = self.level_tiles(self.top_level)
+
+        return self.render({(tile_x, tile_y) for tile_x in range(tiles_x) for tile_y in range(tiles_y)},
+                           self.layers, workers)
+
+    def update(self, trajectory, start=0, stop=None, workers=None):
+        """ Adds the visits of a range of steps of a trajectory and renders only the tiles touched by them, along with
+        the tiles above them within the lower levels. The world layer does not change with the visits and is skipped.
+
+        :param trajectory: Trajectory of the deer within the world.
+        :type trajectory: Trajectory
+        :param start: First step of the range. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step of the range. Default is None, which will add to the end of the path.
+        :type stop: int, optional
+        :param workers: Number of worker processes. Default is None, which will use the number of CPUs.
+        :type workers: int, optional
+        :return: Number of tiles written.
+        :rtype: int
+        """
+
+        touched = self.add_visits(trajectory, start, stop)
+
+        return self.render(touched, [layer for layer in self.layers if layer in VISIT_LAYERS], workers)
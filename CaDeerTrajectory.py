@@ -0,0 +1,213 @@
+import numpy as np
+
+# movement of each move code along the x-axis and y-axis, code = (dx + 1) * 3 + (dy + 1)
+CODE_DX = np.array([-1, -1, -1, 0, 0, 0, 1, 1, 1])
+CODE_DY = np.array([-1, 0, 1, -1, 0, 1, -1, 0, 1])
+
+
+class Trajectory(object):
+    """Compact record of the path taken by the deer. Every move is one of nine move codes, so two moves are packed into
+        each byte, and the absolute position is kept at periodic keyframes. Any range of steps can be decoded back into
+        positions without decoding the whole path, a path of 10^8 steps takes about 50 MB.
+        :class:`Trajectory`
+
+        :param start_x: Starting x position of the deer.
+        :type start_x: int
+        :param start_y: Starting y position of the deer.
+        :type start_y: int
+        :param length: Length of the world, used to wrap the positions.
+        :type length: int
+        :param width: Width of the world, used to wrap the positions.
+        :type width: int
+        :param keyframe_interval: Number of steps between keyframes, must be even. Default is 65536.
+        :type keyframe_interval: int, optional
+    """
+
+    def __init__(self, start_x, start_y, length, width, keyframe_interval=65536):
+        """
+        Constructor method
+        """
+
+        if keyframe_interval < 2 or keyframe_interval % 2 != 0:
+            print("Keyframe interval has been set to default, please enter an even number greater than 0.")
+            keyframe_interval = 65536
+
+        self.length = length
+        self.width = width
+        self.keyframe_interval = keyframe_interval
+
+        # packed move codes of each completed keyframe interval
+        self.chunks = []
+        # move codes that have not been packed yet, within a buffer holding one keyframe interval
+        self.pending = np.zeros(keyframe_interval, dtype=np.uint8)
+        self.filled = 0
+        # position at the start of each keyframe interval
+        self.keyframes = [(int(start_x), int(start_y))]
+
+        self.steps = 0
+
+    @property
+    def nbytes(self):
+        """ Memory used by the packed moves, the buffer of pending moves, and the keyframes.
+
+        :return: Number of bytes.
+        :rtype: int
+        """
+
+        return sum(chunk.nbytes for chunk in self.chunks) + self.pending.nbytes + 16 * len(self.keyframes)
+
+    def append(self, dx, dy):
+        """ Adds a single move of the deer.
+
+        :param dx: Movement along the x-axis, one of -1, 0, 1.
+        :type dx: int
+        :param dy: Movement along the y-axis, one of -1, 0, 1.
+        :type dy: int
+        """
+
+        self.pending[self.filled] = (dx + 1) * 3 + dy + 1
+        self.filled += 1
+        self.steps += 1
+
+        if self.filled == self.keyframe_interval:
+            self.pack()
+
+    def extend(self, dx, dy):
+        """ Adds many moves of the deer at once.
+
+        :param dx: Movements along the x-axis.
+        :type dx: ndArray
+        :param dy: Movements along the y-axis.
+        :type dy: ndArray
+        """
+
+        codes = ((np.asarray(dx) + 1) * 3 + np.asarray(dy) + 1).astype(np.uint8)
+
+        while codes.size:
+            added = codes[:self.keyframe_interval - self.filled]
+            self.pending[self.filled:self.filled + added.size] = added
+            self.filled += added.size
+            self.steps += added.size
+            codes = codes[added.size:]
+
+            if self.filled == self.keyframe_interval:
+                self.pack()
+
+    def pack(self):
+        """ Packs the pending move codes of a full keyframe interval two to a byte and stores the next keyframe.
+        """
+
+        codes = self.pending
+        self.chunks.append(codes[0::2] | (codes[1::2] << 4))
+        self.filled = 0
+
+        x, y = self.keyframes[-1]
+        self.keyframes.append((int(np.remainder(x + CODE_DX[codes].sum(), self.length)),
+                               int(np.remainder(y + CODE_DY[codes].sum(), self.width))))
+
+    def codes(self, start, stop):
+        """ Unpacks the move codes of a range of steps.
+
+        :param start: First step of the range.
+        :type start: int
+        :param stop: Step after the last step of the range.
+        :type stop: int
+        :return: Move codes of the steps.
+        :rtype: ndArray
+        """
+
+        start = max(start, 0)
+        stop = min(stop, self.steps)
+        if stop <= start:
+            return np.zeros(0, dtype=np.uint8)
+
+        interval = self.keyframe_interval
+        parts = []
+
+        for chunk in range(start // interval, (stop - 1) // interval + 1):
+            if chunk < len(self.chunks):
+                packed = self.chunks[chunk]
+                codes = np.empty(interval, dtype=np.uint8)
+                codes[0::2] = packed & 15
+                codes[1::2] = packed >> 4
+            else:
+                codes = self.pending[:self.filled]
+
+            # only keep the part of the chunk within the range
+            offset = chunk * interval
+            parts.append(codes[max(start - offset, 0):stop - offset])
+
+        return np.concatenate(parts)
+
+    def positions(self, start=0, stop=None):
+        """ Decodes the positions of the deer before each step of a range, starting from the closest keyframe. The
+        position after the last move is found at index steps.
+
+        :param start: First step of the range. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step of the range. Default is None, which will decode to the end of the path.
+        :type stop: int, optional
+        :return: x and y positions as an ndArray of shape (stop - start, 2).
+        :rtype: ndArray
+        """
+
+        if stop is None:
+            stop = self.steps + 1
+        start = max(start, 0)
+        stop = min(stop, self.steps + 1)
+        if stop <= start:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        keyframe = start // self.keyframe_interval
+        first = keyframe * self.keyframe_interval
+        x, y = self.keyframes[keyframe]
+
+        # moves from the keyframe up to the last position of the range
+        codes = self.codes(first, stop - 1)
+        moves_x = np.concatenate([[x], CODE_DX[codes]])
+        moves_y = np.concatenate([[y], CODE_DY[codes]])
+
+        positions = np.empty((stop - start, 2), dtype=np.int64)
+        positions[:, 0] = np.remainder(np.cumsum(moves_x)[start - first:], self.length)
+        positions[:, 1] = np.remainder(np.cumsum(moves_y)[start - first:], self.width)
+
+        return positions
+
+    def windows(self, start=0, stop=None, size=None):
+        """ Decodes the positions of a range of steps one window at a time, which keeps the memory used bounded.
+
+        :param start: First step of the range. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step of the range. Default is None, which will decode to the end of the path.
+        :type stop: int, optional
+        :param size: Number of positions within each window. Default is None, which uses the keyframe interval.
+        :type size: int, optional
+        :return: Generator of the first step of each window and its positions.
+        :rtype: generator
+        """
+
+        if stop is None:
+            stop = self.steps + 1
+        if size is None:
+            size = self.keyframe_interval
+
+        for first in range(start, stop, size):
+            yield first, self.positions(first, min(first + size, stop))
+
+    def visits(self, start=0, stop=None):
+        """ Counts the number of steps the deer spent at each position of the world within a range of steps.
+
+        :param start: First step of the range. Default is 0.
+        :type start: int, optional
+        :param stop: Step after the last step of the range. Default is None, which will count to the end of the path.
+        :type stop: int, optional
+        :return: Visit count raster of shape (length, width).
+        :rtype: ndArray
+        """
+
+        counts = np.zeros(self.length * self.width, dtype=np.int64)
+
+        for first, positions in self.windows(start, stop):
+            counts += np.bincount(positions[:, 0] * self.width + positions[:, 1], minlength=counts.size)
+
+        return counts.reshape(self.length, self.width)
@@ -0,0 +1,404 @@
+import os
+import subprocess
+import tempfile
+from multiprocessing import Pool
+import numpy as np
+import matplotlib
+from PIL import Image, ImageDraw, ImageFont
+from CaDeerTerrain import wrapped_region
+
+# color of the deer within the frames, pink [255, 0, 255]
+DEER_COLOR = np.array([255, 0, 255], dtype=np.uint8)
+
+# height in pixels of the text of the title and the legend
+FONT_SIZE = 12
+
+# space in pixels around the title and the legend
+MARGIN = 6
+
+
+def alpha_table(light_mode, alpha, size=1024):
+    """ Alpha value of a position of the world after it has been visited a number of times, following the rules of
+    CaDeer.alpha_change.
+
+    :param light_mode: Determines if the alpha value decreases, instead of increasing, with each visit.
+    :type light_mode: bool
+    :param alpha: Alpha value of the position before any visits.
+    :type alpha: float
+    :param size: Number of visits to compute, positions visited more often use the last value. Default is 1024.
+    :type size: int, optional
+    :return: Alpha value after 0 to size - 1 visits.
+    :rtype: ndArray
+    """
+
+    table = np.zeros(size)
+    table[0] = alpha
+
+    for visits in range(1, size):
+        if light_mode:
+            table[visits] = 0.95 * table[visits - 1]
+        elif table[visits - 1] <= 0.95:
+            table[visits] = 1.05 * table[visits - 1]
+        else:
+            table[visits] = 1
+
+    return table
+
+
+def load_font(size=FONT_SIZE):
+    """ Default font of PIL at a given size, older versions of PIL only have a fixed size bitmap font.
+
+    :param size: Height of the text in pixels. Default is FONT_SIZE.
+    :type size: int, optional
+    :return: Font used for the title and the legend.
+    :rtype: ImageFont
+    """
+
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        return ImageFont.load_default()
+
+
+class FrameRenderer(object):
+    """Streams frames of the deer moving through the world straight into ffmpeg. Frames are drawn from the colors of
+        the world and the number of visits of each position, so no matplotlib figure is kept for each frame and the
+        frames of any range of steps can be drawn once the visits before the range are known. Each frame holds the
+        same title and legend as the mp4 of CaDeer.pathing, the legend is drawn once and only the title is drawn again
+        for each frame. The renderer keeps its own copy of the features, so the terrain it draws only changes when it
+        is told of a change, see terrain.
+        :class:`FrameRenderer`
+
+        :param deer: Deer simulation with its features gathered and its world colored.
+        :type deer: CaDeer
+        :param mpfour_output: Determines name and address of mp4 output
+        :type mpfour_output: string
+        :param encoding: Determines if the user wants to encode the mp4 with a specific set of encoding instructions.
+        :type encoding: string, optional
+        :param fps: Frames per second of the mp4 output. Default is 30.
+        :type fps: int, optional
+        :param upscale: Number of pixels used for each position of the world along each axis. Default is 4.
+        :type upscale: int, optional
+        :param annotate: Draws the title and the legend around the world. Default is True.
+        :type annotate: bool, optional
+    """
+
+    def __init__(self, deer, mpfour_output, encoding=None, fps=30, upscale=4, annotate=True):
+        """
+        Constructor method
+        """
+
+        self.mpfour_output = mpfour_output
+        self.encoding = encoding
+        self.fps = fps
+        self.upscale = upscale
+
+        colors = np.asarray(deer.colors, dtype=float)
+        self.rgb = colors[:, :3]
+        self.feature_world = np.array(deer.feature_world)
+        self.length, self.width = self.feature_world.shape
+        self.alpha = alpha_table(deer.light_mode, colors[0][3])
+
+        # world settings shown within the title, and the terrains of the legend followed by the deer
+        self.annotate = annotate
+        self.settings = "s {} o {} p {} l {} b {} f {}".format(deer.scale, deer.octaves, np.round(deer.persistence, 3),
+                                                               np.round(deer.lacunarity, 3), deer.base, deer.features)
+        self.names = list(deer.names[:deer.features])
+        self.motility_values = list(deer.motility_values)
+        self.legend_colors = np.vstack([np.round(self.rgb[:deer.features] * 255), DEER_COLOR]).astype(np.uint8)
+
+        self.visits = np.zeros((self.length, self.width), dtype=np.int64)
+        self.frame = None
+        self.process = None
+
+        # layout of the annotated frame, found when the first frame is drawn
+        self.font = None
+        self.top = 0
+        self.title_height = 0
+        self.line = 0
+        self.legend_left = 0
+
+    def start_state(self, visits):
+        """ Sets the number of visits of each position before the first frame, used when rendering a range of steps
+        that does not start at the beginning of the path.
+
+        :param visits: Visit count raster of shape (length, width).
+        :type visits: ndArray
+        """
+
+        self.visits = np.array(visits, dtype=np.int64)
+        self.frame = None
+
+    def colors_of(self, x, y):
+        """ Color of positions of the world drawn over a white background, as imshow shows the RGBA world.
+
+        :param x: x positions
+        :type x: ndArray or int
+        :param y: y positions
+        :type y: ndArray or int
+        :return: RGB colors between 0-255.
+        :rtype: ndArray
+        """
+
+        alpha = self.alpha[np.minimum(self.visits[x, y], self.alpha.size - 1)]
+        rgb = self.rgb[self.feature_world[x, y]] * np.expand_dims(alpha, -1) + (1 - np.expand_dims(alpha, -1))
+
+        return np.round(rgb * 255).astype(np.uint8)
+
+    def layout(self):
+        """ Draws the first frame, the world with the visits so far, along with the legend to the right of the world
+        and room for the title above it when the frames are annotated.
+        """
+
+        x, y = np.indices((self.length, self.width))
+        world = self.colors_of(x, y)
+
+        if not self.annotate:
+            self.frame = world
+            return
+
+        self.font = load_font()
+        ascent, descent = self.font.getmetrics()
+        self.line = ascent + descent + 2
+        entries = self.legend()
+        text_width = max(int(np.ceil(self.font.getlength(entry))) for entry in entries + [self.settings])
+
+        self.title_height = 3 * self.line + 2 * MARGIN
+        self.top = self.title_height
+        self.legend_left = self.width * self.upscale + 2 * MARGIN
+        frame_width = max(self.legend_left + self.line + MARGIN + text_width + MARGIN, text_width + 2 * MARGIN)
+        frame_length = self.top + max(self.length * self.upscale, len(entries) * self.line + MARGIN) + MARGIN
+
+        # sizes are kept even, as required by yuv420p
+        self.frame = np.full((frame_length + frame_length % 2, frame_width + frame_width % 2, 3), 255, dtype=np.uint8)
+        self.frame[self.top:self.top + self.length * self.upscale, :self.width * self.upscale] = \
+            world.repeat(self.upscale, axis=0).repeat(self.upscale, axis=1)
+        self.draw_legend()
+
+    def legend(self):
+        """ Entries of the legend, the name and motility value of each terrain followed by the deer.
+
+        :return: Text of each entry.
+        :rtype: list
+        """
+
+        return ['{:^5} {:>10}'.format(name, str(value)) for name, value in zip(self.names, self.motility_values)] + \
+            ['{:^5} {:>10}'.format('deer', 'NA')]
+
+    def draw_legend(self):
+        """ Draws the legend to the right of the world, with a colored box before each entry.
+        """
+
+        entries = self.legend()
+        legend = Image.new('RGB', (self.frame.shape[1] - self.legend_left, len(entries) * self.line), 'white')
+        draw = ImageDraw.Draw(legend)
+
+        for row, (entry, color) in enumerate(zip(entries, self.legend_colors)):
+            top = row * self.line
+            draw.rectangle([0, top + 1, self.line - 3, top + self.line - 2], fill=tuple(color.tolist()),
+                           outline='black')
+            draw.text((self.line + MARGIN // 2, top), entry, fill='black', font=self.font)
+
+        self.frame[self.top:self.top + legend.height, self.legend_left:] = np.asarray(legend)
+
+    def terrain(self, motility_values, regions):
+        """ Changes the terrain drawn from the next frame on, after the terrain of the walk has changed.
+
+        :param motility_values: Motility values of each feature, shown within the legend.
+        :type motility_values: ndArray
+        :param regions: Bounds and new features of each edited region, see changed_terrain.
+        :type regions: list
+        """
+
+        self.motility_values = list(motility_values)
+
+        for bounds, features in regions:
+            region = wrapped_region(self.feature_world.shape, *bounds)
+            self.feature_world[region] = features
+
+            if self.frame is not None:
+                colors = self.colors_of(*region)
+                for i, x in enumerate(region[0].ravel().tolist()):
+                    for j, y in enumerate(region[1].ravel().tolist()):
+                        self.paint(x, y, colors[i, j])
+
+        if self.frame is not None and self.annotate:
+            self.draw_legend()
+
+    def paint(self, x, y, color):
+        """ Sets the color of a position of the world within the frame.
+
+        :param x: x position
+        :type x: int
+        :param y: y position
+        :type y: int
+        :param color: RGB color between 0-255.
+        :type color: ndArray
+        """
+
+        if self.annotate:
+            self.frame[self.top + x * self.upscale:self.top + (x + 1) * self.upscale,
+                       y * self.upscale:(y + 1) * self.upscale] = color
+        else:
+            self.frame[x, y] = color
+
+    def title(self, t, x, y):
+        """ Draws the title of a frame, holding the iteration, the position of the deer and the world settings.
+
+        :param t: Iteration of the frame.
+        :type t: int
+        :param x: x position of the deer.
+        :type x: int
+        :param y: y position of the deer.
+        :type y: int
+        """
+
+        header = Image.new('RGB', (self.frame.shape[1], self.title_height), 'white')
+        ImageDraw.Draw(header).multiline_text((self.frame.shape[1] // 2, MARGIN),
+                                              "t {}\n(x,y): ({},{})\n{}".format(t, x, y, self.settings),
+                                              fill='black', font=self.font, anchor='ma', align='center')
+        self.frame[:self.title_height] = np.asarray(header)
+
+    def open(self):
+        """ Starts ffmpeg reading raw frames from a pipe.
+        """
+
+        if self.annotate:
+            # annotated frames are drawn at their full size
+            size = '{}x{}'.format(self.frame.shape[1], self.frame.shape[0])
+            scaling = 'null'
+        else:
+            # frames are scaled up without blurring and padded to an even size, as required by yuv420p
+            size = '{}x{}'.format(self.width, self.length)
+            scaling = 'scale=iw*{0}:ih*{0}:flags=neighbor,pad=ceil(iw/2)*2:ceil(ih/2)*2'.format(self.upscale)
+
+        command = [matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', size, '-r', str(self.fps), '-i', '-', '-vf', scaling]
+        if self.encoding is not None:
+            command += ['-c:v', self.encoding]
+        command += ['-pix_fmt', 'yuv420p', self.mpfour_output + '.mp4']
+
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def consume(self, t, positions, moves):
+        """ Renders and writes one frame for each position of a chunk of the path.
+
+        :param t: Step of the first position of the chunk.
+        :type t: int
+        :param positions: x and y positions of the deer before each step, of shape (n, 2).
+        :type positions: ndArray
+        :param moves: Moves taken at each step, of shape (n, 2).
+        :type moves: ndArray
+        """
+
+        if self.frame is None:
+            self.layout()
+
+        if self.process is None:
+            self.open()
+
+        for i, (x, y) in enumerate(positions.tolist()):
+            self.paint(x, y, DEER_COLOR)
+            if self.annotate:
+                self.title(t + i, x, y)
+            self.process.stdin.write(self.frame.data)
+
+            # leave the trail behind the deer
+            self.visits[x, y] += 1
+            self.paint(x, y, self.colors_of(x, y))
+
+    def close(self):
+        """ Finishes the mp4 output.
+
+        :return: Name of the mp4 output.
+        :rtype: str
+        """
+
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+        return self.mpfour_output + '.mp4'
+
+
+def render_segment(renderer, trajectory, start, stop, mpfour_output, visits=None):
+    """ Renders the frames of a range of steps of a trajectory into its own mp4 file. The trail left before the range
+    is drawn from the visits of the earlier steps, so every range can be rendered independently.
+
+    :param renderer: Renderer holding the colors of the world and the encoding settings.
+    :type renderer: FrameRenderer
+    :param trajectory: Trajectory of the deer within the world.
+    :type trajectory: Trajectory
+    :param start: First step of the range.
+    :type start: int
+    :param stop: Step after the last step of the range.
+    :type stop: int
+    :param mpfour_output: Name and address of the mp4 output of the range.
+    :type mpfour_output: string
+    :param visits: Visit count raster of the steps before the range. Default is None, which will count them from the
+    start of the trajectory.
+    :type visits: ndArray, optional
+    :return: Name of the mp4 output of the range.
+    :rtype: str
+    """
+
+    if visits is None:
+        visits = trajectory.visits(0, start)
+
+    renderer.mpfour_output = mpfour_output
+    renderer.start_state(visits)
+
+    for t, positions in trajectory.windows(start, stop):
+        renderer.consume(t, positions, None)
+
+    return renderer.close()
+
+
+def segmented_mp4(renderer, trajectory, segments=None):
+    """ Splits a recorded trajectory into segments that are rendered and encoded by their own worker processes, then
+    joins the segments without encoding them again using the concat demuxer of ffmpeg. The visits before each segment
+    are counted in a single pass over the trajectory. Every segment starts its own ffmpeg, so on a single CPU more
+    segments are slower than one writer, and the gain on several CPUs has not been measured.
+
+    :param renderer: Renderer holding the colors of the world, the mp4 output name and the encoding settings.
+    :type renderer: FrameRenderer
+    :param trajectory: Trajectory of the deer within the world, one frame is rendered for each step.
+    :type trajectory: Trajectory
+    :param segments: Number of segments. Default is None, which will use the number of CPUs.
+    :type segments: int, optional
+    :return: Name of the mp4 output.
+    :rtype: str
+    """
+
+    if segments is None:
+        segments = os.cpu_count() or 1
+
+    # render_segment points the renderer at each segment
+    output = renderer.mpfour_output + '.mp4'
+
+    bounds = np.linspace(0, trajectory.steps, segments + 1).astype(int)
+
+    # visits before each segment, each range of steps is decoded once
+    visits = np.zeros((trajectory.length, trajectory.width), dtype=np.int64)
+    starts = []
+    for i in range(segments):
+        starts.append(visits.copy())
+        visits += trajectory.visits(bounds[i], bounds[i + 1])
+
+    with tempfile.TemporaryDirectory() as directory:
+        tasks = [(renderer, trajectory, bounds[i], bounds[i + 1], os.path.join(directory, 'segment_{}'.format(i)),
+                  starts[i]) for i in range(segments) if bounds[i + 1] > bounds[i]]
+
+        with Pool(min(segments, os.cpu_count() or 1)) as pool:
+            files = pool.starmap(render_segment, tasks)
+
+        listing = os.path.join(directory, 'segments.txt')
+        with open(listing, 'w') as file:
+            for name in files:
+                file.write("file '{}'\n".format(name))
+
+        subprocess.run([matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error', '-f', 'concat',
+                        '-safe', '0', '-i', listing, '-c', 'copy', output], check=True)
+
+    return output